@@ -0,0 +1,138 @@
+"""
+Cold start benchmark: import time of the application and time until a
+fresh server answers its first request.
+
+Usage (from the backend directory):
+
+    uv run python -m benchmarks.import_time
+    uv run python -m benchmarks.import_time --runs 10 --top 25
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from .loadtest import BACKEND_DIR, free_port
+
+
+def import_profile(env: dict[str, str]) -> tuple[float, dict[str, float]]:
+    """
+    Imports src.main in a fresh interpreter with -X importtime. Returns the
+    total import time and the cumulative time per module, in milliseconds.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import src.main"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative: dict[str, float] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, module = line.removeprefix("import time:").split("|")
+        cumulative[module.strip()] = int(cumulative_us) / 1000
+    return cumulative.get("src.main", 0.0), cumulative
+
+
+def time_to_first_request(env: dict[str, str], timeout: float = 30.0) -> float:
+    """
+    Starts a uvicorn worker and returns the milliseconds until
+    /api/v1/health first answers.
+    """
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "src.main:app",
+            "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        deadline = started + timeout
+        while time.perf_counter() < deadline:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/api/v1/health", timeout=1.0).is_success:
+                    return (time.perf_counter() - started) * 1000
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.01)
+        raise RuntimeError("Server did not answer in time")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Application cold start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to list")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="omaha-coldstart-")
+    env = dict(
+        os.environ,
+        DATABASE_PATH=os.path.join(workdir, "omaha.sqlite3"),
+        DB_ECHO="false",
+    )
+    if "ENCRYPTION_KEY" not in env:
+        from cryptography.fernet import Fernet
+
+        env["ENCRYPTION_KEY"] = Fernet.generate_key().decode()
+
+    try:
+        # Create and seed the database once, so runs measure a warm restart
+        subprocess.run(
+            [sys.executable, "-c", "from src.database import create_db_and_tables as c; c()"],
+            cwd=BACKEND_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            check=True,
+        )
+
+        totals = []
+        profiles = []
+        for _ in range(args.runs):
+            total, profile = import_profile(env)
+            totals.append(total)
+            profiles.append(profile)
+        print(f"Import of src.main: median {statistics.median(totals):.0f} ms over {args.runs} runs")
+
+        modules = profiles[-1]
+        slowest = sorted(
+            (m for m in modules if m.startswith("src.") or "." not in m),
+            key=lambda m: modules[m],
+            reverse=True,
+        )[: args.top]
+        print(f"\n{'module':<40}{'cumulative ms':>15}")
+        for module in slowest:
+            print(f"{module:<40}{modules[module]:>15.1f}")
+
+        print()
+        for fast in ("false", "true"):
+            timings = [
+                time_to_first_request(dict(env, FAST_STARTUP=fast)) for _ in range(args.runs)
+            ]
+            print(
+                f"First request (FAST_STARTUP={fast}): median "
+                f"{statistics.median(timings):.0f} ms, max {max(timings):.0f} ms"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
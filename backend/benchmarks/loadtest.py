@@ -0,0 +1,355 @@
+"""
+Concurrent load test for a running API worker.
+
+By default the harness seeds a throwaway database with a synthetic caseload,
+starts the mock Group Office server and a uvicorn worker, then drives a mixed
+clinician workload at increasing concurrency and reports throughput and tail
+latency per step.
+
+Usage (from the backend directory):
+
+    uv run python -m benchmarks.loadtest --patients 500 --concurrency 1,4,16,64
+    uv run python -m benchmarks.loadtest --base-url http://localhost:8000 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+
+import httpx
+
+from .run import percentile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = "list=15,care_plan=35,visit=30,export=15,sync=5"
+
+
+@dataclass
+class Sample:
+    operation: str
+    latency_ms: float
+    ok: bool
+
+
+@dataclass
+class StepReport:
+    concurrency: int
+    duration: float
+    samples: list[Sample] = field(default_factory=list)
+
+    @property
+    def throughput(self) -> float:
+        return len(self.samples) / self.duration if self.duration else 0.0
+
+    def latencies(self, operation: str | None = None) -> list[float]:
+        return sorted(
+            s.latency_ms
+            for s in self.samples
+            if operation is None or s.operation == operation
+        )
+
+    @property
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for s in self.samples if not s.ok) / len(self.samples)
+
+
+class Workload:
+    """
+    Mixed clinician workload. Each operation corresponds to one user action,
+    which may issue more than one request (a visit records a score and an
+    intervention).
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        patient_ids: list[int],
+        problem_ids: list[tuple[int, int]],
+        rng: random.Random,
+    ):
+        self.client = client
+        self.patient_ids = patient_ids
+        self.problem_ids = problem_ids
+        self.rng = rng
+
+    async def list(self) -> bool:
+        response = await self.client.get("/api/v1/patients")
+        return response.is_success
+
+    async def care_plan(self) -> bool:
+        patient_id = self.rng.choice(self.patient_ids)
+        response = await self.client.get(f"/api/v1/patients/{patient_id}/care-plan")
+        return response.is_success
+
+    async def visit(self) -> bool:
+        patient_id, patient_problem_id = self.rng.choice(self.problem_ids)
+        base = f"/api/v1/patients/{patient_id}/problems/{patient_problem_id}"
+        score = await self.client.post(
+            f"{base}/scores",
+            json={
+                "phase_id": 2,
+                "rating_knowledge_id": self.rng.randint(1, 5),
+                "rating_behavior_id": self.rng.randint(1, 5),
+                "rating_status_id": self.rng.randint(1, 5),
+            },
+        )
+        intervention = await self.client.post(
+            f"{base}/interventions",
+            json={
+                "category_id": self.rng.randint(1, 4),
+                "target_id": self.rng.randint(1, 20),
+                "specific_details": "Load test visit",
+            },
+        )
+        return score.is_success and intervention.is_success
+
+    async def export(self) -> bool:
+        patient_id = self.rng.choice(self.patient_ids)
+        response = await self.client.get(
+            f"/api/v1/patients/{patient_id}/export",
+            params={"export_format": self.rng.choice(["txt", "json"])},
+        )
+        return response.is_success
+
+    async def sync(self) -> bool:
+        patient_id = self.rng.choice(self.patient_ids)
+        response = await self.client.get(
+            f"/api/v1/patients/{patient_id}/export",
+            params={"export_format": "txt", "destination": "group_office"},
+        )
+        return response.is_success
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if not hasattr(Workload, name.strip()):
+            raise SystemExit(f"Unknown operation in --mix: {name}")
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+async def run_step(
+    base_url: str,
+    concurrency: int,
+    duration: float,
+    mix: dict[str, float],
+    patient_ids: list[int],
+    problem_ids: list[tuple[int, int]],
+    seed: int,
+) -> StepReport:
+    report = StepReport(concurrency=concurrency, duration=duration)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    operations = list(mix)
+    weights = list(mix.values())
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        deadline = time.monotonic() + duration
+
+        async def user(n: int):
+            rng = random.Random(seed * 1000 + n)
+            workload = Workload(client, patient_ids, problem_ids, rng)
+            while time.monotonic() < deadline:
+                operation = rng.choices(operations, weights=weights)[0]
+                started = time.perf_counter()
+                try:
+                    ok = await getattr(workload, operation)()
+                except httpx.HTTPError:
+                    ok = False
+                report.samples.append(
+                    Sample(operation, (time.perf_counter() - started) * 1000, ok)
+                )
+
+        started = time.monotonic()
+        await asyncio.gather(*(user(n) for n in range(concurrency)))
+        report.duration = time.monotonic() - started
+    return report
+
+
+def print_step(report: StepReport, mix: dict[str, float]) -> None:
+    latencies = report.latencies()
+    print(
+        f"concurrency {report.concurrency:>4}: {report.throughput:8.1f} ops/s  "
+        f"p50 {percentile(latencies, 50):8.1f}  p95 {percentile(latencies, 95):8.1f}  "
+        f"p99 {percentile(latencies, 99):8.1f} ms  errors {report.error_rate:6.1%}"
+    )
+    for operation in mix:
+        op_latencies = report.latencies(operation)
+        if op_latencies:
+            print(
+                f"    {operation:<10} n={len(op_latencies):<6} "
+                f"p50 {percentile(op_latencies, 50):8.1f}  p95 {percentile(op_latencies, 95):8.1f}  "
+                f"p99 {percentile(op_latencies, 99):8.1f} ms"
+            )
+
+
+def find_saturation(reports: list[StepReport]) -> StepReport | None:
+    """
+    Returns the first step after which adding concurrency stops buying
+    throughput (<10% gain) and only adds latency.
+    """
+    for previous, current in zip(reports, reports[1:]):
+        if current.throughput < previous.throughput * 1.10:
+            return previous
+    return None
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_ready(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/api/v1/ready", timeout=2.0).is_success:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"API at {base_url} did not become ready")
+
+
+def discover_ids(base_url: str, sample: int = 200) -> tuple[list[int], list[tuple[int, int]]]:
+    """
+    Collects patient and problem ids from an already populated server.
+    """
+    patients = httpx.get(f"{base_url}/api/v1/patients", timeout=60.0).json()
+    patient_ids = [p["patient_id"] for p in patients][:sample]
+    problem_ids = []
+    for patient_id in patient_ids:
+        problems = httpx.get(f"{base_url}/api/v1/patients/{patient_id}/problems").json()
+        problem_ids.extend((patient_id, p["patient_problem_id"]) for p in problems)
+    return patient_ids, problem_ids
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Concurrent load test for the API")
+    parser.add_argument("--patients", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--concurrency", default="1,2,4,8,16,32", help="Comma-separated concurrency steps"
+    )
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per step")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Operation weights")
+    parser.add_argument("--base-url", help="Target an already running, populated server")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers to start")
+    parser.add_argument("--go-latency-ms", type=float, default=80.0)
+    parser.add_argument("--go-error-rate", type=float, default=0.01)
+    parser.add_argument("--go-rate-limit", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    steps = [int(c) for c in args.concurrency.split(",")]
+    server = None
+    mock = None
+
+    try:
+        if args.base_url:
+            base_url = args.base_url.rstrip("/")
+            patient_ids, problem_ids = discover_ids(base_url)
+        else:
+            from .mock_groupoffice import MockConfig, MockServer
+
+            mock = MockServer(
+                MockConfig(
+                    latency_ms=args.go_latency_ms,
+                    error_rate=args.go_error_rate,
+                    rate_limit=args.go_rate_limit,
+                    seed=args.seed,
+                )
+            ).start()
+
+            workdir = tempfile.mkdtemp(prefix="omaha-load-")
+            env = os.environ.copy()
+            env.update(
+                DATABASE_PATH=os.path.join(workdir, "omaha.sqlite3"),
+                DB_ECHO="false",
+                GO_URL=mock.url,
+                GO_USERNAME="loadtest",
+                GO_PASSWORD="loadtest",
+                GO_NOTEBOOK_ID="1",
+            )
+            if "ENCRYPTION_KEY" not in env:
+                from cryptography.fernet import Fernet
+
+                env["ENCRYPTION_KEY"] = Fernet.generate_key().decode()
+            # Seed in this process before the server starts; settings are
+            # read at import time, so the environment must be in place first.
+            os.environ.update(env)
+
+            from sqlmodel import Session
+
+            from src.database import create_db_and_tables, engine
+
+            from .synthetic import generate_caseload
+
+            create_db_and_tables()
+            with Session(engine) as session:
+                caseload = generate_caseload(session, args.patients, seed=args.seed)
+            engine.dispose()
+            patient_ids = caseload.patient_ids
+            problem_ids = caseload.patient_problem_ids
+
+            port = free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            server = subprocess.Popen(
+                [
+                    sys.executable, "-m", "uvicorn", "src.main:app",
+                    "--host", "127.0.0.1", "--port", str(port),
+                    "--workers", str(args.workers), "--log-level", "warning",
+                ],
+                cwd=BACKEND_DIR,
+                env=env,
+                stdout=subprocess.DEVNULL,
+            )
+
+        wait_until_ready(base_url)
+        print(f"Target: {base_url}  patients: {len(patient_ids)}  mix: {args.mix}")
+        print()
+
+        reports = []
+        for concurrency in steps:
+            report = asyncio.run(
+                run_step(
+                    base_url, concurrency, args.duration, mix,
+                    patient_ids, problem_ids, args.seed,
+                )
+            )
+            print_step(report, mix)
+            reports.append(report)
+
+        print()
+        saturated = find_saturation(reports)
+        peak = max(reports, key=lambda r: r.throughput)
+        print(f"Peak throughput: {peak.throughput:.1f} ops/s at concurrency {peak.concurrency}")
+        if saturated:
+            print(f"Throughput stops scaling beyond concurrency {saturated.concurrency}")
+        else:
+            print("Throughput was still scaling at the highest concurrency step")
+        if mock:
+            print(f"Mock Group Office: {httpx.get(f'{mock.url}/stats').json()}")
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=10)
+        if mock:
+            mock.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""
+Local stand-in for the Group Office auth and JMAP endpoints used by
+`services/group_office.py`, with configurable latency, error rate and throttling.
+
+Run standalone and point GO_URL at it:
+
+    uv run python -m benchmarks.mock_groupoffice --port 8081 --latency-ms 80 --error-rate 0.02
+"""
+
+import argparse
+import asyncio
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 50.0
+    jitter_ms: float = 20.0
+    error_rate: float = 0.0
+    # Requests per second accepted before answering 429; 0 disables throttling.
+    rate_limit: float = 0.0
+    username: str = "loadtest"
+    password: str = "loadtest"
+    seed: int | None = None
+
+
+class TokenBucket:
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+def create_app(config: MockConfig) -> FastAPI:
+    app = FastAPI(title="Mock Group Office")
+    rng = random.Random(config.seed)
+    bucket = TokenBucket(config.rate_limit) if config.rate_limit > 0 else None
+    notes: dict[int, dict] = {}
+    tokens: set[str] = set()
+    stats = {"requests": 0, "throttled": 0, "errors": 0}
+    app.state.notes = notes
+    app.state.stats = stats
+
+    async def simulate() -> JSONResponse | None:
+        stats["requests"] += 1
+        delay = max(0.0, rng.gauss(config.latency_ms, config.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+        if bucket and not bucket.take():
+            stats["throttled"] += 1
+            return JSONResponse(status_code=429, content={"error": "Too many requests"})
+        if rng.random() < config.error_rate:
+            stats["errors"] += 1
+            return JSONResponse(status_code=500, content={"error": "Simulated failure"})
+        return None
+
+    @app.post("/api/auth.php")
+    async def auth(request: Request):
+        failure = await simulate()
+        if failure:
+            return failure
+        body = await request.json()
+        if body.get("username") != config.username or body.get("password") != config.password:
+            return JSONResponse(status_code=401, content={"error": "Invalid credentials"})
+        token = uuid.uuid4().hex
+        tokens.add(token)
+        return {"accessToken": token}
+
+    @app.post("/api/jmap.php")
+    async def jmap(request: Request):
+        failure = await simulate()
+        if failure:
+            return failure
+        auth_header = request.headers.get("Authorization", "")
+        if auth_header.removeprefix("Bearer ") not in tokens:
+            return JSONResponse(status_code=401, content={"error": "Invalid token"})
+
+        responses = []
+        for method, args, call_id in await request.json():
+            if method != "Note/set":
+                responses.append(["error", {"type": "unknownMethod"}, call_id])
+                continue
+            result: dict = {}
+            if "create" in args:
+                result["created"] = {}
+                for creation_id, note in args["create"].items():
+                    note_id = len(notes) + 1
+                    notes[note_id] = note
+                    result["created"][creation_id] = {"id": note_id}
+            if "update" in args:
+                result["updated"] = {}
+                result["notUpdated"] = {}
+                for note_id, patch in args["update"].items():
+                    if int(note_id) in notes:
+                        notes[int(note_id)].update(patch)
+                        result["updated"][note_id] = None
+                    else:
+                        result["notUpdated"][note_id] = {"type": "notFound"}
+                if not result["notUpdated"]:
+                    del result["notUpdated"]
+            responses.append([method, result, call_id])
+        return responses
+
+    @app.get("/stats")
+    async def get_stats():
+        return {**stats, "notes": len(notes)}
+
+    return app
+
+
+class MockServer:
+    """
+    Runs the mock on a background thread, for use from load tests.
+    """
+
+    def __init__(self, config: MockConfig, host: str = "127.0.0.1", port: int = 0):
+        import uvicorn
+
+        self.app = create_app(config)
+        self.server = uvicorn.Server(
+            uvicorn.Config(self.app, host=host, port=port, log_level="warning")
+        )
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        sock = self.server.servers[0].sockets[0]
+        host, port = sock.getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockServer":
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Mock Group Office server did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Mock Group Office server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+    )
+    print(f"Credentials: GO_USERNAME={config.username} GO_PASSWORD={config.password}")
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="info")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+Benchmark runner for the API hot paths.
+
+Creates a throwaway SQLite database, fills it with a synthetic caseload and
+measures latency percentiles and SQL query counts per operation.
+
+Usage (from the backend directory):
+
+    uv run python -m benchmarks.run --patients 1000
+    uv run python -m benchmarks.run --patients 1000 --save-baseline benchmarks/baselines/main.json
+    uv run python -m benchmarks.run --patients 1000 --compare benchmarks/baselines/main.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Callable
+
+
+@dataclass
+class Result:
+    name: str
+    iterations: int
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+    queries_per_op: float
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+
+def measure(
+    name: str,
+    operation: Callable[[int], None],
+    iterations: int,
+    counter: QueryCounter,
+    warmup: int = 3,
+) -> Result:
+    for i in range(warmup):
+        operation(i)
+
+    timings = []
+    queries = 0
+    for i in range(iterations):
+        before = counter.count
+        started = time.perf_counter()
+        operation(warmup + i)
+        timings.append((time.perf_counter() - started) * 1000)
+        queries += counter.count - before
+
+    timings.sort()
+    return Result(
+        name=name,
+        iterations=iterations,
+        mean_ms=sum(timings) / len(timings),
+        p50_ms=percentile(timings, 50),
+        p95_ms=percentile(timings, 95),
+        p99_ms=percentile(timings, 99),
+        max_ms=timings[-1],
+        queries_per_op=queries / iterations,
+    )
+
+
+def git_revision() -> str | None:
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+            )
+            .decode()
+            .strip()
+        )
+    except Exception:
+        return None
+
+
+def print_results(results: list[Result]) -> None:
+    header = f"{'benchmark':<22}{'n':>6}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}{'queries':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r.name:<22}{r.iterations:>6}{r.mean_ms:>10.2f}{r.p50_ms:>10.2f}"
+            f"{r.p95_ms:>10.2f}{r.p99_ms:>10.2f}{r.max_ms:>10.2f}{r.queries_per_op:>10.1f}"
+        )
+    print("(latencies in milliseconds, queries per operation)")
+
+
+def compare(results: list[Result], baseline: dict, threshold: float) -> bool:
+    """
+    Prints the change against a stored baseline. Returns True if any
+    benchmark regressed by more than `threshold` (p50 or p95) or issues
+    more queries than before.
+    """
+    regressed = False
+    baseline_results = baseline.get("results", {})
+    print()
+    print(f"Comparison against baseline ({baseline.get('meta', {}).get('git_revision')}):")
+    for r in results:
+        base = baseline_results.get(r.name)
+        if not base:
+            print(f"  {r.name:<22} new benchmark, no baseline")
+            continue
+        p50_change = r.p50_ms / base["p50_ms"] - 1 if base["p50_ms"] else 0.0
+        p95_change = r.p95_ms / base["p95_ms"] - 1 if base["p95_ms"] else 0.0
+        query_change = r.queries_per_op - base["queries_per_op"]
+        flags = []
+        if p50_change > threshold or p95_change > threshold:
+            flags.append("SLOWER")
+        if query_change > 0:
+            flags.append("MORE QUERIES")
+        regressed = regressed or bool(flags)
+        print(
+            f"  {r.name:<22} p50 {p50_change:+7.1%}  p95 {p95_change:+7.1%}  "
+            f"queries {query_change:+6.1f}  {' '.join(flags)}"
+        )
+    return regressed
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--patients", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument(
+        "--list-iterations",
+        type=int,
+        default=10,
+        help="Iterations for full-roster benchmarks, which scale with --patients",
+    )
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="Relative slowdown tolerated before --compare reports a regression",
+    )
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="omaha-bench-")
+    # The application reads its settings at import time, so the database
+    # location has to be set before anything from src is imported.
+    os.environ["DATABASE_PATH"] = os.path.join(workdir, "omaha.sqlite3")
+    os.environ["DB_ECHO"] = "false"
+    if "ENCRYPTION_KEY" not in os.environ:
+        from cryptography.fernet import Fernet
+
+        os.environ["ENCRYPTION_KEY"] = Fernet.generate_key().decode()
+
+    from fastapi.testclient import TestClient
+    from sqlmodel import Session
+
+    from src.database import engine
+    from src.main import app
+    from src.services.export import (
+        generate_care_plan_summary_json,
+        generate_care_plan_summary_text,
+    )
+
+    from .synthetic import generate_caseload, random_person
+
+    with TestClient(app) as client:
+        started = time.perf_counter()
+        with Session(engine) as session:
+            caseload = generate_caseload(session, args.patients, seed=args.seed)
+        print(
+            f"Generated {len(caseload.patient_ids)} patients, {caseload.problems} problems, "
+            f"{caseload.symptoms} symptoms, {caseload.scores} scores, "
+            f"{caseload.interventions} interventions in {time.perf_counter() - started:.1f}s"
+        )
+        print()
+
+        counter = QueryCounter(engine)
+        rng = random.Random(args.seed)
+        used_tins = set(caseload.tins)
+        patient_ids = caseload.patient_ids
+        problem_ids = caseload.patient_problem_ids
+
+        def get_patients(_):
+            client.get("/api/v1/patients").raise_for_status()
+
+        def get_patient_names(_):
+            client.get(
+                "/api/v1/patients", params={"fields": "first_name,last_name"}
+            ).raise_for_status()
+
+        def tin_lookup(i):
+            tin = caseload.tins[(i * 7919) % len(caseload.tins)]
+            client.get("/api/v1/patients", params={"tin": tin}).raise_for_status()
+
+        def search_patients(i):
+            first_name, last_name = caseload.names[(i * 7919) % len(caseload.names)]
+            client.get(
+                "/api/v1/patients/search", params={"q": f"{first_name} {last_name[:3]}"}
+            ).raise_for_status()
+
+        def get_care_plan(i):
+            patient_id = patient_ids[(i * 7919) % len(patient_ids)]
+            client.get(f"/api/v1/patients/{patient_id}/care-plan").raise_for_status()
+
+        def export_text(i):
+            with Session(engine) as session:
+                generate_care_plan_summary_text(
+                    patient_ids[(i * 7919) % len(patient_ids)], session
+                )
+
+        def export_json(i):
+            with Session(engine) as session:
+                generate_care_plan_summary_json(
+                    patient_ids[(i * 7919) % len(patient_ids)], session
+                )
+
+        def create_patient(_):
+            person = random_person(rng, used_tins)
+            person["date_of_birth"] = str(person["date_of_birth"])
+            person["consents"] = [
+                {"consent_definition_id": 1, "has_consented": True},
+                {"consent_definition_id": 2, "has_consented": False},
+            ]
+            client.post("/api/v1/patients", json=person).raise_for_status()
+
+        def record_visit(i):
+            patient_id, patient_problem_id = problem_ids[(i * 7919) % len(problem_ids)]
+            base = f"/api/v1/patients/{patient_id}/problems/{patient_problem_id}"
+            client.post(
+                f"{base}/scores",
+                json={
+                    "phase_id": 2,
+                    "rating_knowledge_id": rng.randint(1, 5),
+                    "rating_behavior_id": rng.randint(1, 5),
+                    "rating_status_id": rng.randint(1, 5),
+                },
+            ).raise_for_status()
+            client.post(
+                f"{base}/interventions",
+                json={
+                    "category_id": rng.randint(1, 4),
+                    "target_id": rng.randint(1, 20),
+                    "specific_details": "Benchmark visit",
+                },
+            ).raise_for_status()
+
+        results = [
+            measure("get_patients", get_patients, args.list_iterations, counter),
+            measure("get_patient_names", get_patient_names, args.list_iterations, counter),
+            measure("tin_lookup", tin_lookup, args.list_iterations, counter),
+            measure("search_patients", search_patients, args.iterations, counter),
+            measure("get_care_plan", get_care_plan, args.iterations, counter),
+            measure("export_text", export_text, args.iterations, counter),
+            measure("export_json", export_json, args.iterations, counter),
+            measure("create_patient", create_patient, args.list_iterations, counter),
+            measure("record_visit", record_visit, args.iterations, counter),
+        ]
+
+    print_results(results)
+
+    report = {
+        "meta": {
+            "patients": args.patients,
+            "seed": args.seed,
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+        },
+        "results": {r.name: asdict(r) for r in results},
+    }
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or ".", exist_ok=True)
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("patients") != args.patients:
+            print("\nWARNING: baseline was recorded with a different --patients value.")
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
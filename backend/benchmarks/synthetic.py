@@ -0,0 +1,276 @@
+"""
+Synthetic caseload generator.
+
+Builds N patients with encrypted PII and a clinically plausible spread of
+problems, symptoms, outcome scores and interventions drawn from the seeded
+Omaha taxonomy. Output is fully determined by the seed so benchmark runs
+are comparable across releases.
+"""
+
+import random
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+
+from sqlmodel import Session, select
+
+from src import models
+from src.services import search_index
+from src.services.pii import PIIValues, write_pii
+
+FIRST_NAMES = [
+    "Anna", "Maria", "Elisabeth", "Johanna", "Ursula", "Monika", "Petra",
+    "Sabine", "Karin", "Helga", "Jan", "Peter", "Thomas", "Michael", "Klaus",
+    "Jürgen", "Stefan", "Wolfgang", "Andreas", "Hans", "Ingrid", "Renate",
+    "Gisela", "Brigitte", "Frank", "Dieter", "Günter", "Bernd", "Lena", "Sofia",
+]
+LAST_NAMES = [
+    "Müller", "Schmidt", "Schneider", "Fischer", "Weber", "Meyer", "Wagner",
+    "Becker", "Schulz", "Hoffmann", "Koch", "Richter", "Klein", "Wolf",
+    "Schröder", "Neumann", "Schwarz", "Zimmermann", "Braun", "Krüger",
+    "Hofmann", "Hartmann", "Lange", "Schmitt", "Werner", "Krause", "Meier",
+    "Lehmann", "Schmid", "Schulze",
+]
+STREETS = [
+    "Hauptstraße", "Schulstraße", "Gartenstraße", "Bahnhofstraße", "Dorfstraße",
+    "Bergstraße", "Birkenweg", "Lindenstraße", "Kirchstraße", "Waldstraße",
+]
+CITIES = ["Berlin", "Hamburg", "München", "Köln", "Leipzig", "Dresden", "Bremen"]
+
+# Home-care caseloads skew heavily towards physiological and psychosocial
+# problems; environmental problems are comparatively rare.
+DOMAIN_WEIGHTS = {1: 0.10, 2: 0.30, 3: 0.45, 4: 0.15}
+# Number of problems on a care plan: mostly 2-4.
+PROBLEM_COUNT_WEIGHTS = {1: 0.15, 2: 0.25, 3: 0.25, 4: 0.20, 5: 0.10, 6: 0.05}
+# Modifier types: 1=Health Promotion, 2=Potential, 3=Actual
+MODIFIER_TYPE_WEIGHTS = {1: 0.10, 2: 0.20, 3: 0.70}
+# Modifier domains: 1=Individual, 2=Family, 3=Community
+MODIFIER_DOMAIN_WEIGHTS = {1: 0.85, 2: 0.13, 3: 0.02}
+# Intervention categories: Teaching, Treatments, Case Management, Surveillance
+CATEGORY_WEIGHTS = {1: 0.35, 2: 0.20, 3: 0.15, 4: 0.30}
+ACTIVE_PROBLEM_RATIO = 0.85
+
+
+@dataclass
+class Taxonomy:
+    problems_by_domain: dict[int, list[int]]
+    symptoms_by_problem: dict[int, list[int]]
+    target_ids: list[int]
+    consent_definitions: list[models.ConsentDefinition]
+
+    @classmethod
+    def load(cls, session: Session) -> "Taxonomy":
+        problems_by_domain: dict[int, list[int]] = {}
+        for problem in session.exec(select(models.OmahaProblem)).all():
+            problems_by_domain.setdefault(problem.domain_id, []).append(
+                problem.problem_id  # type: ignore
+            )
+        symptoms_by_problem: dict[int, list[int]] = {}
+        for symptom in session.exec(select(models.Symptom)).all():
+            symptoms_by_problem.setdefault(symptom.problem_id, []).append(
+                symptom.symptom_id  # type: ignore
+            )
+        target_ids = [
+            t.target_id for t in session.exec(select(models.InterventionTarget)).all()
+        ]
+        definitions = list(session.exec(select(models.ConsentDefinition)).all())
+        return cls(problems_by_domain, symptoms_by_problem, target_ids, definitions)  # type: ignore
+
+
+@dataclass
+class Caseload:
+    patient_ids: list[int] = field(default_factory=list)
+    tins: list[str] = field(default_factory=list)
+    names: list[tuple[str, str]] = field(default_factory=list)
+    patient_problem_ids: list[tuple[int, int]] = field(default_factory=list)
+    problems: int = 0
+    symptoms: int = 0
+    scores: int = 0
+    interventions: int = 0
+
+
+def _weighted(rng: random.Random, weights: dict[int, float]) -> int:
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def random_tin(rng: random.Random, used: set[str]) -> str:
+    while True:
+        tin = "".join(str(rng.randint(0, 9)) for _ in range(11))
+        if tin not in used:
+            used.add(tin)
+            return tin
+
+
+def random_person(rng: random.Random, used_tins: set[str]) -> dict:
+    """
+    Returns plaintext PII for one synthetic patient in `PatientCreate` shape.
+    """
+    dob = date(1930, 1, 1) + timedelta(days=rng.randint(0, 75 * 365))
+    return {
+        "first_name": rng.choice(FIRST_NAMES),
+        "last_name": rng.choice(LAST_NAMES),
+        "date_of_birth": dob,
+        "tin": random_tin(rng, used_tins),
+        "phone_number": f"+49 {rng.randint(151, 179)} {rng.randint(1000000, 9999999)}"
+        if rng.random() < 0.7
+        else None,
+        "address": f"{rng.choice(STREETS)} {rng.randint(1, 120)}, {rng.choice(CITIES)}"
+        if rng.random() < 0.8
+        else None,
+    }
+
+
+def _add_problem(
+    session: Session,
+    rng: random.Random,
+    taxonomy: Taxonomy,
+    patient_id: int,
+    admitted_at: datetime,
+    caseload: Caseload,
+) -> None:
+    domain_id = _weighted(rng, DOMAIN_WEIGHTS)
+    problem_id = rng.choice(taxonomy.problems_by_domain[domain_id])
+    modifier_type_id = _weighted(rng, MODIFIER_TYPE_WEIGHTS)
+    is_active = rng.random() < ACTIVE_PROBLEM_RATIO
+
+    problem = models.PatientProblem(
+        patient_id=patient_id,
+        problem_id=problem_id,
+        modifier_domain_id=_weighted(rng, MODIFIER_DOMAIN_WEIGHTS),
+        modifier_type_id=modifier_type_id,
+        is_active=is_active,
+        created_at=admitted_at,
+    )
+    session.add(problem)
+    session.flush()
+    caseload.problems += 1
+    caseload.patient_problem_ids.append((patient_id, problem.patient_problem_id))  # type: ignore
+
+    # Symptoms are only documented for actual problems.
+    if modifier_type_id == 3:
+        candidates = taxonomy.symptoms_by_problem.get(problem_id, [])
+        for symptom_id in rng.sample(candidates, k=min(len(candidates), rng.randint(1, 3))):
+            session.add(
+                models.PatientProblemSymptom(
+                    patient_problem_id=problem.patient_problem_id,  # type: ignore
+                    symptom_id=symptom_id,
+                    symptom_comment=rng.choice([None, None, "observed on visit"]),
+                    created_at=admitted_at,
+                )
+            )
+            caseload.symptoms += 1
+
+    # Ratings start low and drift upwards over the episode of care.
+    knowledge, behavior, status = (rng.randint(1, 3) for _ in range(3))
+    score_count = rng.randint(1, 8)
+    recorded_at = admitted_at
+    for i in range(score_count):
+        if i == 0:
+            phase_id = 1
+        elif i == score_count - 1 and not is_active:
+            phase_id = 3
+        else:
+            phase_id = 2
+        session.add(
+            models.OutcomeScore(
+                patient_problem_id=problem.patient_problem_id,  # type: ignore
+                phase_id=phase_id,
+                rating_knowledge_id=knowledge,
+                rating_behavior_id=behavior,
+                rating_status_id=status,
+                date_recorded=recorded_at,
+                created_at=recorded_at,
+            )
+        )
+        caseload.scores += 1
+        knowledge = min(5, knowledge + rng.choice([0, 0, 1]))
+        behavior = min(5, behavior + rng.choice([0, 0, 1]))
+        status = max(1, min(5, status + rng.choice([-1, 0, 0, 1])))
+        recorded_at += timedelta(days=rng.randint(14, 60))
+
+    for _ in range(rng.randint(2, 20)):
+        performed_at = admitted_at + timedelta(days=rng.randint(0, 365))
+        session.add(
+            models.CareIntervention(
+                patient_problem_id=problem.patient_problem_id,  # type: ignore
+                category_id=_weighted(rng, CATEGORY_WEIGHTS),
+                target_id=rng.choice(taxonomy.target_ids),
+                specific_details=rng.choice(
+                    [None, "Discussed with family", "Medication reviewed", "Follow-up call"]
+                ),
+                date_performed=performed_at,
+                created_at=performed_at,
+            )
+        )
+        caseload.interventions += 1
+
+
+def generate_caseload(
+    session: Session, patients: int, seed: int = 42, batch_size: int = 100
+) -> Caseload:
+    """
+    Inserts `patients` synthetic patients with their clinical history and
+    returns the generated ids and row counts.
+    """
+    rng = random.Random(seed)
+    taxonomy = Taxonomy.load(session)
+    caseload = Caseload()
+    used_tins: set[str] = set()
+    now = datetime.now(timezone.utc)
+
+    for n in range(patients):
+        person = random_person(rng, used_tins)
+        admitted_at = now - timedelta(days=rng.randint(30, 3 * 365))
+
+        patient = models.Patient(created_at=admitted_at)
+        session.add(patient)
+        session.flush()
+        pii = models.PatientPII(
+            patient_id=patient.patient_id,  # type: ignore
+            first_name="",
+            last_name="",
+            date_of_birth="",
+            tin="",
+        )
+        # Honors PII_STORAGE_MODE, so both layouts can be benchmarked
+        write_pii(
+            pii,
+            PIIValues(
+                first_name=person["first_name"],
+                last_name=person["last_name"],
+                date_of_birth=str(person["date_of_birth"]),
+                tin=person["tin"],
+                phone_number=person["phone_number"],
+                address=person["address"],
+            ),
+        )
+        session.add(pii)
+        search_index.replace_patient_tokens(
+            session,
+            patient.patient_id,  # type: ignore
+            search_index.index_tokens(
+                person["first_name"],
+                person["last_name"],
+                str(person["date_of_birth"]),
+                person["tin"],
+            ),
+        )
+        for definition in taxonomy.consent_definitions:
+            session.add(
+                models.PatientConsent(
+                    patient_id=patient.patient_id,  # type: ignore
+                    consent_definition_id=definition.consent_definition_id,  # type: ignore
+                    has_consented=definition.is_mandatory or rng.random() < 0.6,
+                )
+            )
+        caseload.patient_ids.append(patient.patient_id)  # type: ignore
+        caseload.tins.append(person["tin"])
+        caseload.names.append((person["first_name"], person["last_name"]))
+
+        for _ in range(_weighted(rng, PROBLEM_COUNT_WEIGHTS)):
+            _add_problem(session, rng, taxonomy, patient.patient_id, admitted_at, caseload)  # type: ignore
+
+        if (n + 1) % batch_size == 0:
+            session.commit()
+
+    session.commit()
+    return caseload
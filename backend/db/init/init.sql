@@ -136,6 +136,7 @@ CREATE TABLE patient_pii (
     tin TEXT NOT NULL,
     phone_number TEXT,
     address TEXT,
+    pii_record TEXT,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (patient_id) REFERENCES patient(patient_id) ON DELETE CASCADE
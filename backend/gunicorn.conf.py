@@ -0,0 +1,59 @@
+"""
+Production server profile:
+
+    gunicorn -c gunicorn.conf.py src.main:app
+
+Worker count defaults to the CPUs available to the container and can be
+overridden with WEB_CONCURRENCY. Send SIGHUP for a graceful reload (new
+workers are started before the old ones finish their requests).
+"""
+
+import os
+
+from src.config import settings
+from src.services.offload import available_cpus
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+# Also read by the workers, which size their offload pools by it
+workers = int(os.environ.setdefault("WEB_CONCURRENCY", str(available_cpus())))
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# Import the application once in the master; workers are forked from it
+preload_app = True
+graceful_timeout = 30
+timeout = 60
+keepalive = 5
+# Recycle workers periodically so memory growth stays bounded
+max_requests = 2000
+max_requests_jitter = 200
+
+accesslog = "-"
+
+
+def on_starting(server):
+    # Initialize the database once, before any worker starts, so workers
+    # do not race to create tables or build the search index and aggregates
+    from sqlmodel import Session
+
+    from src.database import INITIALIZED_ENV, create_db_and_tables, engine
+    from src.services.caseload import ensure_aggregates
+    from src.services.search_index import ensure_search_index
+
+    create_db_and_tables()
+    with Session(engine) as session:
+        ensure_search_index(session)
+        ensure_aggregates(session)
+    engine.dispose()
+    # Inherited by the workers, whose startup then skips this
+    os.environ[INITIALIZED_ENV] = "1"
+    server.log.info(
+        "Starting %s workers (cache backend: %s)", workers, settings.CACHE_BACKEND
+    )
+
+
+def post_fork(server, worker):
+    # Connections must not be shared between processes; drop any the
+    # master opened so each worker opens its own
+    from src.database import engine
+
+    engine.dispose(close=False)
@@ -0,0 +1,4 @@
+import time
+
+# When the application package started importing (startup timing log)
+IMPORT_STARTED = time.perf_counter()
@@ -0,0 +1,149 @@
+"""
+Maintenance commands. Run from the backend directory:
+
+    uv run python -m src.cli <command> [options]
+"""
+
+import argparse
+
+from sqlmodel import Session
+
+from .database import create_db_and_tables, engine
+
+
+def rebuild_search_index(args: argparse.Namespace) -> None:
+    from .services.search_index import rebuild_search_index
+
+    with Session(engine) as session:
+        count = rebuild_search_index(session, batch_size=args.batch_size)
+    print(f"Indexed {count} patients.")
+
+
+def rotate_keys(args: argparse.Namespace) -> None:
+    from .services.key_rotation import run_rotation, start_rotation
+
+    with Session(engine) as session:
+        job = start_rotation(session, args.batch_size, args.pause_ms)
+    print(f"Job {job.job_id}: re-encrypting PII under key '{job.target_key_id}'")
+
+    def report(job):
+        total = max(job.rows_total, job.rows_scanned, 1)
+        print(
+            f"  {job.rows_scanned}/{total} rows scanned "
+            f"({job.rows_scanned / total:.0%}), {job.rows_rotated} re-encrypted"
+        )
+
+    job = run_rotation(job.job_id, progress=report)  # type: ignore
+    print(f"Job {job.job_id} {job.status}.")
+
+
+def migrate_pii_storage(args: argparse.Namespace) -> None:
+    from .services.pii import migrate_storage
+
+    def report(scanned, converted):
+        print(f"  {scanned} rows scanned, {converted} converted")
+
+    converted = migrate_storage(
+        args.to, args.batch_size, args.pause_ms, progress=report
+    )
+    print(f"Converted {converted} rows to '{args.to}' storage.")
+
+
+def rebuild_aggregates(args: argparse.Namespace) -> None:
+    from .services import caseload
+
+    with Session(engine) as session:
+        if args.check:
+            differences = caseload.check(session)
+            for difference in differences:
+                print(f"  {difference}")
+            print(f"Differences found: {len(differences)}")
+            if differences:
+                raise SystemExit(1)
+            return
+        counted = caseload.rebuild(session)
+    print(f"Rebuilt caseload aggregates from {counted} active problems.")
+
+
+def import_patients(args: argparse.Namespace) -> None:
+    from .services.patient_import import ImportFormatError, import_patients
+
+    file_format = args.format or ("csv" if args.file.endswith(".csv") else "ndjson")
+
+    def report(result):
+        print(f"  {result.imported} imported, {result.failed} failed")
+
+    with open(args.file, encoding="utf-8-sig", newline="") as stream:
+        with Session(engine) as session:
+            try:
+                result = import_patients(
+                    session, stream, file_format, args.batch_size, progress=report
+                )
+            except ImportFormatError as e:
+                raise SystemExit(f"Cannot import {args.file}: {e.detail}")
+    for error in result.errors:
+        print(f"  line {error.line}: {error.detail}")
+    print(f"Imported {result.imported} patients, {result.failed} rows failed.")
+    if result.failed:
+        raise SystemExit(1)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m src.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser(
+        "rebuild-search-index",
+        help="Recompute all patient search tokens (e.g. after changing SEARCH_INDEX_KEY)",
+    )
+    command.add_argument("--batch-size", type=int, default=500)
+    command.set_defaults(handler=rebuild_search_index)
+
+    command = commands.add_parser(
+        "rotate-keys",
+        help="Re-encrypt all PII under the primary key of ENCRYPTION_KEYS (resumable)",
+    )
+    command.add_argument("--batch-size", type=int, default=500)
+    command.add_argument(
+        "--pause-ms", type=int, default=50, help="Pause between batches (throttling)"
+    )
+    command.set_defaults(handler=rotate_keys)
+
+    command = commands.add_parser(
+        "migrate-pii-storage",
+        help="Convert stored PII between per-field and single-record encryption (resumable)",
+    )
+    command.add_argument("--to", choices=["fields", "record"], required=True)
+    command.add_argument("--batch-size", type=int, default=500)
+    command.add_argument(
+        "--pause-ms", type=int, default=50, help="Pause between batches (throttling)"
+    )
+    command.set_defaults(handler=migrate_pii_storage)
+
+    command = commands.add_parser(
+        "rebuild-aggregates",
+        help="Recompute the caseload dashboard aggregates from the clinical tables",
+    )
+    command.add_argument(
+        "--check", action="store_true", help="Only report differences (exit code 1 if any)"
+    )
+    command.set_defaults(handler=rebuild_aggregates)
+
+    command = commands.add_parser(
+        "import-patients",
+        help="Bulk import patients from a CSV or NDJSON file (rows with errors are skipped)",
+    )
+    command.add_argument("file")
+    command.add_argument(
+        "--format", choices=["csv", "ndjson"], help="Default: from the file extension"
+    )
+    command.add_argument("--batch-size", type=int, help="Default: IMPORT_BATCH_SIZE")
+    command.set_defaults(handler=import_patients)
+
+    args = parser.parse_args(argv)
+    create_db_and_tables()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,6 @@
+from typing import Literal
+
+from pydantic import model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -6,10 +9,88 @@ class Settings(BaseSettings):
         env_file=".env", env_file_encoding="utf-8", extra="ignore"
     )
     ENCRYPTION_KEY: str | None = None
+    # Key ring for rotation: "k2:<fernet key>,k1:<fernet key>", primary first
+    ENCRYPTION_KEYS: str | None = None
+    SEARCH_INDEX_KEY: str | None = None
+    # How new PII is written: "fields" (one Fernet token per column) or
+    # "record" (all fields sealed together); both layouts are always readable
+    PII_STORAGE_MODE: Literal["fields", "record"] = "fields"
+    # In-memory cache of decrypted PII; a size of 0 disables it
+    PII_CACHE_SIZE: int = 1000
+    PII_CACHE_TTL_SECONDS: float = 300
+    # In-memory cache of rendered care plan exports (they contain PII, so
+    # never shared): at most this many documents and bytes; 0 disables it
+    EXPORT_CACHE_SIZE: int = 256
+    EXPORT_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    EXPORT_CACHE_TTL_SECONDS: float = 300
+    # Page size of PDF exports: "A4" or "letter"
+    PDF_PAGE_SIZE: Literal["A4", "letter"] = "A4"
+    # Process pool per worker for CPU-bound work (bulk PII decryption, large
+    # exports, PDFs): by default the available CPUs divided by WEB_CONCURRENCY
+    # (at least 1), 0 runs it all inline.
+    # Jobs smaller than OFFLOAD_MIN_ROWS rows run inline. Beyond
+    # OFFLOAD_MAX_PENDING jobs in flight, requests wait up to
+    # OFFLOAD_WAIT_SECONDS for a slot and then get a 503.
+    OFFLOAD_PROCESSES: int | None = None
+    OFFLOAD_MIN_ROWS: int = 200
+    OFFLOAD_MAX_PENDING: int = 32
+    OFFLOAD_WAIT_SECONDS: float = 10
     GO_URL: str | None = None
     GO_USERNAME: str | None = None
     GO_PASSWORD: str | None = None
     GO_NOTEBOOK_ID: str | None = None
+    # Shared cache for taxonomy and rendered responses: "memory" (per worker
+    # process) or "redis" (CACHE_URL, e.g. redis://localhost:6379/0)
+    CACHE_BACKEND: Literal["memory", "redis"] = "memory"
+    CACHE_URL: str | None = None
+    CACHE_MAX_ENTRIES: int = 1024
+    # Responses smaller than this (bytes) are sent uncompressed
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+    # Audit events are written in the background, in batches of up to
+    # AUDIT_BATCH_SIZE or at least every AUDIT_FLUSH_INTERVAL_MS
+    AUDIT_BATCH_SIZE: int = 500
+    AUDIT_FLUSH_INTERVAL_MS: int = 200
+    # When this many events are pending, writers flush them synchronously
+    AUDIT_QUEUE_SIZE: int = 10000
+    # Failed batches are retried with backoff for up to this long, then kept in
+    # a dead-letter file (default: next to the database) and written again
+    # once the database accepts events
+    AUDIT_RETRY_SECONDS: float = 300
+    AUDIT_DEAD_LETTER_PATH: str | None = None
+    # How long reading audit events, and shutdown, wait for the pending
+    # events of the worker to be written. Shutdown moves the rest to the
+    # dead-letter file; keep it below gunicorn's graceful_timeout.
+    AUDIT_FLUSH_TIMEOUT_SECONDS: float = 5
+    # How often waiting change feed clients check for other workers' changes
+    CHANGES_POLL_INTERVAL_MS: int = 1000
+    # Patients inserted per transaction by bulk imports (POST /patients/import,
+    # `python -m src.cli import-patients`)
+    IMPORT_BATCH_SIZE: int = 500
+    # Largest upload POST /patients/import accepts, in bytes (413 above it)
+    IMPORT_MAX_BYTES: int = 100 * 1024 * 1024
+    # Most operations accepted in one POST /sync request
+    SYNC_MAX_OPERATIONS: int = 1000
+    # How long responses are kept for replay after an Idempotency-Key request
+    IDEMPOTENCY_TTL_HOURS: float = 24
+    # Problems not assessed (scored) for this many days are overdue. After a
+    # change, existing due dates are recomputed at the next startup.
+    REASSESSMENT_INTERVAL_DAYS: int = 30
+    # Skip the seed data check and backfill the search index in the
+    # background, so the first request is served sooner
+    FAST_STARTUP: bool = False
+    DATABASE_PATH: str = "./db/omaha.sqlite3"
+    DB_ECHO: bool = True
+
+    @model_validator(mode="after")
+    def _check_search_index_key(self) -> "Settings":
+        # Deriving the index key from the key ring's primary key would make
+        # every stored search token stale at the first rotation
+        if self.ENCRYPTION_KEYS and not (self.SEARCH_INDEX_KEY or self.ENCRYPTION_KEY):
+            raise ValueError(
+                "ENCRYPTION_KEYS requires SEARCH_INDEX_KEY (or ENCRYPTION_KEY) to be set; "
+                "after setting it, run `python -m src.cli rebuild-search-index`"
+            )
+        return self
 
 
 settings = Settings()
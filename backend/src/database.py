@@ -1,25 +1,142 @@
 import os
 from sqlmodel import create_engine, Session, SQLModel
-from sqlalchemy import text
+from sqlalchemy import event, inspect, text
 
-DB_DIR = "./db"
-DB_FILE = "omaha.sqlite3"
-DATABASE_PATH = os.path.join(DB_DIR, DB_FILE)
+from . import models  # noqa: F401  (registers tables on SQLModel.metadata)
+from .config import settings
+
+DATABASE_PATH = settings.DATABASE_PATH
+DB_DIR = os.path.dirname(DATABASE_PATH) or "."
 DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
 
 # Get the absolute path to init.sql
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 INIT_SQL_PATH = os.path.join(BASE_DIR, "db", "init", "init.sql")
-engine = create_engine(DATABASE_URL, echo=True)
+# Set by the gunicorn master once it has initialized the database, so that
+# the workers forked from it skip doing it again
+INITIALIZED_ENV = "DATABASE_INITIALIZED"
+engine = create_engine(
+    DATABASE_URL,
+    echo=settings.DB_ECHO,
+    # Wait for other worker processes' write locks instead of failing
+    connect_args={"timeout": 30},
+)
+
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers in other worker processes proceed during a write
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
+
+def _add_missing_columns():
+    """
+    Adds nullable columns introduced since the database was initialized.
+    create_all() only creates missing tables, never missing columns.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                print(f"Adding column {table.name}.{column.name}")
+                connection.execute(
+                    text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+                )
+
+
+def _rekey_sync_operations():
+    """
+    Rebuilds a sync_operation table keyed by op_id alone with the
+    (device_id, op_id) key. Operations received before device ids were
+    recorded keep an empty device id, and their client ids are dropped:
+    no device can refer to them.
+    """
+    inspector = inspect(engine)
+    table = models.SyncOperationRecord.__tablename__
+    if not inspector.has_table(table):
+        return
+    if inspector.get_pk_constraint(table)["constrained_columns"] != ["op_id"]:
+        return
+    print(f"Rebuilding {table} with a (device_id, op_id) key")
+    columns = {column["name"] for column in inspector.get_columns(table)}
+    device_id = "device_id" if "device_id" in columns else "NULL"
+    with engine.begin() as connection:
+        for index in inspector.get_indexes(table):
+            connection.execute(text(f"DROP INDEX {index['name']}"))
+        connection.execute(text(f"ALTER TABLE {table} RENAME TO {table}_old"))
+        models.SyncOperationRecord.__table__.create(connection)  # type: ignore
+        connection.execute(
+            text(
+                f"INSERT INTO {table} (device_id, op_id, client_id, status, table_name, "
+                "record_id, detail, received_at) "
+                f"SELECT COALESCE({device_id}, ''), op_id, "
+                f"CASE WHEN {device_id} IS NULL THEN NULL ELSE client_id END, "
+                f"status, table_name, record_id, detail, received_at FROM {table}_old"
+            )
+        )
+        connection.execute(text(f"DROP TABLE {table}_old"))
+
+
+def _deduplicate_symptoms():
+    """
+    Soft-deletes all but the first of the active duplicate symptom rows
+    recorded before ux_patient_problem_symptom_active existed, so that the
+    index can be created. Adding a symptom relies on it to reject duplicates.
+    """
+    inspector = inspect(engine)
+    table = models.PatientProblemSymptom.__tablename__
+    if not inspector.has_table(table) or any(
+        index["name"] == "ux_patient_problem_symptom_active"
+        for index in inspector.get_indexes(table)
+    ):
+        return
+    with engine.begin() as connection:
+        result = connection.execute(
+            text(
+                f"UPDATE {table} SET deleted_at = CURRENT_TIMESTAMP "
+                "WHERE deleted_at IS NULL AND patient_problem_symptom_id NOT IN ("
+                f"SELECT MIN(patient_problem_symptom_id) FROM {table} "
+                "WHERE deleted_at IS NULL GROUP BY patient_problem_id, symptom_id)"
+            )
+        )
+    if result.rowcount:
+        print(f"Soft-deleted {result.rowcount} duplicate symptom rows")
 
 
-def create_db_and_tables():
+def _add_missing_indexes():
+    """
+    Creates indexes introduced since the database was initialized, like
+    _add_missing_columns(). Code relies on unique indexes to reject
+    duplicates, so one that existing rows violate stops the startup.
+    """
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(engine, checkfirst=True)
+            except Exception as e:
+                if index.unique:
+                    raise RuntimeError(f"Could not create unique index {index.name}: {e}")
+                print(f"Could not create index {index.name}: {e}")
+
+
+def create_db_and_tables(verify: bool = True):
     """
     Initializes the database. If the database file doesn't exist,
     it creates the directory and runs the init.sql script.
+    With verify=False an existing database is only migrated, without
+    the seed data check and diagnostic output.
     """
-    print(f"Database path: {DATABASE_PATH}")
-    print(f"Init SQL path: {INIT_SQL_PATH}")
+    if verify:
+        print(f"Database path: {DATABASE_PATH}")
+        print(f"Init SQL path: {INIT_SQL_PATH}")
     
     if not os.path.exists(DATABASE_PATH):
         print("Database not found, initializing from init.sql...")
@@ -66,6 +183,15 @@ def create_db_and_tables():
         else:
             print(f"ERROR: Init SQL file not found at {INIT_SQL_PATH}")
     else:
+        # Create tables, columns and indexes added since the database was initialized
+        SQLModel.metadata.create_all(engine)
+        _add_missing_columns()
+        _rekey_sync_operations()
+        _deduplicate_symptoms()
+        _add_missing_indexes()
+        if not verify:
+            return
+
         print("Database already exists.")
         
         # Verify data exists
@@ -83,4 +209,20 @@ def create_db_and_tables():
 
 def get_session():
     with Session(engine) as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+def begin_immediate(session: Session) -> None:
+    """
+    Starts the session's transaction with the database write lock taken.
+    pysqlite only issues BEGIN before the first write, so rows a batch job
+    reads first could otherwise change before it writes them back. Must be
+    called before the session writes anything.
+    """
+    session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+
+
+# Session hooks that maintain the audit log, change feed and caseload
+# aggregates. Imported here, after `engine` exists, so they are active in
+# every process that writes through the ORM (API, CLI, benchmarks).
+from .services import audit, caseload, changes  # noqa: E402, F401
@@ -1,26 +1,109 @@
-from contextlib import asynccontextmanager
-from fastapi import FastAPI
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
-from .database import create_db_and_tables
+from sqlmodel import Session
+
+from . import IMPORT_STARTED
+from .config import settings
+from .database import INITIALIZED_ENV, create_db_and_tables, engine
+from .middleware import (
+    AuditActorMiddleware,
+    CompressionMiddleware,
+    IdempotencyMiddleware,
+    MetricsMiddleware,
+    ResponseFormatMiddleware,
+)
+from .responses import ORJSONResponse
 from .routers import (
+    admin,
     assessments,
+    audit,
     care_plans,
+    changes,
+    dashboard,
+    monitoring,
     patients,
     interventions,
     problems,
     static,
+    sync,
+    timeline,
+    worklist,
 )
+from .services import offload
+from .services.audit import WRITER as AUDIT_WRITER
+from .services.caseload import ensure_aggregates
+from .services.metrics import register_pool_collector
+from .services.search_index import ensure_search_index
+
+
+@contextmanager
+def startup_phase(name: str):
+    started = time.perf_counter()
+    yield
+    print(f"Startup: {name} took {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+def index_existing_patients():
+    with Session(engine) as session:
+        indexed = ensure_search_index(session)
+    if indexed:
+        print(f"Search index: indexed {indexed} existing patients")
+
+
+def build_caseload_aggregates():
+    with Session(engine) as session:
+        counted = ensure_aggregates(session)
+    if counted is not None:
+        print(f"Caseload aggregates: built from {counted} active problems")
+
 
+def backfill_derived_data():
+    index_existing_patients()
+    build_caseload_aggregates()
+
+
+def initialize_database():
+    with startup_phase("database"):
+        create_db_and_tables(verify=not settings.FAST_STARTUP)
+    if settings.FAST_STARTUP:
+        # Until the backfill finishes, patients created before the search
+        # index existed are missing from search results, and the dashboard
+        # of a database that predates it is empty
+        threading.Thread(
+            target=backfill_derived_data, name="startup-backfill", daemon=True
+        ).start()
+    else:
+        with startup_phase("search index"):
+            index_existing_patients()
+        with startup_phase("caseload aggregates"):
+            build_caseload_aggregates()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    create_db_and_tables()
+    print(f"Startup: imports took {_import_duration * 1000:.0f} ms")
+    if os.environ.get(INITIALIZED_ENV):
+        print("Startup: database initialized by the gunicorn master")
+    else:
+        initialize_database()
+    # The offload pool's processes start in the background
+    offload.start()
     yield
+    AUDIT_WRITER.close(settings.AUDIT_FLUSH_TIMEOUT_SECONDS)
+    offload.shutdown()
 
 
-app = FastAPI(title="Omaha System API", version="0.1", lifespan=lifespan)
+app = FastAPI(
+    title="Omaha System API",
+    version="0.1",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 # FIXED CORS Configuration
 app.add_middleware(
@@ -31,6 +114,16 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
     expose_headers=["*"],  # Expose all headers
 )
+# Inside compression, so stored responses are uncompressed
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(AuditActorMiddleware)
+app.add_middleware(ResponseFormatMiddleware)
+app.add_middleware(
+    CompressionMiddleware, minimum_size=settings.COMPRESSION_MINIMUM_SIZE
+)
+# Added last so it is outermost and its timings include compression
+app.add_middleware(MetricsMiddleware)
+register_pool_collector(engine)
 
 app.include_router(static.router, prefix="/api/v1")
 app.include_router(patients.router, prefix="/api/v1")
@@ -38,9 +131,28 @@ app.include_router(assessments.router, prefix="/api/v1")
 app.include_router(interventions.router, prefix="/api/v1")
 app.include_router(care_plans.router, prefix="/api/v1")
 app.include_router(problems.router, prefix="/api/v1")
+app.include_router(monitoring.router, prefix="/api/v1")
+app.include_router(admin.router, prefix="/api/v1")
+app.include_router(audit.router, prefix="/api/v1")
+app.include_router(changes.router, prefix="/api/v1")
+app.include_router(sync.router, prefix="/api/v1")
+app.include_router(dashboard.router, prefix="/api/v1")
+app.include_router(worklist.router, prefix="/api/v1")
+app.include_router(timeline.router, prefix="/api/v1")
+
+
+@app.exception_handler(offload.OffloadBusy)
+def offload_busy_handler(request: Request, exc: offload.OffloadBusy):
+    # Back-pressure: the worker's CPU-bound jobs are saturated
+    return ORJSONResponse(
+        status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"}
+    )
 
 
 @app.get("/api/v1/health")
 async def health_check():
     return {"status": "ok"}
 
+
+_import_duration = time.perf_counter() - IMPORT_STARTED
+
@@ -0,0 +1,371 @@
+import time
+import zlib
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .responses import ORJSONResponse, negotiate_format, response_format
+from .services import idempotency, metrics
+from .services.audit import current_actor
+
+# Optional encodings, see the "compression" extra in pyproject.toml
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+def _route_template(scope: Scope) -> str:
+    """
+    Resolves the route template (e.g. /api/v1/patients/{patient_id}) for a
+    request so metrics are labelled per route rather than per raw URL.
+    """
+    app = scope.get("app")
+    for route in getattr(app, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", scope["path"])
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Records request counts, in-flight requests and latency per route template.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = _route_template(scope)
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        metrics.HTTP_REQUESTS_IN_PROGRESS.inc(method=method, route=route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - started, method=method, route=route
+            )
+            metrics.HTTP_REQUESTS.inc(
+                method=method, route=route, status=str(status_code)
+            )
+            metrics.HTTP_REQUESTS_IN_PROGRESS.dec(method=method, route=route)
+
+
+class AuditActorMiddleware:
+    """
+    Makes the X-Actor-Id request header available to the audit log as the
+    actor of every change made while handling the request.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = current_actor.set(Headers(scope=scope).get("x-actor-id"))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_actor.reset(token)
+
+
+class ResponseFormatMiddleware:
+    """
+    Negotiates the response format (JSON or MessagePack) from the Accept
+    header for the responses rendered while handling the request.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = response_format.set(negotiate_format(Headers(scope=scope).get("accept", "")))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            response_format.reset(token)
+
+
+class _GzipEncoder:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes, flush: bool) -> bytes:
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliEncoder:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)  # type: ignore
+
+    def compress(self, data: bytes, flush: bool) -> bytes:
+        out = self._compressor.process(data)
+        return out + self._compressor.flush() if flush else out
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class _ZstdEncoder:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()  # type: ignore
+
+    def compress(self, data: bytes, flush: bool) -> bytes:
+        out = self._compressor.compress(data)
+        if flush:
+            out += self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)  # type: ignore
+        return out
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+# Server preference among equally acceptable encodings
+ENCODERS = {
+    name: factory
+    for name, factory, available in (
+        ("zstd", lambda: _ZstdEncoder(3), zstandard is not None),
+        ("br", lambda: _BrotliEncoder(4), brotli is not None),
+        ("gzip", lambda: _GzipEncoder(6), True),
+    )
+    if available
+}
+
+# Already compressed, or must reach the client unbuffered
+UNCOMPRESSIBLE_TYPES = (
+    "image/",
+    "audio/",
+    "video/",
+    "application/zip",
+    "application/gzip",
+    "application/pdf",
+    "text/event-stream",
+)
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    """
+    Picks the supported encoding with the highest q-value in an
+    Accept-Encoding header, or None if no supported encoding is acceptable.
+    """
+    weights: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    best, best_q = None, 0.0
+    for name in ENCODERS:
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with the best encoding the client accepts (zstd,
+    br or gzip). Responses smaller than `minimum_size` and already encoded
+    or uncompressible content types are passed through. Streaming
+    responses are compressed chunk by chunk and flushed after each chunk,
+    so they still reach the client incrementally.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Message | None = None
+        encoder = None
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start_message, encoder, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                passthrough = "content-encoding" in headers or content_type.startswith(
+                    UNCOMPRESSIBLE_TYPES
+                )
+                if passthrough:
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if encoder is None:
+                assert start_message is not None
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                encoder = ENCODERS[encoding]()
+                headers = MutableHeaders(raw=start_message["headers"])
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["Content-Length"]
+                    body = encoder.compress(body, flush=True)
+                else:
+                    body = encoder.compress(body, flush=False) + encoder.finish()
+                    headers["Content-Length"] = str(len(body))
+                await send(start_message)
+                await send({"type": "http.response.body", "body": body, "more_body": more_body})
+                return
+
+            if more_body:
+                body = encoder.compress(body, flush=True)
+            else:
+                body = encoder.compress(body, flush=False) + encoder.finish()
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class IdempotencyMiddleware:
+    """
+    Executes a POST request carrying an Idempotency-Key header only once:
+    sending it again returns the stored response (with an
+    Idempotent-Replayed header). Keys of requests that failed with a
+    server error are released so the request can be retried.
+    """
+
+    def __init__(self, app: ASGIApp, methods: tuple[str, ...] = ("POST",)):
+        self.app = app
+        self.methods = methods
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in self.methods:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        key = headers.get("idempotency-key")
+        if not key:
+            await self.app(scope, receive, send)
+            return
+
+        # The body is part of the request's fingerprint
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        request_hash = idempotency.fingerprint(
+            scope["method"],
+            scope["path"],
+            scope.get("query_string", b""),
+            body,
+            negotiate_format(headers.get("accept", "")),
+        )
+        try:
+            record = await run_in_threadpool(
+                idempotency.begin, key, scope["method"], scope["path"], request_hash
+            )
+        except idempotency.IdempotencyError as e:
+            response: Response = ORJSONResponse({"detail": e.detail}, status_code=e.status_code)
+            await response(scope, receive, send)
+            return
+        if record is not None:
+            response = Response(
+                record.response_body,
+                status_code=record.status_code,  # type: ignore
+                media_type=record.content_type,
+                headers={"Idempotent-Replayed": "true"},
+            )
+            await response(scope, receive, send)
+            return
+
+        body_sent = False
+
+        async def receive_wrapper() -> Message:
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status_code = 500
+        content_type = None
+        chunks: list[bytes] = []
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, content_type
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                content_type = Headers(raw=message["headers"]).get("content-type")
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        except BaseException:
+            await run_in_threadpool(idempotency.release, key)
+            raise
+        if status_code >= 500:
+            await run_in_threadpool(idempotency.release, key)
+        else:
+            await run_in_threadpool(
+                idempotency.complete, key, status_code, content_type, b"".join(chunks)
+            )
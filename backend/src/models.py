@@ -1,7 +1,17 @@
 import uuid
-from datetime import datetime, timezone
-
-from sqlmodel import Field, Relationship, SQLModel, Column, DateTime
+from datetime import date, datetime, timezone
+
+from sqlmodel import (
+    Field,
+    Relationship,
+    SQLModel,
+    Column,
+    DateTime,
+    Index,
+    JSON,
+    LargeBinary,
+    text,
+)
 
 # ==========================================
 # 1. STATIC TABLES (Taxonomy)
@@ -113,6 +123,9 @@ class PatientPII(SQLModel, table=True):
     tin: str
     phone_number: str | None = None
     address: str | None = None
+    # All fields sealed together (PII_STORAGE_MODE=record); the columns
+    # above are then left blank
+    pii_record: str | None = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime | None = Field(
         default=None,
@@ -122,6 +135,18 @@ class PatientPII(SQLModel, table=True):
     patient: "Patient" = Relationship(back_populates="pii")
 
 
+# Blinded (keyed HMAC) tokens derived from PII, so patients can be looked up
+# by name, DOB or TIN without decrypting every row.
+class PatientSearchToken(SQLModel, table=True):
+    __tablename__ = "patient_search_token"  # type: ignore
+    __table_args__ = (
+        Index("ix_patient_search_token_token_patient", "token", "patient_id"),
+    )
+    search_token_id: int | None = Field(default=None, primary_key=True)
+    patient_id: int = Field(foreign_key="patient.patient_id", index=True)
+    token: str
+
+
 class ConsentDefinition(SQLModel, table=True):
     __tablename__ = "consent_definition"  # type: ignore
     consent_definition_id: int | None = Field(default=None, primary_key=True)
@@ -167,12 +192,15 @@ class Patient(SQLModel, table=True):
 
 class PatientProblem(SQLModel, table=True):
     __tablename__ = "patient_problem"  # type: ignore
+    __table_args__ = (Index("ix_patient_problem_patient_created", "patient_id", "created_at"),)
     patient_problem_id: int | None = Field(default=None, primary_key=True)
     patient_id: int = Field(foreign_key="patient.patient_id")
     problem_id: int = Field(foreign_key="omaha_problem.problem_id")
     modifier_domain_id: int = Field(foreign_key="modifier_domain.modifier_domain_id")
     modifier_type_id: int = Field(foreign_key="modifier_type.modifier_type_id")
     is_active: bool = Field(default=True)
+    # Clinician responsible for reassessments (as sent in X-Actor-Id)
+    clinician_id: str | None = None
 
     # Audit timestamps
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -199,6 +227,17 @@ class PatientProblem(SQLModel, table=True):
 
 class PatientProblemSymptom(SQLModel, table=True):
     __tablename__ = "patient_problem_symptom"  # type: ignore
+    # A symptom is recorded at most once per problem (deleted rows aside)
+    __table_args__ = (
+        Index(
+            "ux_patient_problem_symptom_active",
+            "patient_problem_id",
+            "symptom_id",
+            unique=True,
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
+        Index("ix_patient_problem_symptom_problem_created", "patient_problem_id", "created_at"),
+    )
     patient_problem_symptom_id: int | None = Field(default=None, primary_key=True)
     patient_problem_id: int = Field(foreign_key="patient_problem.patient_problem_id")
     symptom_id: int = Field(foreign_key="symptom.symptom_id")
@@ -217,6 +256,16 @@ class PatientProblemSymptom(SQLModel, table=True):
 
 class OutcomeScore(SQLModel, table=True):
     __tablename__ = "outcome_score"  # type: ignore
+    # History reads filter by problem (and phase) and page by date
+    __table_args__ = (
+        Index("ix_outcome_score_problem_recorded", "patient_problem_id", "date_recorded"),
+        Index(
+            "ix_outcome_score_problem_phase_recorded",
+            "patient_problem_id",
+            "phase_id",
+            "date_recorded",
+        ),
+    )
     score_id: int | None = Field(default=None, primary_key=True)
     patient_problem_id: int = Field(foreign_key="patient_problem.patient_problem_id")
 
@@ -246,6 +295,22 @@ class OutcomeScore(SQLModel, table=True):
 
 class CareIntervention(SQLModel, table=True):
     __tablename__ = "care_intervention"  # type: ignore
+    # History reads filter by problem (and category or target) and page by date
+    __table_args__ = (
+        Index("ix_care_intervention_problem_performed", "patient_problem_id", "date_performed"),
+        Index(
+            "ix_care_intervention_problem_category_performed",
+            "patient_problem_id",
+            "category_id",
+            "date_performed",
+        ),
+        Index(
+            "ix_care_intervention_problem_target_performed",
+            "patient_problem_id",
+            "target_id",
+            "date_performed",
+        ),
+    )
     intervention_id: int | None = Field(default=None, primary_key=True)
     patient_problem_id: int = Field(foreign_key="patient_problem.patient_problem_id")
 
@@ -264,3 +329,157 @@ class CareIntervention(SQLModel, table=True):
     patient_problem: PatientProblem = Relationship(back_populates="interventions")
     category: InterventionCategory = Relationship()
     target: InterventionTarget = Relationship()
+
+
+# ==========================================
+# 3. OPERATIONAL TABLES
+# ==========================================
+
+
+class KeyRotationJob(SQLModel, table=True):
+    __tablename__ = "key_rotation_job"  # type: ignore
+    job_id: int | None = Field(default=None, primary_key=True)
+    target_key_id: str
+    status: str = Field(default="pending")  # pending, running, paused, completed, failed
+    batch_size: int = Field(default=500)
+    pause_ms: int = Field(default=50)
+    # Keyset cursor: every PII row with a lower or equal id has been processed
+    last_patient_pii_id: int = Field(default=0)
+    rows_total: int = Field(default=0)
+    rows_scanned: int = Field(default=0)
+    rows_rotated: int = Field(default=0)
+    error: str | None = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime | None = None
+    finished_at: datetime | None = None
+
+
+# Append-only history of clinical and PII changes, written in batches by
+# services/audit.py after the originating transaction has committed.
+class AuditEvent(SQLModel, table=True):
+    __tablename__ = "audit_event"  # type: ignore
+    __table_args__ = (
+        Index("ix_audit_event_patient_occurred", "patient_id", "occurred_at"),
+        Index("ix_audit_event_record", "table_name", "record_id"),
+    )
+    audit_event_id: int | None = Field(default=None, primary_key=True)
+    occurred_at: datetime = Field(index=True)
+    actor: str | None = None
+    action: str  # create, update, delete
+    table_name: str
+    record_id: int
+    patient_id: int | None = None
+    # Created: {column: value}; updated: {column: [old, new]}. PII values
+    # are never stored, only the names of the changed columns.
+    changes: dict | None = Field(default=None, sa_column=Column(JSON))
+
+
+# One entry per changed patient, problem, symptom, score or intervention,
+# written in the same transaction as the change. `seq` only ever grows
+# (AUTOINCREMENT never reuses values), so clients can ask for everything
+# after the last sequence number they have seen.
+class ChangeLogEntry(SQLModel, table=True):
+    __tablename__ = "change_log"  # type: ignore
+    __table_args__ = (
+        Index("ix_change_log_patient_seq", "patient_id", "seq"),
+        {"sqlite_autoincrement": True},
+    )
+    seq: int | None = Field(default=None, primary_key=True)
+    table_name: str
+    record_id: int
+    patient_id: int | None = None
+    changed_at: datetime
+
+
+# Operations received through POST /sync. A device that retries a batch,
+# e.g. after losing the response, gets the original results back instead
+# of applying its operations twice.
+class SyncOperationRecord(SQLModel, table=True):
+    __tablename__ = "sync_operation"  # type: ignore
+    # A client id names one created problem per device
+    __table_args__ = (
+        Index("ux_sync_operation_device_client", "device_id", "client_id", unique=True),
+    )
+    # Operation ids are generated by each device, so they are unique per device
+    device_id: str = Field(primary_key=True)
+    op_id: str = Field(primary_key=True)
+    # Set on applied create_problem operations only
+    client_id: str | None = None
+    status: str  # applied, conflict, rejected
+    table_name: str | None = None
+    record_id: int | None = None
+    detail: str | None = None
+    received_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+
+# Responses to POST requests sent with an Idempotency-Key header, replayed
+# when the same request is sent again. A row without status_code belongs to
+# a request that is still being processed.
+class IdempotencyRecord(SQLModel, table=True):
+    __tablename__ = "idempotency_record"  # type: ignore
+    idempotency_key: str = Field(primary_key=True)
+    method: str
+    path: str
+    request_hash: str
+    status_code: int | None = None
+    content_type: str | None = None
+    response_body: bytes | None = Field(default=None, sa_column=Column(LargeBinary))
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    expires_at: datetime = Field(index=True)
+
+
+# Contribution of one counted problem (active, of an active patient) to the
+# caseload aggregates, so a change is applied as old-out / new-in delta.
+# Also the reassessment queue: the worklist walks the due_on indexes.
+class CaseloadProblem(SQLModel, table=True):
+    __tablename__ = "caseload_problem"  # type: ignore
+    __table_args__ = (
+        Index("ix_caseload_problem_clinician_due", "clinician_id", "due_on", "patient_problem_id"),
+        Index("ix_caseload_problem_due", "due_on", "patient_problem_id"),
+    )
+    patient_problem_id: int = Field(primary_key=True)
+    domain_id: int
+    modifier_type_id: int
+    # Date of the latest outcome score, or of the problem's creation
+    assessed_on: date
+    rating_knowledge: int | None = None
+    rating_behavior: int | None = None
+    rating_status: int | None = None
+    clinician_id: str | None = None
+    # Phase of the latest outcome score
+    phase_id: int | None = None
+    # Next reassessment; None once the problem has a discharge score
+    due_on: date | None = None
+
+
+# Counted problems by domain, modifier type and day of last assessment,
+# with rating totals of their latest scores. Its size depends on the number
+# of distinct days, not on the caseload.
+class CaseloadAggregate(SQLModel, table=True):
+    __tablename__ = "caseload_aggregate"  # type: ignore
+    domain_id: int = Field(primary_key=True)
+    modifier_type_id: int = Field(primary_key=True)
+    assessed_on: date = Field(primary_key=True)
+    active_problems: int = 0
+    scored_problems: int = 0
+    knowledge_total: int = 0
+    behavior_total: int = 0
+    status_total: int = 0
+
+
+# Counted problems that are due for reassessment, by domain, modifier type
+# and due date, so the dashboard sums the overdue ones over days like the
+# other figures. Problems with a discharge score are not due.
+class CaseloadDue(SQLModel, table=True):
+    __tablename__ = "caseload_due"  # type: ignore
+    domain_id: int = Field(primary_key=True)
+    modifier_type_id: int = Field(primary_key=True)
+    due_on: date = Field(primary_key=True)
+    problems: int = 0
+
+
+class CaseloadCounter(SQLModel, table=True):
+    __tablename__ = "caseload_counter"  # type: ignore
+    name: str = Field(primary_key=True)
+    value: int = 0
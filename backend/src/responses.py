@@ -0,0 +1,123 @@
+from contextvars import ContextVar
+from datetime import date, datetime, time, timedelta
+from typing import Any, Literal, Mapping, Sequence
+from uuid import UUID
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from starlette.background import BackgroundTask
+
+# Optional wire format, see the "msgpack" extra in pyproject.toml
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+WireFormat = Literal["json", "msgpack"]
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+# Media types clients use to ask for MessagePack
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+# Format negotiated for the current request (ResponseFormatMiddleware)
+response_format: ContextVar[WireFormat] = ContextVar("response_format", default="json")
+
+
+def negotiate_format(accept: str) -> WireFormat:
+    """
+    Picks MessagePack if the Accept header prefers it at least as much as
+    JSON (and msgpack is installed), JSON otherwise.
+    """
+    if msgpack is None:
+        return "json"
+    weights: dict[str, float] = {}
+    for part in accept.split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            param = param.strip()
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+
+    msgpack_q = max(weights.get(name, 0.0) for name in MSGPACK_MEDIA_TYPES)
+    json_q = weights.get("application/json", weights.get("*/*", 0.0))
+    return "msgpack" if msgpack_q > 0 and msgpack_q >= json_q else "json"
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def _msgpack_default(obj: Any) -> Any:
+    # Values are encoded like orjson encodes them, so both formats carry
+    # the same strings
+    if isinstance(obj, datetime):
+        if obj.tzinfo is not None and obj.utcoffset() == timedelta(0):
+            return obj.replace(tzinfo=None).isoformat() + "Z"
+        return obj.isoformat()
+    if isinstance(obj, (date, time)):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    return _default(obj)
+
+
+def render_msgpack(content: Any) -> bytes:
+    return msgpack.packb(content, default=_msgpack_default)  # type: ignore
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson. Used as the application's default
+    response class. Successful responses are rendered as MessagePack
+    instead when the client negotiated it; errors are always JSON.
+    """
+
+    def __init__(
+        self,
+        content: Any,
+        status_code: int = 200,
+        headers: Mapping[str, str] | None = None,
+        media_type: str | None = None,
+        background: BackgroundTask | None = None,
+    ):
+        if media_type is None and status_code < 400 and response_format.get() == "msgpack":
+            media_type = MSGPACK_MEDIA_TYPE
+        super().__init__(content, status_code, headers, media_type, background)
+        self.headers.add_vary_header("Accept")
+
+    def render(self, content: Any) -> bytes:
+        if self.media_type == MSGPACK_MEDIA_TYPE:
+            return render_msgpack(content)
+        return orjson.dumps(
+            content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+        )
+
+
+def model_response(
+    content: BaseModel | Sequence[BaseModel],
+    status_code: int = 200,
+    exclude_unset: bool = False,
+    headers: Mapping[str, str] | None = None,
+) -> ORJSONResponse:
+    """
+    Serializes models the handler has already built and validated as its
+    response_model. Returning a Response makes FastAPI skip validating
+    and encoding the content a second time; the route's response_model
+    still documents the schema.
+    """
+    if isinstance(content, BaseModel):
+        data: Any = content.model_dump(exclude_unset=exclude_unset)
+    else:
+        data = [item.model_dump(exclude_unset=exclude_unset) for item in content]
+    return ORJSONResponse(data, status_code=status_code, headers=headers)
@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlmodel import Session
+
+from ..database import get_session
+from ..models import KeyRotationJob
+from ..schemas import KeyRotationJobRead
+from ..services import key_rotation
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.post(
+    "/key-rotation",
+    response_model=KeyRotationJobRead,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+def start_key_rotation(
+    batch_size: int = Query(default=500, ge=1, le=10000),
+    pause_ms: int = Query(default=50, ge=0, le=60000),
+    session: Session = Depends(get_session),
+):
+    try:
+        job = key_rotation.start_rotation(session, batch_size, pause_ms)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    key_rotation.run_rotation_in_background(job.job_id)  # type: ignore
+    return job
+
+
+@router.get("/key-rotation/{job_id}", response_model=KeyRotationJobRead)
+def get_key_rotation(job_id: int, session: Session = Depends(get_session)):
+    job = session.get(KeyRotationJob, job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Key rotation job not found"
+        )
+    return job
+
+
+@router.post("/key-rotation/{job_id}/pause", response_model=KeyRotationJobRead)
+def pause_key_rotation(job_id: int, session: Session = Depends(get_session)):
+    job = key_rotation.pause_rotation(session, job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Key rotation job not found"
+        )
+    return job
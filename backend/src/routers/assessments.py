@@ -1,16 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlmodel import Session
 
 from ..database import get_session
-from ..models import (
-    PatientProblem,
-    OutcomeScore,
-    OutcomeRatingBehavior,
-    OutcomeRatingKnowledge,
-    OutcomeRatingStatus,
-    OutcomePhase,
-)
-from ..schemas import OutcomeScoreCreate, OutcomeScoreRead
+from ..responses import model_response
+from ..schemas import OutcomeScoreCreate, OutcomeScoreRead, OutcomeScoreReadIds, ResponseShape
+from ..services import clinical
 
 router = APIRouter(prefix="/patients", tags=["assessments"])
 
@@ -25,47 +21,11 @@ def create_outcome_score(
     score_data: OutcomeScoreCreate,
     session: Session = Depends(get_session),
 ):
-    problem = session.get(PatientProblem, patient_problem_id)
-    if not problem or problem.patient_id != patient_id or problem.deleted_at:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Patient problem not found"
-        )
-
-    if not session.get(OutcomePhase, score_data.phase_id):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid phase_id.",
-        )
-
-    # Validate ratings (Must be 1-5 and exist in DB)
-    if not (1 <= score_data.rating_knowledge_id <= 5) or not session.get(
-        OutcomeRatingKnowledge, score_data.rating_knowledge_id
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid rating_knowledge_id. Must be between 1 and 5.",
-        )
-
-    if not (1 <= score_data.rating_behavior_id <= 5) or not session.get(
-        OutcomeRatingBehavior, score_data.rating_behavior_id
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid rating_behavior_id. Must be between 1 and 5.",
-        )
-
-    if not (1 <= score_data.rating_status_id <= 5) or not session.get(
-        OutcomeRatingStatus, score_data.rating_status_id
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid rating_status_id. Must be between 1 and 5.",
-        )
-
-    new_score = OutcomeScore(
-        patient_problem_id=patient_problem_id, **score_data.model_dump()
-    )
-    session.add(new_score)
+    try:
+        problem = clinical.get_patient_problem(session, patient_problem_id, patient_id)
+        new_score = clinical.add_score(session, problem, score_data)
+    except clinical.ClinicalError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     session.commit()
     session.refresh(new_score)
     return new_score
@@ -73,29 +33,32 @@ def create_outcome_score(
 
 @router.get(
     "/{patient_id}/problems/{patient_problem_id}/scores",
-    response_model=list[OutcomeScoreRead],
+    response_model=list[OutcomeScoreRead] | list[OutcomeScoreReadIds],
 )
 def get_problem_scores(
     patient_id: int,
     patient_problem_id: int,
+    phase_id: int | None = None,
+    since: datetime | None = Query(default=None, description="Recorded at or after"),
+    until: datetime | None = Query(default=None, description="Recorded before"),
+    cursor: str | None = Query(
+        default=None, description="X-Next-Cursor header of the previous page"
+    ),
+    limit: int = Query(default=100, ge=1, le=500),
+    shape: ResponseShape = "full",
     session: Session = Depends(get_session),
 ):
-    problem = session.get(PatientProblem, patient_problem_id)
-    if not problem or problem.patient_id != patient_id or problem.deleted_at:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Patient problem not found"
-        )
-
-    if not problem.is_active:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Patient problem is not active",
+    try:
+        clinical.get_patient_problem(
+            session, patient_problem_id, patient_id, require_active=True
         )
+        before = clinical.parse_cursor(cursor) if cursor else None
+    except clinical.ClinicalError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
-    scores = session.exec(
-        select(OutcomeScore)
-        .where(OutcomeScore.patient_problem_id == patient_problem_id)
-        .where(OutcomeScore.deleted_at == None)  # noqa: E711
-        .order_by(OutcomeScore.date_recorded.desc())  # type: ignore
-    ).all()
-    return scores
+    scores, last = clinical.list_scores(
+        session, patient_problem_id, phase_id, since, until, before, limit, shape == "full"
+    )
+    schema = OutcomeScoreReadIds if shape == "ids" else OutcomeScoreRead
+    headers = {"X-Next-Cursor": clinical.format_cursor(last)} if last else None
+    return model_response([schema.model_validate(score) for score in scores], headers=headers)
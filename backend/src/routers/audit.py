@@ -0,0 +1,66 @@
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlmodel import Session, col, select
+
+from ..config import settings
+from ..database import get_session
+from ..models import AuditEvent
+from ..schemas import AuditEventRead
+from ..services.audit import WRITER
+
+router = APIRouter(prefix="/audit", tags=["audit"])
+
+
+@router.get("/events", response_model=list[AuditEventRead])
+def list_audit_events(
+    patient_id: int | None = None,
+    table_name: str | None = None,
+    record_id: int | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    before_id: int | None = Query(
+        default=None, description="Return events older than this event (pagination)"
+    ),
+    limit: int = Query(default=100, ge=1, le=1000),
+    session: Session = Depends(get_session),
+):
+    # Record ids are only unique within a table
+    if record_id is not None and table_name is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="record_id requires table_name",
+        )
+
+    # Include this worker's events that are still waiting to be written,
+    # unless the database does not accept them in time
+    WRITER.flush(settings.AUDIT_FLUSH_TIMEOUT_SECONDS)
+
+    query = select(AuditEvent)
+    if patient_id is not None:
+        query = query.where(AuditEvent.patient_id == patient_id)
+    if table_name is not None:
+        query = query.where(AuditEvent.table_name == table_name)
+    if record_id is not None:
+        query = query.where(AuditEvent.record_id == record_id)
+    if since is not None:
+        query = query.where(AuditEvent.occurred_at >= since)
+    if until is not None:
+        query = query.where(AuditEvent.occurred_at < until)
+    if before_id is not None:
+        query = query.where(col(AuditEvent.audit_event_id) < before_id)
+    return session.exec(
+        query.order_by(col(AuditEvent.audit_event_id).desc()).limit(limit)
+    ).all()
+
+
+@router.get("/patients/{patient_id}", response_model=list[AuditEventRead])
+def get_patient_history(
+    patient_id: int,
+    before_id: int | None = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+    session: Session = Depends(get_session),
+):
+    return list_audit_events(
+        patient_id=patient_id, before_id=before_id, limit=limit, session=session
+    )
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlmodel import Session, select
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import joinedload, selectinload
 from sqlalchemy import desc
 
 from ..database import get_session
@@ -11,23 +11,43 @@ from ..models import (
     PatientProblemSymptom,
     OutcomeScore,
 )  # type: ignore
-from ..schemas import CarePlan, PatientProblemReadWithDetails, PatientRead
+from ..responses import model_response
+from ..schemas import (
+    CarePlan,
+    CarePlanIds,
+    OutcomeScoreRead,
+    OutcomeScoreReadIds,
+    PatientProblemReadWithDetails,
+    PatientProblemReadWithDetailsIds,
+    PatientRead,
+    ResponseShape,
+)
 
 router = APIRouter(prefix="/patients", tags=["care-plans"])
 
 
-@router.get("/{patient_id}/care-plan", response_model=CarePlan)
-def get_care_plan(patient_id: int, session: Session = Depends(get_session)):
+@router.get("/{patient_id}/care-plan", response_model=CarePlan | CarePlanIds)
+def get_care_plan(
+    patient_id: int,
+    shape: ResponseShape = "full",
+    session: Session = Depends(get_session),
+):
     patient = session.get(Patient, patient_id)
     if not patient or patient.deleted_at:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found"
         )
 
-    # Eagerly load related data to avoid N+1 queries
-    problems_query = (
-        select(PatientProblem)
-        .options(
+    # Eagerly load related data to avoid N+1 queries; the ids shape needs
+    # none of the taxonomy labels
+    if shape == "ids":
+        options = [
+            selectinload(PatientProblem.selected_symptoms),  # type: ignore
+            selectinload(PatientProblem.interventions),  # type: ignore
+        ]
+        score_options = []
+    else:
+        options = [
             selectinload(PatientProblem.problem),  # type: ignore
             selectinload(PatientProblem.modifier_domain),  # type: ignore
             selectinload(PatientProblem.modifier_type),  # type: ignore
@@ -40,24 +60,44 @@ def get_care_plan(patient_id: int, session: Session = Depends(get_session)):
             selectinload(PatientProblem.interventions).selectinload(  # type: ignore
                 CareIntervention.target  # type: ignore
             ),
-        )
+        ]
+        score_options = [
+            joinedload(OutcomeScore.phase),  # type: ignore
+            joinedload(OutcomeScore.status_rating),  # type: ignore
+            joinedload(OutcomeScore.knowledge_rating),  # type: ignore
+            joinedload(OutcomeScore.behavior_rating),  # type: ignore
+        ]
+    problems_query = (
+        select(PatientProblem)
+        .options(*options)
         .where(PatientProblem.patient_id == patient_id)
         .where(PatientProblem.is_active == True)  # noqa: E712
         .where(PatientProblem.deleted_at == None)  # noqa: E711
     )
     active_problems_db = session.exec(problems_query).all()
 
+    problem_schema, score_schema = (
+        (PatientProblemReadWithDetailsIds, OutcomeScoreReadIds)
+        if shape == "ids"
+        else (PatientProblemReadWithDetails, OutcomeScoreRead)
+    )
     active_problems_with_details = []
     for problem in active_problems_db:
         latest_score = session.exec(
             select(OutcomeScore)
+            .options(*score_options)
             .where(OutcomeScore.patient_problem_id == problem.patient_problem_id)
             .order_by(desc(OutcomeScore.date_recorded))  # type: ignore
         ).first()
 
-        problem_details = PatientProblemReadWithDetails.model_validate(problem)
-        problem_details.latest_score = latest_score  # type: ignore
+        problem_details = problem_schema.model_validate(problem)
+        if latest_score:
+            problem_details.latest_score = score_schema.model_validate(latest_score)
         active_problems_with_details.append(problem_details)
 
     patient_read = PatientRead.model_validate(patient)
-    return CarePlan(patient=patient_read, active_problems=active_problems_with_details)
+    # Everything above is validated already; serialize it directly
+    care_plan_schema = CarePlanIds if shape == "ids" else CarePlan
+    return model_response(
+        care_plan_schema(patient=patient_read, active_problems=active_problems_with_details)
+    )
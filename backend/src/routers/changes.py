@@ -0,0 +1,88 @@
+import orjson
+from fastapi import APIRouter, Header, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+
+from ..database import engine
+from ..services import changes
+
+router = APIRouter(prefix="/changes", tags=["changes"])
+
+# Comment line sent to idle streams so proxies don't close them
+SSE_KEEPALIVE_SECONDS = 15
+
+# The endpoints are async so waiting clients don't hold a threadpool
+# thread; database work is still done in the threadpool.
+def _read_changes(since: int, limit: int, patient_id: int | None) -> dict:
+    with Session(engine) as session:
+        return changes.read_changes(session, since, limit, patient_id)
+
+
+def _latest_seq() -> int:
+    with Session(engine) as session:
+        return changes.latest_seq(session)
+
+
+async def _read_latest() -> int:
+    return await run_in_threadpool(_latest_seq)
+
+
+@router.get("")
+async def get_changes(
+    since: int = Query(default=0, ge=0, description="Last sequence number seen"),
+    limit: int = Query(default=500, ge=1, le=5000),
+    patient_id: int | None = None,
+    wait: float = Query(
+        default=0, ge=0, le=60, description="Seconds to wait for changes (long poll)"
+    ),
+):
+    result = await run_in_threadpool(_read_changes, since, limit, patient_id)
+    if not result["changes"] and wait:
+        if await changes.wait_for_changes(since, wait, _read_latest):
+            result = await run_in_threadpool(_read_changes, since, limit, patient_id)
+    return result
+
+
+@router.get("/latest")
+async def get_latest_seq():
+    return {"seq": await _read_latest()}
+
+
+@router.get("/stream")
+async def stream_changes(
+    request: Request,
+    since: int = Query(default=0, ge=0),
+    patient_id: int | None = None,
+    last_event_id: int | None = Header(default=None),
+):
+    """
+    Server-Sent Events: one `change` event per changed record, with the
+    sequence number as event id, so reconnecting clients resume after
+    the last event they received (Last-Event-ID).
+    """
+    if last_event_id is not None:
+        since = max(since, last_event_id)
+
+    async def events():
+        position = since
+        while not await request.is_disconnected():
+            result = await run_in_threadpool(_read_changes, position, 500, patient_id)
+            for change in result["changes"]:
+                yield b"id: %d\nevent: change\ndata: %s\n\n" % (
+                    change["seq"],
+                    orjson.dumps(change),
+                )
+            position = result["next_since"]
+            if result["has_more"]:
+                continue
+            if not await changes.wait_for_changes(
+                position, SSE_KEEPALIVE_SECONDS, _read_latest
+            ):
+                yield b": keepalive\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
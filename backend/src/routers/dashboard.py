@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Depends
+from sqlmodel import Session
+
+from ..database import get_session
+from ..schemas import DashboardRead
+from ..services import caseload
+
+router = APIRouter(prefix="/dashboard", tags=["dashboard"])
+
+
+@router.get("", response_model=DashboardRead)
+def get_dashboard(
+    domain_id: int | None = None,
+    modifier_type_id: int | None = None,
+    session: Session = Depends(get_session),
+):
+    return caseload.dashboard(session, domain_id, modifier_type_id)
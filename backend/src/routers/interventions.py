@@ -1,14 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlmodel import Session
 
 from ..database import get_session
-from ..models import (
-    CareIntervention,
-    PatientProblem,
-    InterventionCategory,
-    InterventionTarget,
+from ..responses import model_response
+from ..schemas import (
+    CareInterventionCreate,
+    CareInterventionRead,
+    CareInterventionReadIds,
+    ResponseShape,
 )
-from ..schemas import CareInterventionCreate
+from ..services import clinical
 
 router = APIRouter(prefix="/patients", tags=["interventions"])
 
@@ -23,31 +26,54 @@ def create_care_intervention(
     intervention_data: CareInterventionCreate,
     session: Session = Depends(get_session),
 ):
-    problem = session.get(PatientProblem, patient_problem_id)
-    if not problem or problem.patient_id != patient_id or problem.deleted_at:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Patient problem not found"
-        )
-
-    # Validate foreign keys
-    category = session.get(InterventionCategory, intervention_data.category_id)
-    if not category:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Intervention category not found",
-        )
-
-    target = session.get(InterventionTarget, intervention_data.target_id)
-    if not target:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Intervention target not found",
-        )
-
-    new_intervention = CareIntervention(
-        patient_problem_id=patient_problem_id, **intervention_data.model_dump()
-    )
-    session.add(new_intervention)
+    try:
+        problem = clinical.get_patient_problem(session, patient_problem_id, patient_id)
+        new_intervention = clinical.add_intervention(session, problem, intervention_data)
+    except clinical.ClinicalError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     session.commit()
     session.refresh(new_intervention)
     return new_intervention
+
+
+@router.get(
+    "/{patient_id}/problems/{patient_problem_id}/interventions",
+    response_model=list[CareInterventionRead] | list[CareInterventionReadIds],
+)
+def get_problem_interventions(
+    patient_id: int,
+    patient_problem_id: int,
+    category_id: int | None = None,
+    target_id: int | None = None,
+    since: datetime | None = Query(default=None, description="Performed at or after"),
+    until: datetime | None = Query(default=None, description="Performed before"),
+    cursor: str | None = Query(
+        default=None, description="X-Next-Cursor header of the previous page"
+    ),
+    limit: int = Query(default=100, ge=1, le=500),
+    shape: ResponseShape = "full",
+    session: Session = Depends(get_session),
+):
+    try:
+        clinical.get_patient_problem(session, patient_problem_id, patient_id)
+        before = clinical.parse_cursor(cursor) if cursor else None
+    except clinical.ClinicalError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    interventions, last = clinical.list_interventions(
+        session,
+        patient_problem_id,
+        category_id,
+        target_id,
+        since,
+        until,
+        before,
+        limit,
+        shape == "full",
+    )
+    schema = CareInterventionReadIds if shape == "ids" else CareInterventionRead
+    headers = {"X-Next-Cursor": clinical.format_cursor(last)} if last else None
+    return model_response(
+        [schema.model_validate(intervention) for intervention in interventions],
+        headers=headers,
+    )
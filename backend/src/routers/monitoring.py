@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, Response, status
+from sqlalchemy import text
+from sqlmodel import Session
+
+from ..database import get_session
+from ..services import metrics
+
+router = APIRouter(tags=["monitoring"])
+
+
+@router.get("/metrics")
+def get_metrics():
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@router.get("/ready")
+def readiness_check(response: Response, session: Session = Depends(get_session)):
+    """
+    Probes the database with a round trip and checks that the taxonomy is
+    seeded. Returns 503 while the instance should not receive traffic.
+    """
+    try:
+        session.execute(text("SELECT 1"))
+        domain_count = session.execute(
+            text("SELECT COUNT(*) FROM omaha_domain")
+        ).scalar()
+    except Exception as e:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "unavailable", "database": f"error: {e}"}
+
+    if not domain_count:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "unavailable", "database": "taxonomy not seeded"}
+
+    return {"status": "ok", "database": "ok"}
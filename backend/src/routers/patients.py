@@ -1,63 +1,192 @@
-import json
-from datetime import datetime, timezone
-from fastapi import APIRouter, Depends, HTTPException, Response, status
-from sqlmodel import Session, select
-
-from ..database import get_session
-from ..services.export import (
-    generate_care_plan_summary_text,
-    generate_care_plan_summary_json,
-    create_group_office_note,
-    update_group_office_note,
-    format_for_group_office,
-)
+import codecs
+import io
+import tempfile
+from datetime import date, datetime, timezone
+from typing import IO
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session, col, select
+from starlette.concurrency import run_in_threadpool
+
+from ..config import settings
+from ..database import engine, get_session
+from ..responses import model_response
 from ..models import (
     Patient,
     PatientPII,
     PatientConsent,
     ConsentDefinition,
 )
-from ..services.encryption import decrypt_data, encrypt_data
+from ..services import patient_import, search_index
+from ..services.pii import (
+    PII_FIELDS,
+    PIIValues,
+    PIIView,
+    read_pii_many,
+    redact_pii,
+    write_pii,
+)
+from ..services.pii_cache import PII_CACHE
 from ..schemas import (
     PatientCreate,
+    PatientImportRead,
     PatientReadDetails,
+    PatientReadSelected,
 )
 
 router = APIRouter(prefix="/patients", tags=["patients"])
 
+# PDF exports are sent in chunks of this many bytes
+PDF_CHUNK_SIZE = 64 * 1024
+# Import uploads are buffered in memory up to this size, then on disk
+IMPORT_SPOOL_SIZE = 8 * 1024 * 1024
+IMPORT_MEDIA_TYPES = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+def _pii_values(patient_data: PatientCreate) -> PIIValues:
+    return PIIValues(
+        first_name=patient_data.first_name,
+        last_name=patient_data.last_name,
+        date_of_birth=str(patient_data.date_of_birth),
+        tin=patient_data.tin,
+        phone_number=patient_data.phone_number,
+        address=patient_data.address,
+    )
+
+
+def _selected_fields(fields: str | None) -> set[str] | None:
+    # Parses `?fields=first_name,last_name`; patient_id is always included
+    if fields is None:
+        return None
+    selected = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = selected - set(PatientReadDetails.model_fields)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+        )
+    selected.add("patient_id")
+    return selected
+
+
+def _patient_details(
+    patient: Patient,
+    pii: PatientPII,
+    values: PIIValues | PIIView,
+    fields: set[str] | None = None,
+) -> PatientReadDetails | PatientReadSelected:
+    # Combine the two models into the response. PII is read from `values`
+    # only for the selected fields, so a PIIView decrypts nothing else.
+    patient_details = patient.model_dump()
+    patient_details.update(pii.model_dump(exclude={"pii_record", *PII_FIELDS}))
+    for field in PII_FIELDS:
+        if fields is None or field in fields:
+            patient_details[field] = getattr(values, field)
+    if fields is None:
+        return PatientReadDetails(**patient_details)
+    return PatientReadSelected(
+        **{name: value for name, value in patient_details.items() if name in fields}
+    )
 
-@router.get("", response_model=list[PatientReadDetails])
-def get_patients(tin: str | None = None, session: Session = Depends(get_session)):
+
+@router.get(
+    "",
+    response_model=list[PatientReadSelected],
+    response_model_exclude_unset=True,
+)
+def get_patients(
+    tin: str | None = None,
+    fields: str | None = None,
+    session: Session = Depends(get_session),
+):
+    selected = _selected_fields(fields)
     query = (
         select(Patient, PatientPII)
         .where(Patient.patient_id == PatientPII.patient_id)
         .where(Patient.deleted_at == None)  # noqa: E711
     )
+    if tin:
+        # Narrow down to the candidates from the blinded TIN index
+        candidate_ids = search_index.find_patient_ids(
+            session, [search_index.tin_token(tin)]
+        )
+        query = query.where(col(Patient.patient_id).in_(candidate_ids))
 
     results = session.exec(query).all()
+    # PII is decrypted only for the fields that are returned, for long lists
+    # in bulk in the offload pool
+    needed = [
+        f for f in PII_FIELDS if selected is None or f in selected or (tin and f == "tin")
+    ]
+    views = read_pii_many([pii for _, pii in results], needed)
     patient_details_list = []
-    for patient, pii in results:
-        # Decrypt PII first
-        pii.first_name = decrypt_data(pii.first_name)
-        pii.last_name = decrypt_data(pii.last_name)
-        pii.date_of_birth = decrypt_data(pii.date_of_birth)
-        pii.tin = decrypt_data(pii.tin)
-        if pii.phone_number:
-            pii.phone_number = decrypt_data(pii.phone_number)
-        if pii.address:
-            pii.address = decrypt_data(pii.address)
-        
+    for (patient, pii), view in zip(results, views):
         # Filter by TIN after decryption (if tin parameter is provided)
-        if tin:
-            if pii.tin == tin:
-                patient_details = patient.model_dump()
-                patient_details.update(pii.model_dump())
-                patient_details_list.append(PatientReadDetails(**patient_details))
-        else:
-            patient_details = patient.model_dump()
-            patient_details.update(pii.model_dump())
-            patient_details_list.append(PatientReadDetails(**patient_details))
-    return patient_details_list
+        if tin and view.tin != tin:
+            continue
+        patient_details_list.append(_patient_details(patient, pii, view, selected))
+    return model_response(patient_details_list, exclude_unset=True)
+
+
+@router.get(
+    "/search",
+    response_model=list[PatientReadSelected],
+    response_model_exclude_unset=True,
+)
+def search_patients(
+    q: str | None = None,
+    date_of_birth: date | None = None,
+    limit: int = Query(default=20, ge=1, le=100),
+    fields: str | None = None,
+    session: Session = Depends(get_session),
+):
+    selected = _selected_fields(fields)
+    # Name terms match prefixes of first/last name words; only the
+    # matching rows are decrypted
+    tokens = search_index.name_query_tokens(q) if q else []
+    if date_of_birth:
+        tokens.append(search_index.dob_token(str(date_of_birth)))
+    if not tokens:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide a name (at least 2 characters) and/or date_of_birth.",
+        )
+
+    # Candidates are verified on plaintext below, and deleted patients are
+    # skipped, so they are fetched in batches until enough of them match
+    batch_size = limit * 2
+    patient_details_list = []
+    after = None
+    while len(patient_details_list) < limit:
+        candidate_ids = search_index.find_patient_ids(
+            session, tokens, limit=batch_size, after=after
+        )
+        results = session.exec(
+            select(Patient, PatientPII)
+            .where(Patient.patient_id == PatientPII.patient_id)
+            .where(Patient.deleted_at == None)  # noqa: E711
+            .where(col(Patient.patient_id).in_(candidate_ids))
+            .order_by(Patient.patient_id)
+        ).all()
+
+        for patient, pii in results:
+            view = PIIView(pii)
+            if q and not search_index.matches_name_query(q, view.first_name, view.last_name):
+                continue
+
+            patient_details_list.append(_patient_details(patient, pii, view, selected))
+            if len(patient_details_list) == limit:
+                break
+        if len(candidate_ids) < batch_size:
+            break
+        after = candidate_ids[-1]
+    return model_response(patient_details_list, exclude_unset=True)
 
 
 @router.post("", response_model=PatientReadDetails, status_code=status.HTTP_201_CREATED)
@@ -81,27 +210,17 @@ def create_patient(
                     detail=f"Mandatory consent {mid} missing or denied.",
                 )
 
-        # Check if TIN is unique (iterate and decrypt due to non-deterministic encryption)
-        existing_tins = session.exec(select(PatientPII.tin)).all()
-        for existing_tin in existing_tins:
-            if decrypt_data(existing_tin) == patient_data.tin:
-                raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT,
-                    detail="Patient with this TIN already exists",
-                )
+        # Check if TIN is unique (via the blinded TIN index, since the
+        # stored ciphertexts are non-deterministic)
+        if search_index.find_patient_ids(
+            session, [search_index.tin_token(patient_data.tin)], limit=1
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Patient with this TIN already exists",
+            )
 
-        pii_data = {
-            "first_name": encrypt_data(patient_data.first_name),
-            "last_name": encrypt_data(patient_data.last_name),
-            "date_of_birth": encrypt_data(str(patient_data.date_of_birth)),
-            "tin": encrypt_data(patient_data.tin),
-            "phone_number": encrypt_data(patient_data.phone_number)
-            if patient_data.phone_number
-            else None,
-            "address": encrypt_data(patient_data.address)
-            if patient_data.address
-            else None,
-        }
+        values = _pii_values(patient_data)
 
         new_patient = Patient()
         session.add(new_patient)
@@ -113,7 +232,14 @@ def create_patient(
                 detail="Failed to create patient",
             )
 
-        new_pii = PatientPII(patient_id=new_patient.patient_id, **pii_data)
+        new_pii = PatientPII(
+            patient_id=new_patient.patient_id,
+            first_name="",
+            last_name="",
+            date_of_birth="",
+            tin="",
+        )
+        write_pii(new_pii, values)
 
         consent_objects = []
         for c in patient_data.consents:
@@ -126,23 +252,21 @@ def create_patient(
             )
 
         session.add_all([new_pii] + consent_objects)
+        search_index.replace_patient_tokens(
+            session,
+            new_patient.patient_id,
+            search_index.index_tokens(
+                values.first_name, values.last_name, values.date_of_birth, values.tin
+            ),
+        )
         session.commit()
         session.refresh(new_patient)
         session.refresh(new_pii)
 
-        new_pii.first_name = decrypt_data(new_pii.first_name)
-        new_pii.last_name = decrypt_data(new_pii.last_name)
-        new_pii.date_of_birth = decrypt_data(new_pii.date_of_birth)
-        new_pii.tin = decrypt_data(new_pii.tin)
-        if new_pii.phone_number:
-            new_pii.phone_number = decrypt_data(new_pii.phone_number)
-        if new_pii.address:
-            new_pii.address = decrypt_data(new_pii.address)
-
-        patient_details = new_patient.model_dump()
-        patient_details.update(new_pii.model_dump())
-
-        return PatientReadDetails(**patient_details)
+        return model_response(
+            _patient_details(new_patient, new_pii, values),
+            status_code=status.HTTP_201_CREATED,
+        )
     except HTTPException:
         session.rollback()
         raise
@@ -154,8 +278,78 @@ def create_patient(
         )
 
 
-@router.get("/{patient_id}", response_model=PatientReadDetails)
-def get_patient_details(patient_id: int, session: Session = Depends(get_session)):
+def _import_patients(
+    upload: IO[bytes], file_format: str, batch_size: int | None
+) -> PatientImportRead:
+    upload.seek(0)
+    stream = io.TextIOWrapper(upload, encoding="utf-8-sig", newline="")  # type: ignore
+    with Session(engine) as session:
+        return patient_import.import_patients(session, stream, file_format, batch_size)
+
+
+# Async so a large upload is received without holding a threadpool thread;
+# the import itself runs in the threadpool
+@router.post("/import", response_model=PatientImportRead)
+async def import_patients(
+    request: Request,
+    batch_size: int | None = Query(default=None, ge=1, le=5000),
+):
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    file_format = IMPORT_MEDIA_TYPES.get(content_type)
+    if file_format is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send patients as text/csv or application/x-ndjson",
+        )
+
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Uploads are limited to {settings.IMPORT_MAX_BYTES} bytes",
+    )
+    declared_size = request.headers.get("content-length", "")
+    if declared_size.isdigit() and int(declared_size) > settings.IMPORT_MAX_BYTES:
+        raise too_large
+
+    with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_SIZE) as upload:
+        # Rejecting invalid UTF-8 up front, before any batch is committed
+        decoder = codecs.getincrementaldecoder("utf-8")()
+
+        def spool(chunk: bytes) -> None:
+            decoder.decode(chunk)
+            upload.write(chunk)
+
+        size = 0
+        try:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > settings.IMPORT_MAX_BYTES:
+                    raise too_large
+                # Past IMPORT_SPOOL_SIZE the writes go to disk
+                await run_in_threadpool(spool, chunk)
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Input is not valid UTF-8"
+            )
+
+        try:
+            result = await run_in_threadpool(_import_patients, upload, file_format, batch_size)
+        except patient_import.ImportFormatError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return model_response(result)
+
+
+@router.get(
+    "/{patient_id}",
+    response_model=PatientReadSelected,
+    response_model_exclude_unset=True,
+)
+def get_patient_details(
+    patient_id: int,
+    fields: str | None = None,
+    session: Session = Depends(get_session),
+):
+    selected = _selected_fields(fields)
     patient = session.get(Patient, patient_id)
     if not patient or patient.deleted_at:
         raise HTTPException(
@@ -170,20 +364,10 @@ def get_patient_details(patient_id: int, session: Session = Depends(get_session)
             status_code=status.HTTP_404_NOT_FOUND, detail="Patient PII not found"
         )
 
-    # Decrypt PII before returning
-    pii.first_name = decrypt_data(pii.first_name)
-    pii.last_name = decrypt_data(pii.last_name)
-    pii.date_of_birth = decrypt_data(pii.date_of_birth)
-    pii.tin = decrypt_data(pii.tin)
-    if pii.phone_number:
-        pii.phone_number = decrypt_data(pii.phone_number)
-    if pii.address:
-        pii.address = decrypt_data(pii.address)
-
-    # Combine the two models into the response
-    patient_details = patient.model_dump()
-    patient_details.update(pii.model_dump())
-    return PatientReadDetails(**patient_details)
+    # Decrypt only the PII fields being returned
+    return model_response(
+        _patient_details(patient, pii, PIIView(pii), selected), exclude_unset=True
+    )
 
 
 @router.put("/{patient_id}", response_model=PatientReadDetails)
@@ -228,17 +412,18 @@ def update_patient_pii(
             status_code=status.HTTP_404_NOT_FOUND, detail="Patient PII not found"
         )
 
-    # Note: PII encryption should happen here
-    pii.first_name = encrypt_data(patient_data.first_name)  # ENCRYPT
-    pii.last_name = encrypt_data(patient_data.last_name)  # ENCRYPT
-    pii.date_of_birth = encrypt_data(str(patient_data.date_of_birth))
-    pii.tin = encrypt_data(patient_data.tin)
-    pii.phone_number = (
-        encrypt_data(patient_data.phone_number) if patient_data.phone_number else None
-    )
-    pii.address = encrypt_data(patient_data.address) if patient_data.address else None
+    values = _pii_values(patient_data)
+    write_pii(pii, values)
+    PII_CACHE.invalidate(patient_id)
 
     session.add(pii)
+    search_index.replace_patient_tokens(
+        session,
+        patient_id,
+        search_index.index_tokens(
+            values.first_name, values.last_name, values.date_of_birth, values.tin
+        ),
+    )
 
     # Handle Consents Update
     existing_consents = session.exec(
@@ -274,19 +459,7 @@ def update_patient_pii(
     session.refresh(pii)
     session.refresh(patient)
 
-    # Decrypt PII before returning
-    pii.first_name = decrypt_data(pii.first_name)
-    pii.last_name = decrypt_data(pii.last_name)
-    pii.date_of_birth = decrypt_data(pii.date_of_birth)
-    pii.tin = decrypt_data(pii.tin)
-    if pii.phone_number:
-        pii.phone_number = decrypt_data(pii.phone_number)
-    if pii.address:
-        pii.address = decrypt_data(pii.address)
-
-    patient_details = patient.model_dump()
-    patient_details.update(pii.model_dump())
-    return PatientReadDetails(**patient_details)
+    return model_response(_patient_details(patient, pii, values))
 
 
 @router.delete("/{patient_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -305,15 +478,25 @@ def delete_patient(patient_id: int, session: Session = Depends(get_session)):
         select(PatientPII).where(PatientPII.patient_id == patient_id)
     ).first()
     if pii:
+        # Only the TIN token is kept, so a deleted patient can no longer be
+        # found by name but their TIN still cannot be registered again
+        search_index.replace_patient_tokens(
+            session, patient_id, {search_index.tin_token(PIIView(pii).tin)}  # type: ignore
+        )
         # Soft-deleting PII is a business decision. Here we nullify fields.
-        pii.first_name = "DELETED"
-        pii.last_name = "DELETED"
-        pii.phone_number = None
-        pii.address = None
+        redact_pii(pii)
         session.add(pii)
+        PII_CACHE.invalidate(patient_id)
+    else:
+        search_index.remove_patient_tokens(session, patient_id)
 
     session.add(patient)
     session.commit()
+
+    # Drop rendered exports, which hold the patient's PII, right away
+    from ..services.export import invalidate_export
+
+    invalidate_export(patient_id)
     return None
 
 
@@ -325,10 +508,10 @@ def export_patient_data(
     destination: str = "download",
     session: Session = Depends(get_session),
 ):
-    if export_format not in ("txt", "json"):
+    if export_format not in ("txt", "json", "pdf"):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid export_format. Options: 'txt', 'json'",
+            detail="Invalid export_format. Options: 'txt', 'json', 'pdf'",
         )
 
     if destination not in ("download", "group_office", "preview"):
@@ -336,6 +519,11 @@ def export_patient_data(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid destination. Options: 'download', 'group_office', 'preview'",
         )
+    if export_format == "pdf" and destination == "group_office":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="PDF exports cannot be sent to Group Office",
+        )
 
     patient = session.get(Patient, patient_id)
     if not patient or patient.deleted_at:
@@ -343,42 +531,55 @@ def export_patient_data(
             status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found"
         )
 
-    # 1. Generate Content (Data Layer)
-    response_data = None
-    patient_name = "Unknown"
-    media_type = "text/plain"
-
-    if export_format == "txt":
-        response_data, patient_name = generate_care_plan_summary_text(
-            patient_id, session
+    # Export renderers are loaded on first use to keep startup light
+    from ..services.export import render_export, render_pdf_export, stream_text_export
+
+    # 1. Generate Content (Data Layer), cached until the care plan changes.
+    # Text downloads are rendered while they are sent; PDFs are rendered in
+    # the offload process pool and sent in chunks.
+    media_type = {
+        "json": "application/json",
+        "pdf": "application/pdf",
+    }.get(export_format, "text/plain")
+    chunks = None
+    content_string = ""
+    if export_format == "pdf":
+        document, patient_name = render_pdf_export(session, patient_id)
+        if document is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Patient PII not found"
+            )
+        chunks = (
+            document[start : start + PDF_CHUNK_SIZE]
+            for start in range(0, len(document), PDF_CHUNK_SIZE)
         )
-        media_type = "text/plain"
-    elif export_format == "json":
-        response_data = generate_care_plan_summary_json(patient_id, session)
-        if not response_data:
+    elif export_format == "txt" and destination == "download":
+        chunks, patient_name = stream_text_export(session, patient_id)
+    else:
+        content_string, patient_name = render_export(
+            session, patient_id, "json" if export_format == "json" else "txt"
+        )
+        if content_string is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Patient PII not found"
             )
-        patient_name = response_data.get("patient", {}).get("name", "Unknown")
-        media_type = "application/json"
-
     if not patient_name:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Patient name not found"
         )
 
     # 2. Handle Delivery Strategy (Presentation Layer)
-    # Ensure content is stringified for file-based destinations
-    content_string = response_data
-    if not isinstance(content_string, str):
-        content_string = json.dumps(response_data)
-
     if destination == "group_office":
+        from ..services.group_office import (
+            create_group_office_note,
+            update_group_office_note,
+        )
+
         note_title = f"Care Plan: {patient_name}"
 
         note_content = content_string
         if export_format == "txt":
-            note_content = format_for_group_office(content_string)
+            note_content, _ = render_export(session, patient_id, "html")
 
         try:
             if patient.group_office_note_id is None:
@@ -410,9 +611,11 @@ def export_patient_data(
             )
 
     if destination == "preview":
-        # Return raw JSON dict or raw Text string directly
-        if export_format == "json":
-            return response_data
+        # Return the raw JSON or text document directly, PDFs for display
+        if chunks is not None:
+            return StreamingResponse(
+                chunks, media_type=media_type, headers={"Content-Disposition": "inline"}
+            )
         return Response(content=content_string, media_type=media_type)
 
     # Default: File Download
@@ -423,9 +626,8 @@ def export_patient_data(
         .strip()
     )
     filename = f"CarePlan_{safe_name}_{filename_date}.{export_format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
 
-    return Response(
-        content=content_string,
-        media_type=media_type,
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
-    )
+    if chunks is not None:
+        return StreamingResponse(chunks, media_type=media_type, headers=headers)
+    return Response(content=content_string, media_type=media_type, headers=headers)
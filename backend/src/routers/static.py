@@ -1,7 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Any, Callable
+
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from pydantic import TypeAdapter
 from sqlmodel import Session, select
 
 from ..database import get_session
+from ..responses import MSGPACK_MEDIA_TYPE, render_msgpack, response_format
+from ..services import cache
 from ..models import (
     OmahaDomain,
     OmahaProblem,
@@ -32,81 +37,143 @@ from ..schemas import (
 
 router = APIRouter(prefix="/static", tags=["static"])
 
+# The taxonomy only changes when the database is re-seeded
+TAXONOMY_TTL_SECONDS = 3600
+
+
+def _taxonomy_response(key: str, schema: Any, load: Callable[[], Any]) -> Response:
+    # Serves the serialized taxonomy, in the negotiated format, from the
+    # shared cache; `load` only runs on a miss
+    wire_format = response_format.get()
+    if wire_format == "msgpack":
+        key = f"{key}:msgpack"
+    content = cache.lookup("taxonomy", key)
+    if content is None:
+        adapter = TypeAdapter(schema)
+        data = adapter.validate_python(load(), from_attributes=True)
+        if wire_format == "msgpack":
+            content = render_msgpack(adapter.dump_python(data, mode="json"))
+        else:
+            content = adapter.dump_json(data)
+        cache.store("taxonomy", key, content, TAXONOMY_TTL_SECONDS)
+    return Response(
+        content=content,
+        media_type=MSGPACK_MEDIA_TYPE if wire_format == "msgpack" else "application/json",
+        headers={"Vary": "Accept"},
+    )
+
 
 @router.get("/domains", response_model=list[OmahaDomainRead])
 def get_domains(session: Session = Depends(get_session)):
-    return session.exec(select(OmahaDomain)).all()
+    return _taxonomy_response(
+        "domains",
+        list[OmahaDomainRead],
+        lambda: session.exec(select(OmahaDomain)).all(),
+    )
 
 
 @router.get("/problems", response_model=list[OmahaProblemRead])
 def get_problems(domain_id: int | None = None, session: Session = Depends(get_session)):
-    if domain_id:
-        problems = session.exec(
-            select(OmahaProblem).where(OmahaProblem.domain_id == domain_id)
-        ).all()
-    else:
-        problems = session.exec(select(OmahaProblem)).all()
-    if not problems:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="No problems found"
-        )
-    return problems
+    def load():
+        if domain_id:
+            problems = session.exec(
+                select(OmahaProblem).where(OmahaProblem.domain_id == domain_id)
+            ).all()
+        else:
+            problems = session.exec(select(OmahaProblem)).all()
+        if not problems:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="No problems found"
+            )
+        return problems
+
+    return _taxonomy_response(f"problems:{domain_id}", list[OmahaProblemRead], load)
 
 
 @router.get("/symptoms", response_model=list[SymptomRead])
 def get_all_symptoms(
     problem_id: int | None = None, session: Session = Depends(get_session)
 ):
-    if problem_id:
-        symptoms = session.exec(
-            select(Symptom).where(Symptom.problem_id == problem_id)
-        ).all()
-    else:
-        symptoms = session.exec(select(Symptom)).all()
-    if not symptoms:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="No symptoms found"
-        )
-    return symptoms
+    def load():
+        if problem_id:
+            symptoms = session.exec(
+                select(Symptom).where(Symptom.problem_id == problem_id)
+            ).all()
+        else:
+            symptoms = session.exec(select(Symptom)).all()
+        if not symptoms:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="No symptoms found"
+            )
+        return symptoms
+
+    return _taxonomy_response(f"symptoms:{problem_id}", list[SymptomRead], load)
 
 
 @router.get("/modifier-domains", response_model=list[ModifierDomainRead])
 def get_modifier_domains(session: Session = Depends(get_session)):
-    return session.exec(select(ModifierDomain)).all()
+    return _taxonomy_response(
+        "modifier-domains",
+        list[ModifierDomainRead],
+        lambda: session.exec(select(ModifierDomain)).all(),
+    )
 
 
 @router.get("/modifier-types", response_model=list[ModifierTypeRead])
 def get_modifier_types(session: Session = Depends(get_session)):
-    return session.exec(select(ModifierType)).all()
+    return _taxonomy_response(
+        "modifier-types",
+        list[ModifierTypeRead],
+        lambda: session.exec(select(ModifierType)).all(),
+    )
 
 
 @router.get("/intervention-categories", response_model=list[InterventionCategoryRead])
 def get_intervention_categories(session: Session = Depends(get_session)):
-    return session.exec(select(InterventionCategory)).all()
+    return _taxonomy_response(
+        "intervention-categories",
+        list[InterventionCategoryRead],
+        lambda: session.exec(select(InterventionCategory)).all(),
+    )
 
 
 @router.get("/intervention-targets", response_model=list[InterventionTargetRead])
 def get_intervention_targets(session: Session = Depends(get_session)):
-    return session.exec(select(InterventionTarget)).all()
+    return _taxonomy_response(
+        "intervention-targets",
+        list[InterventionTargetRead],
+        lambda: session.exec(select(InterventionTarget)).all(),
+    )
 
 
 @router.get("/outcome-phases", response_model=list[OutcomePhaseRead])
 def get_outcome_phases(session: Session = Depends(get_session)):
-    return session.exec(select(OutcomePhase)).all()
+    return _taxonomy_response(
+        "outcome-phases",
+        list[OutcomePhaseRead],
+        lambda: session.exec(select(OutcomePhase)).all(),
+    )
 
 
 @router.get("/outcome-ratings", response_model=OutcomeRatingRead)
 def get_outcome_ratings(session: Session = Depends(get_session)):
-    status_ratings = session.exec(select(OutcomeRatingStatus)).all()
-    knowledge_ratings = session.exec(select(OutcomeRatingKnowledge)).all()
-    behavior_ratings = session.exec(select(OutcomeRatingBehavior)).all()
-    return OutcomeRatingRead(
-        status=list(status_ratings),
-        knowledge=list(knowledge_ratings),
-        behavior=list(behavior_ratings),
-    )
+    def load():
+        status_ratings = session.exec(select(OutcomeRatingStatus)).all()
+        knowledge_ratings = session.exec(select(OutcomeRatingKnowledge)).all()
+        behavior_ratings = session.exec(select(OutcomeRatingBehavior)).all()
+        return OutcomeRatingRead(
+            status=list(status_ratings),
+            knowledge=list(knowledge_ratings),
+            behavior=list(behavior_ratings),
+        )
+
+    return _taxonomy_response("outcome-ratings", OutcomeRatingRead, load)
 
 
 @router.get("/consent-definitions", response_model=list[ConsentDefinitionRead])
 def get_consent_definitions(session: Session = Depends(get_session)):
-    return session.exec(select(ConsentDefinition)).all()
+    return _taxonomy_response(
+        "consent-definitions",
+        list[ConsentDefinitionRead],
+        lambda: session.exec(select(ConsentDefinition)).all(),
+    )
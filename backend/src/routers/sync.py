@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlmodel import Session
+
+from ..config import settings
+from ..database import get_session
+from ..responses import model_response
+from ..schemas import SyncRequest, SyncResponse
+from ..services import changes, sync
+
+router = APIRouter(tags=["sync"])
+
+
+@router.post("/sync", response_model=SyncResponse)
+def sync_device(request: SyncRequest, session: Session = Depends(get_session)):
+    """
+    One exchange per visit: applies the device's queued clinical operations
+    and returns the changes made since its last sync token, including the
+    server's version of any record an operation conflicted with.
+    """
+    if len(request.operations) > settings.SYNC_MAX_OPERATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.SYNC_MAX_OPERATIONS} operations per request",
+        )
+
+    results, id_map = sync.apply_operations(
+        session, request.device_id, request.operations, request.since
+    )
+    session.commit()
+
+    delta = changes.read_changes(session, request.since, request.limit, request.patient_id)
+    return model_response(
+        SyncResponse(
+            results=results,
+            id_map=id_map,
+            changes=delta["changes"],
+            sync_token=delta["next_since"],
+            has_more=delta["has_more"],
+        )
+    )
@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlmodel import Session
+
+from ..database import get_session
+from ..models import Patient
+from ..schemas import TimelineRead
+from ..services import timeline
+
+router = APIRouter(prefix="/patients", tags=["timeline"])
+
+
+@router.get("/{patient_id}/timeline", response_model=TimelineRead)
+def get_patient_timeline(
+    patient_id: int,
+    types: str | None = Query(
+        default=None,
+        description="Comma-separated event types: problem, symptom, score, intervention",
+    ),
+    cursor: str | None = Query(default=None, description="next_cursor of the previous page"),
+    limit: int = Query(default=50, ge=1, le=500),
+    session: Session = Depends(get_session),
+):
+    patient = session.get(Patient, patient_id)
+    if not patient or patient.deleted_at:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found"
+        )
+
+    event_types = None
+    if types is not None:
+        event_types = [t.strip() for t in types.split(",") if t.strip()]
+        unknown = set(event_types) - set(timeline.EVENT_TYPES)
+        if unknown or not event_types:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown event types: {', '.join(sorted(unknown))}"
+                if unknown
+                else "No event types given",
+            )
+    try:
+        before = timeline.parse_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    events, last = timeline.read_timeline(session, patient_id, event_types, before, limit)
+    return {
+        "events": events,
+        "next_cursor": timeline.format_cursor(last) if last else None,
+    }
@@ -0,0 +1,38 @@
+from datetime import date
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlmodel import Session
+
+from ..database import get_session
+from ..schemas import WorklistRead
+from ..services import caseload
+
+router = APIRouter(prefix="/worklist", tags=["worklist"])
+
+
+def _parse_cursor(cursor: str) -> tuple[date, int]:
+    try:
+        due_on, patient_problem_id = cursor.split("_")
+        return date.fromisoformat(due_on), int(patient_problem_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+@router.get("", response_model=WorklistRead)
+def get_worklist(
+    clinician_id: str | None = Query(
+        default=None, description="Only problems assigned to this clinician"
+    ),
+    due_by: date | None = Query(
+        default=None, description="Include problems due on or before this date (default today)"
+    ),
+    cursor: str | None = Query(default=None, description="next_cursor of the previous page"),
+    limit: int = Query(default=50, ge=1, le=500),
+    session: Session = Depends(get_session),
+):
+    after = _parse_cursor(cursor) if cursor else None
+    items, last = caseload.worklist(session, clinician_id, due_by, after, limit)
+    return {
+        "items": items,
+        "next_cursor": f"{last[0].isoformat()}_{last[1]}" if last else None,
+    }
@@ -1,6 +1,8 @@
 from datetime import date, datetime
+from typing import Any, Literal
+
 from pydantic import field_validator
-from sqlmodel import SQLModel
+from sqlmodel import Field, SQLModel
 from .models import (
     OmahaProblem,
     ModifierDomain,
@@ -127,6 +129,38 @@ class PatientReadDetails(SQLModel):
     group_office_note_id: int | None
 
 
+# Subset of PatientReadDetails chosen with `?fields=`; unselected fields
+# are left unset and omitted from the response
+class PatientReadSelected(SQLModel):
+    patient_id: int
+    patient_uuid: str | None = None
+    tin: str | None = None
+    is_active: bool | None = None
+    created_at: datetime | None = None
+    updated_at: datetime | None = None
+    deleted_at: datetime | None = None
+    patient_pii_id: int | None = None
+    first_name: str | None = None
+    last_name: str | None = None
+    date_of_birth: date | None = None
+    phone_number: str | None = None
+    address: str | None = None
+    group_office_note_id: int | None = None
+
+
+class PatientImportError(SQLModel):
+    # Line of the CSV or NDJSON input; details never include PII values
+    line: int
+    detail: str
+
+
+class PatientImportRead(SQLModel):
+    imported: int = 0
+    failed: int = 0
+    patient_ids: list[int] = []
+    errors: list[PatientImportError] = []
+
+
 # ==========================================
 # C. CLINICAL WORKFLOW
 # ==========================================
@@ -136,10 +170,13 @@ class PatientProblemCreate(SQLModel):
     problem_id: int
     modifier_domain_id: int
     modifier_type_id: int
+    clinician_id: str | None = None
 
 
+# Omitted fields are left unchanged; clinician_id null unassigns the problem
 class PatientProblemUpdate(SQLModel):
-    is_active: bool
+    is_active: bool | None = None
+    clinician_id: str | None = None
 
 
 class PatientProblemRead(SQLModel):
@@ -148,6 +185,7 @@ class PatientProblemRead(SQLModel):
     modifier_domain: ModifierDomainRead
     modifier_type: ModifierTypeRead
     is_active: bool
+    clinician_id: str | None = None
 
 
 class PatientProblemSymptomCreate(SQLModel):
@@ -174,6 +212,7 @@ class CareInterventionCreate(SQLModel):
 
 
 class OutcomeScoreRead(SQLModel):
+    score_id: int
     phase: OutcomePhaseRead
     status_rating: OutcomeRatingStatus
     knowledge_rating: OutcomeRatingKnowledge
@@ -188,9 +227,11 @@ class PatientProblemSymptomRead(SQLModel):
 
 
 class CareInterventionRead(SQLModel):
+    intervention_id: int
     target: InterventionTargetRead
     category: InterventionCategoryRead
     specific_details: str | None
+    date_performed: datetime
 
 
 class PatientProblemReadWithDetails(SQLModel):
@@ -200,6 +241,7 @@ class PatientProblemReadWithDetails(SQLModel):
     modifier_domain_id: int
     modifier_type_id: int
     is_active: bool
+    clinician_id: str | None = None
     created_at: datetime
     updated_at: datetime | None
     deleted_at: datetime | None
@@ -214,3 +256,217 @@ class PatientProblemReadWithDetails(SQLModel):
 class CarePlan(SQLModel):
     patient: PatientRead
     active_problems: list[PatientProblemReadWithDetails]
+
+
+# Response shape of the care plan and clinical lists (`?shape=`): "ids"
+# leaves out the taxonomy labels and only references them by id, for
+# clients that keep the taxonomy (/static/*) cached
+ResponseShape = Literal["full", "ids"]
+
+
+class PatientProblemReadIds(SQLModel):
+    patient_problem_id: int
+    problem_id: int
+    modifier_domain_id: int
+    modifier_type_id: int
+    is_active: bool
+    clinician_id: str | None = None
+
+
+class OutcomeScoreReadIds(SQLModel):
+    score_id: int
+    phase_id: int
+    rating_status_id: int
+    rating_knowledge_id: int
+    rating_behavior_id: int
+    date_recorded: datetime
+
+
+class PatientProblemSymptomReadIds(SQLModel):
+    patient_problem_symptom_id: int
+    symptom_id: int
+    symptom_comment: str | None
+
+
+class CareInterventionReadIds(SQLModel):
+    intervention_id: int
+    target_id: int
+    category_id: int
+    specific_details: str | None
+    date_performed: datetime
+
+
+class PatientProblemReadWithDetailsIds(SQLModel):
+    patient_problem_id: int
+    patient_id: int
+    problem_id: int
+    modifier_domain_id: int
+    modifier_type_id: int
+    is_active: bool
+    clinician_id: str | None = None
+    created_at: datetime
+    updated_at: datetime | None
+    deleted_at: datetime | None
+    selected_symptoms: list[PatientProblemSymptomReadIds] = []
+    latest_score: OutcomeScoreReadIds | None = None
+    interventions: list[CareInterventionReadIds] = []
+
+
+class CarePlanIds(SQLModel):
+    patient: PatientRead
+    active_problems: list[PatientProblemReadWithDetailsIds]
+
+
+# ==========================================
+# E. ADMINISTRATION
+# ==========================================
+
+
+class KeyRotationJobRead(SQLModel):
+    job_id: int
+    target_key_id: str
+    status: str
+    batch_size: int
+    pause_ms: int
+    last_patient_pii_id: int
+    rows_total: int
+    rows_scanned: int
+    rows_rotated: int
+    error: str | None
+    created_at: datetime
+    updated_at: datetime | None
+    finished_at: datetime | None
+
+
+class AuditEventRead(SQLModel):
+    audit_event_id: int
+    occurred_at: datetime
+    actor: str | None
+    action: str
+    table_name: str
+    record_id: int
+    patient_id: int | None
+    changes: dict | None
+
+
+# ==========================================
+# F. OFFLINE SYNC
+# ==========================================
+
+
+class SyncOperationCreate(SQLModel):
+    # Generated by the device; an operation is applied at most once
+    op_id: str
+    type: Literal[
+        "create_problem", "update_problem", "add_symptom", "add_score", "add_intervention"
+    ]
+    # Device-generated id for the problem a create_problem makes, usable as
+    # patient_problem_id by the device's later operations before the server
+    # id is known
+    client_id: str | None = None
+    # Required; operations on a problem only apply if it belongs to the patient
+    patient_id: int | None = None
+    patient_problem_id: int | str | None = None
+    data: dict[str, Any]
+
+
+class SyncRequest(SQLModel):
+    # Stable id of the device; client ids are resolved per device
+    device_id: str = Field(min_length=1, max_length=200)
+    # The sync_token of the previous exchange (0 on first sync)
+    since: int = 0
+    patient_id: int | None = None
+    limit: int = Field(default=500, ge=1, le=5000)
+    operations: list[SyncOperationCreate] = []
+
+
+class SyncOperationResult(SQLModel):
+    op_id: str
+    status: str  # applied, conflict, rejected
+    table_name: str | None = None
+    record_id: int | None = None
+    detail: str | None = None
+    # True if the operation had already been received in an earlier request
+    replayed: bool = False
+
+
+class SyncResponse(SQLModel):
+    results: list[SyncOperationResult]
+    id_map: dict[str, int]
+    changes: list[dict[str, Any]]
+    sync_token: int
+    has_more: bool
+
+
+# ==========================================
+# G. CASELOAD DASHBOARD
+# ==========================================
+
+
+class CaseloadSummary(SQLModel):
+    active_problems: int
+    # Active problems past their reassessment due date (see the worklist)
+    overdue_reassessments: int
+    scored_problems: int
+    # Averages of the latest score of each scored problem (1-5)
+    average_knowledge: float | None
+    average_behavior: float | None
+    average_status: float | None
+
+
+class CaseloadDomainSummary(CaseloadSummary):
+    domain_id: int
+    domain_name: str
+
+
+class DashboardRead(CaseloadSummary):
+    active_patients: int
+    reassessment_interval_days: int
+    domains: list[CaseloadDomainSummary]
+
+
+# ==========================================
+# H. REASSESSMENT WORKLIST
+# ==========================================
+
+
+class WorklistItemRead(SQLModel):
+    patient_problem_id: int
+    patient_id: int
+    problem_id: int
+    problem_name: str
+    domain_id: int
+    modifier_type_id: int
+    clinician_id: str | None
+    # Phase of the latest outcome score, None if never scored
+    phase_id: int | None
+    assessed_on: date
+    due_on: date
+    days_overdue: int
+
+
+class WorklistRead(SQLModel):
+    items: list[WorklistItemRead]
+    # Pass as `cursor` to get the next page; None on the last page
+    next_cursor: str | None
+
+
+# ==========================================
+# I. PATIENT TIMELINE
+# ==========================================
+
+
+class TimelineEventRead(SQLModel):
+    # "problem", "symptom", "score" or "intervention"
+    type: str
+    id: int
+    occurred_at: datetime
+    patient_problem_id: int
+    # Column values of the record
+    data: dict[str, Any]
+
+
+class TimelineRead(SQLModel):
+    events: list[TimelineEventRead]
+    # Pass as `cursor` to get the next (older) page; None on the last page
+    next_cursor: str | None
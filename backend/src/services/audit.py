@@ -0,0 +1,351 @@
+import atexit
+import fcntl
+import os
+import queue
+import threading
+import time
+from contextvars import ContextVar
+from datetime import date, datetime, timezone
+from typing import Any
+
+import orjson
+from sqlalchemy import event, inspect, insert, select
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..config import settings
+from ..database import engine
+from .metrics import AUDIT_DEAD_LETTERS, AUDIT_WRITE_FAILURES, JOB_QUEUE_DEPTH
+
+# Audited tables, mapped to the column that leads to the patient. Rows that
+# only know their patient_problem_id are resolved by the writer.
+AUDITED_TABLES = {
+    "patient": "patient_id",
+    "patient_pii": "patient_id",
+    "patient_consent": "patient_id",
+    "patient_problem": "patient_id",
+    "patient_problem_symptom": "patient_problem_id",
+    "outcome_score": "patient_problem_id",
+    "care_intervention": "patient_problem_id",
+}
+# Columns whose values are never written to the log
+REDACTED_COLUMNS = {
+    "patient_pii": {
+        "first_name",
+        "last_name",
+        "date_of_birth",
+        "tin",
+        "phone_number",
+        "address",
+        "pii_record",
+    }
+}
+IGNORED_COLUMNS = {"created_at", "updated_at"}
+REDACTED = "<redacted>"
+
+# Who is making the current request, set by AuditActorMiddleware
+current_actor: ContextVar[str | None] = ContextVar("audit_actor", default=None)
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _describe(obj: Any, action: str) -> dict[str, Any] | None:
+    table = getattr(obj, "__tablename__", None)
+    if table not in AUDITED_TABLES:
+        return None
+
+    state = inspect(obj)
+    redacted = REDACTED_COLUMNS.get(table, set())
+    changes: dict[str, Any] = {}
+    if action == "create":
+        for attr in state.mapper.column_attrs:
+            value = getattr(obj, attr.key)
+            if attr.key in IGNORED_COLUMNS or value is None:
+                continue
+            changes[attr.key] = REDACTED if attr.key in redacted else _jsonable(value)
+    elif action == "update":
+        for attr in state.mapper.column_attrs:
+            if attr.key in IGNORED_COLUMNS:
+                continue
+            history = state.attrs[attr.key].history
+            if not history.has_changes():
+                continue
+            if attr.key in redacted:
+                changes[attr.key] = REDACTED
+                continue
+            old = history.deleted[0] if history.deleted else None
+            new = history.added[0] if history.added else None
+            changes[attr.key] = [_jsonable(old), _jsonable(new)]
+        if not changes:
+            return None
+        # Soft deletes are recorded as deletes
+        if "deleted_at" in changes and changes["deleted_at"][0] is None:
+            action = "delete"
+
+    link = AUDITED_TABLES[table]
+    return {
+        "action": action,
+        "table_name": table,
+        "record_id": state.mapper.primary_key_from_instance(obj)[0],
+        "patient_id": getattr(obj, link) if link == "patient_id" else None,
+        "patient_problem_id": getattr(obj, link) if link == "patient_problem_id" else None,
+        "changes": changes or None,
+    }
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_events(session: Session, flush_context) -> None:
+    # Sessions opened with info={"audit": False} (maintenance jobs) are not audited
+    if session.info.get("audit") is False:
+        return
+    occurred_at = datetime.now(timezone.utc)
+    actor = current_actor.get()
+    collected = []
+    for action, objects in (
+        ("create", session.new),
+        ("update", session.dirty),
+        ("delete", session.deleted),
+    ):
+        for obj in objects:
+            audit_event = _describe(obj, action)
+            if audit_event:
+                audit_event["occurred_at"] = occurred_at
+                audit_event["actor"] = actor
+                collected.append(audit_event)
+    if collected:
+        session.info.setdefault("audit_events", []).extend(collected)
+
+
+@event.listens_for(Session, "after_commit")
+def _enqueue_events(session: Session) -> None:
+    events = session.info.pop("audit_events", None)
+    if events:
+        WRITER.enqueue(events)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_events(session: Session) -> None:
+    session.info.pop("audit_events", None)
+
+
+class AuditWriter:
+    """
+    Writes audit events from a background thread, many per transaction.
+    The thread is started on first use in each process, so forked
+    workers get their own. Failed batches are retried with backoff; after
+    `retry_seconds` (or right away for events that cannot wait) they go to
+    the dead-letter file, which is written to the database once it accepts
+    events again.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        flush_interval_ms: int,
+        max_pending: int,
+        retry_seconds: float,
+        dead_letter_path: str,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max_pending
+        self.retry_seconds = retry_seconds
+        self.dead_letter_path = dead_letter_path
+        self._queue: queue.Queue[dict[str, Any]] = queue.Queue(max_pending)
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+        # The batch the writer thread is writing or retrying
+        self._in_flight: list[dict[str, Any]] | None = None
+
+    def _ensure_started(self) -> None:
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(self.max_pending)
+            threading.Thread(target=self._run, name="audit-writer", daemon=True).start()
+            self._pid = os.getpid()
+
+    def enqueue(self, events: list[dict[str, Any]]) -> None:
+        self._ensure_started()
+        for i, audit_event in enumerate(events):
+            try:
+                self._queue.put_nowait(audit_event)
+            except queue.Full:
+                # The writer is falling behind; write the rest ourselves
+                self._write_batch(events[i:], queued=False)
+                break
+        JOB_QUEUE_DEPTH.set(self._queue.qsize(), queue="audit")
+
+    def flush(self, timeout: float) -> bool:
+        """
+        Waits up to `timeout` seconds for the writer thread to write every
+        pending event of this process. Returns False if some are still
+        pending, e.g. while the database is locked.
+        """
+        if self._pid != os.getpid():
+            return True
+        # Not Queue.join(), which would also wait for a batch the writer
+        # thread keeps retrying for up to retry_seconds
+        done = self._queue.all_tasks_done
+        with done:
+            return done.wait_for(lambda: not self._queue.unfinished_tasks, timeout)
+
+    def close(self, timeout: float) -> None:
+        """
+        Flushes at shutdown. Events that could not be written in time,
+        including the batch the writer thread is retrying, go to the
+        dead-letter file (duplicates if the thread still writes that batch).
+        """
+        if self.flush(timeout):
+            return
+        batch = list(self._in_flight or [])
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            self._queue.task_done()
+        if batch:
+            self._dead_letter(batch)
+
+    def _take_batch(self) -> list[dict[str, Any]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        self._replay_dead_letters()
+        while True:
+            self._in_flight = self._take_batch()
+            self._write_batch(self._in_flight, retry_seconds=self.retry_seconds)
+            self._in_flight = None
+
+    def _write_batch(
+        self,
+        batch: list[dict[str, Any]],
+        retry_seconds: float = 3,
+        queued: bool = True,
+    ) -> None:
+        # The background thread keeps retrying for AUDIT_RETRY_SECONDS (events
+        # queue up behind it meanwhile); requests writing their own events
+        # because the queue is full only briefly
+        try:
+            deadline = time.monotonic() + retry_seconds
+            attempt = 0
+            while True:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    AUDIT_WRITE_FAILURES.inc()
+                    print(f"Audit: failed to write {len(batch)} events: {e}")
+                    delay = min(2**attempt, 30)
+                    if time.monotonic() + delay > deadline:
+                        self._dead_letter(batch)
+                        return
+                    time.sleep(delay)
+                    attempt += 1
+                else:
+                    if attempt:
+                        self._replay_dead_letters()
+                    return
+        finally:
+            if queued:
+                for _ in batch:
+                    self._queue.task_done()
+            JOB_QUEUE_DEPTH.set(self._queue.qsize(), queue="audit")
+
+    def _dead_letter(self, batch: list[dict[str, Any]]) -> None:
+        """
+        Appends events to the dead-letter file, one JSON object per line.
+        They hold no PII values, only redacted column names.
+        """
+        lines = b"".join(orjson.dumps(audit_event) + b"\n" for audit_event in batch)
+        directory = os.path.dirname(self.dead_letter_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.dead_letter_path, "ab") as f:
+            # Shared by the worker processes
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        AUDIT_DEAD_LETTERS.inc(len(batch))
+        print(f"Audit: kept {len(batch)} events in {self.dead_letter_path}")
+
+    def _replay_dead_letters(self) -> None:
+        """
+        Writes the events of the dead-letter file to the database and empties
+        it. Left as it is if the database still refuses them.
+        """
+        try:
+            if os.path.getsize(self.dead_letter_path) == 0:
+                return
+        except OSError:
+            return
+        with open(self.dead_letter_path, "r+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            events = []
+            for line in f:
+                if not line.strip():
+                    continue
+                audit_event = orjson.loads(line)
+                audit_event["occurred_at"] = datetime.fromisoformat(audit_event["occurred_at"])
+                events.append(audit_event)
+            try:
+                for start in range(0, len(events), self.batch_size):
+                    self._write(events[start : start + self.batch_size])
+            except Exception as e:
+                # Events already written would be written again on the next
+                # replay; duplicates are preferred over losing events
+                AUDIT_WRITE_FAILURES.inc()
+                print(f"Audit: failed to replay {len(events)} dead-lettered events: {e}")
+                return
+            f.truncate(0)
+        print(f"Audit: replayed {len(events)} dead-lettered events")
+
+    def _write(self, events: list[dict[str, Any]]) -> None:
+        rows = [dict(audit_event) for audit_event in events]
+        with engine.begin() as connection:
+            problem_ids = {r["patient_problem_id"] for r in rows if r["patient_problem_id"]}
+            patients = {}
+            if problem_ids:
+                patients = dict(
+                    connection.execute(
+                        select(
+                            models.PatientProblem.patient_problem_id,  # type: ignore
+                            models.PatientProblem.patient_id,  # type: ignore
+                        ).where(
+                            models.PatientProblem.patient_problem_id.in_(problem_ids)  # type: ignore
+                        )
+                    ).all()
+                )
+            for row in rows:
+                problem_id = row.pop("patient_problem_id")
+                if problem_id:
+                    row["patient_id"] = patients.get(problem_id)
+            connection.execute(insert(models.AuditEvent), rows)
+
+
+WRITER = AuditWriter(
+    settings.AUDIT_BATCH_SIZE,
+    settings.AUDIT_FLUSH_INTERVAL_MS,
+    settings.AUDIT_QUEUE_SIZE,
+    settings.AUDIT_RETRY_SECONDS,
+    settings.AUDIT_DEAD_LETTER_PATH
+    or os.path.join(os.path.dirname(settings.DATABASE_PATH), "audit-dead-letter.ndjson"),
+)
+atexit.register(WRITER.close, settings.AUDIT_FLUSH_TIMEOUT_SECONDS)
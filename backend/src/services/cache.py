@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from ..config import settings
+from .metrics import record_cache_lookup
+
+
+class InProcessCache:
+    """
+    Thread-safe LRU cache with per-entry TTL, private to the worker process.
+    Holds at most `max_size` entries and `max_bytes` bytes of values.
+    """
+
+    def __init__(self, max_size: int = 1024, max_bytes: int | None = None):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _pop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        with self._lock:
+            self._pop(key)
+            if self.max_bytes is not None and len(value) > self.max_bytes:
+                return
+            self._entries[key] = (time.monotonic() + ttl_seconds, value)
+            self._bytes += len(value)
+            while len(self._entries) > self.max_size or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                self._pop(next(iter(self._entries)))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+class RedisCache:
+    """
+    Cache shared by all workers (and containers) pointing at the same Redis
+    or Valkey server, typically a sidecar on localhost.
+    """
+
+    def __init__(self, url: str, prefix: str = "omaha:"):
+        # Optional dependency, see the "redis" extra in pyproject.toml
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key: str) -> bytes | None:
+        return self._client.get(self._prefix + key)  # type: ignore
+
+    def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        self._client.set(self._prefix + key, value, px=int(ttl_seconds * 1000))
+
+    def delete(self, key: str) -> None:
+        self._client.delete(self._prefix + key)
+
+    def clear(self) -> None:
+        keys = list(self._client.scan_iter(match=self._prefix + "*"))
+        if keys:
+            self._client.delete(*keys)
+
+
+Cache = InProcessCache | RedisCache
+
+
+@lru_cache(maxsize=1)
+def get_cache() -> Cache:
+    """
+    Returns the configured cache backend (CACHE_BACKEND): "memory" is per
+    worker process, "redis" is shared between workers.
+    """
+    if settings.CACHE_BACKEND == "redis":
+        if not settings.CACHE_URL:
+            raise ValueError("CACHE_BACKEND=redis requires CACHE_URL")
+        return RedisCache(settings.CACHE_URL)
+    return InProcessCache(settings.CACHE_MAX_ENTRIES)
+
+
+def lookup(name: str, key: str) -> bytes | None:
+    """
+    Looks up `key` in the cache called `name` (used as key prefix and
+    metrics label). Backend errors count as misses.
+    """
+    try:
+        value = get_cache().get(f"{name}:{key}")
+    except Exception as e:
+        print(f"Cache backend error: {e}")
+        value = None
+    record_cache_lookup(name, value is not None)
+    return value
+
+
+def store(name: str, key: str, value: bytes, ttl_seconds: float) -> None:
+    try:
+        get_cache().set(f"{name}:{key}", value, ttl_seconds)
+    except Exception as e:
+        print(f"Cache backend error: {e}")
+
+
+def invalidate(name: str, key: str) -> None:
+    try:
+        get_cache().delete(f"{name}:{key}")
+    except Exception as e:
+        print(f"Cache backend error: {e}")
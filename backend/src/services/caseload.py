@@ -0,0 +1,516 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Iterable
+
+from sqlalchemy import Connection, and_, delete, event, func, inspect, tuple_
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from sqlmodel import col, select
+
+from ..config import settings
+from ..models import (
+    CaseloadAggregate,
+    CaseloadCounter,
+    CaseloadDue,
+    CaseloadProblem,
+    OmahaDomain,
+    OmahaProblem,
+    OutcomePhase,
+    OutcomeScore,
+    Patient,
+    PatientProblem,
+)
+
+ACTIVE_PATIENTS = "active_patients"
+# The interval the stored due dates were computed with
+REASSESSMENT_INTERVAL = "reassessment_interval_days"
+# A score in this phase closes the problem's reassessment cycle
+DISCHARGE_PHASE = "Discharge"
+BUCKET_KEY = ("domain_id", "modifier_type_id", "assessed_on")
+DUE_KEY = ("domain_id", "modifier_type_id", "due_on")
+TOTALS = (
+    "active_problems",
+    "scored_problems",
+    "knowledge_total",
+    "behavior_total",
+    "status_total",
+)
+
+
+def _contributions(
+    connection: Connection, problem_ids: Iterable[int] | None = None
+) -> dict[int, dict[str, Any]]:
+    """
+    Computes the CaseloadProblem rows of the given problems (all problems
+    if None) from the clinical tables. Problems that are not counted
+    (inactive, deleted, or of an inactive patient) are left out.
+    """
+    discharge_phases = set(
+        connection.execute(
+            select(OutcomePhase.phase_id).where(OutcomePhase.phase_name == DISCHARGE_PHASE)
+        ).scalars()
+    )
+    interval = timedelta(days=settings.REASSESSMENT_INTERVAL_DAYS)
+    ranked = select(
+        OutcomeScore.patient_problem_id,
+        OutcomeScore.phase_id,
+        OutcomeScore.rating_knowledge_id,
+        OutcomeScore.rating_behavior_id,
+        OutcomeScore.rating_status_id,
+        OutcomeScore.date_recorded,
+        func.row_number()
+        .over(
+            partition_by=OutcomeScore.patient_problem_id,
+            order_by=(
+                col(OutcomeScore.date_recorded).desc(),
+                col(OutcomeScore.score_id).desc(),
+            ),
+        )
+        .label("position"),
+    ).where(OutcomeScore.deleted_at == None)  # noqa: E711
+    query = (
+        select(
+            PatientProblem.patient_problem_id,
+            PatientProblem.modifier_type_id,
+            PatientProblem.clinician_id,
+            PatientProblem.created_at,
+            OmahaProblem.domain_id,
+        )
+        .join(OmahaProblem, OmahaProblem.problem_id == PatientProblem.problem_id)  # type: ignore
+        .join(Patient, Patient.patient_id == PatientProblem.patient_id)  # type: ignore
+        .where(PatientProblem.is_active == True)  # noqa: E712
+        .where(PatientProblem.deleted_at == None)  # noqa: E711
+        .where(Patient.is_active == True)  # noqa: E712
+        .where(Patient.deleted_at == None)  # noqa: E711
+    )
+    if problem_ids is not None:
+        problem_ids = list(problem_ids)
+        ranked = ranked.where(col(OutcomeScore.patient_problem_id).in_(problem_ids))
+        query = query.where(col(PatientProblem.patient_problem_id).in_(problem_ids))
+    latest = ranked.subquery()
+    query = query.add_columns(
+        latest.c.phase_id,
+        latest.c.rating_knowledge_id,
+        latest.c.rating_behavior_id,
+        latest.c.rating_status_id,
+        latest.c.date_recorded,
+    ).outerjoin(
+        latest,
+        and_(
+            latest.c.patient_problem_id == PatientProblem.patient_problem_id,
+            latest.c.position == 1,
+        ),
+    )
+
+    contributions = {}
+    for row in connection.execute(query):
+        assessed = row.date_recorded or row.created_at
+        assessed_on = assessed.date() if isinstance(assessed, datetime) else assessed
+        contributions[row.patient_problem_id] = {
+            "patient_problem_id": row.patient_problem_id,
+            "domain_id": row.domain_id,
+            "modifier_type_id": row.modifier_type_id,
+            "assessed_on": assessed_on,
+            "rating_knowledge": row.rating_knowledge_id,
+            "rating_behavior": row.rating_behavior_id,
+            "rating_status": row.rating_status_id,
+            "clinician_id": row.clinician_id,
+            "phase_id": row.phase_id,
+            "due_on": None if row.phase_id in discharge_phases else assessed_on + interval,
+        }
+    return contributions
+
+
+def _totals(contribution: dict[str, Any], sign: int) -> dict[str, int]:
+    scored = contribution["rating_knowledge"] is not None
+    return {
+        "active_problems": sign,
+        "scored_problems": sign if scored else 0,
+        "knowledge_total": sign * (contribution["rating_knowledge"] or 0),
+        "behavior_total": sign * (contribution["rating_behavior"] or 0),
+        "status_total": sign * (contribution["rating_status"] or 0),
+    }
+
+
+def _apply(connection: Connection, contribution: dict[str, Any], sign: int) -> None:
+    key = {name: contribution[name] for name in BUCKET_KEY}
+    statement = insert(CaseloadAggregate).values(**key, **_totals(contribution, sign))
+    statement = statement.on_conflict_do_update(
+        index_elements=BUCKET_KEY,
+        set_={
+            name: getattr(CaseloadAggregate, name) + getattr(statement.excluded, name)
+            for name in TOTALS
+        },
+    )
+    connection.execute(statement)
+    if sign < 0:
+        # Drop emptied buckets so the table stays small
+        connection.execute(
+            delete(CaseloadAggregate)
+            .where(*(getattr(CaseloadAggregate, name) == value for name, value in key.items()))
+            .where(col(CaseloadAggregate.active_problems) <= 0)
+        )
+
+
+def _apply_due(connection: Connection, contribution: dict[str, Any], sign: int) -> None:
+    if contribution["due_on"] is None:
+        return
+    key = {name: contribution[name] for name in DUE_KEY}
+    statement = insert(CaseloadDue).values(**key, problems=sign)
+    connection.execute(
+        statement.on_conflict_do_update(
+            index_elements=DUE_KEY,
+            set_={"problems": CaseloadDue.problems + statement.excluded.problems},
+        )
+    )
+    if sign < 0:
+        connection.execute(
+            delete(CaseloadDue)
+            .where(*(getattr(CaseloadDue, name) == value for name, value in key.items()))
+            .where(col(CaseloadDue.problems) <= 0)
+        )
+
+
+def _add_active_patients(connection: Connection, delta: int) -> None:
+    statement = insert(CaseloadCounter).values(name=ACTIVE_PATIENTS, value=delta)
+    connection.execute(
+        statement.on_conflict_do_update(
+            index_elements=["name"],
+            set_={"value": CaseloadCounter.value + statement.excluded.value},
+        )
+    )
+
+
+def refresh_problems(connection: Connection, problem_ids: set[int]) -> None:
+    """
+    Replaces the aggregate contributions of the given problems with ones
+    computed from their current state.
+    """
+    current = {
+        row.patient_problem_id: dict(row._mapping)
+        for row in connection.execute(
+            select(CaseloadProblem).where(
+                col(CaseloadProblem.patient_problem_id).in_(problem_ids)
+            )
+        )
+    }
+    updated = _contributions(connection, problem_ids)
+    for problem_id in problem_ids:
+        old, new = current.get(problem_id), updated.get(problem_id)
+        if old == new:
+            continue
+        if old is not None:
+            _apply(connection, old, -1)
+            _apply_due(connection, old, -1)
+            connection.execute(
+                delete(CaseloadProblem).where(
+                    CaseloadProblem.patient_problem_id == problem_id  # type: ignore
+                )
+            )
+        if new is not None:
+            _apply(connection, new, 1)
+            _apply_due(connection, new, 1)
+            connection.execute(insert(CaseloadProblem).values(**new))
+
+
+def _counted(active: bool, deleted_at: datetime | None) -> bool:
+    return bool(active) and deleted_at is None
+
+
+def _previous(obj: Any, key: str) -> Any:
+    history = inspect(obj).attrs[key].history
+    return history.deleted[0] if history.deleted else getattr(obj, key)
+
+
+@event.listens_for(Session, "after_flush")
+def _update_aggregates(session: Session, flush_context) -> None:
+    problem_ids: set[int] = set()
+    patient_ids: set[int] = set()
+    active_patients = 0
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (PatientProblem, OutcomeScore)):
+            problem_ids.add(obj.patient_problem_id)  # type: ignore
+        elif isinstance(obj, Patient):
+            before = obj not in session.new and _counted(
+                _previous(obj, "is_active"), _previous(obj, "deleted_at")
+            )
+            after = obj not in session.deleted and _counted(obj.is_active, obj.deleted_at)
+            if before != after:
+                active_patients += 1 if after else -1
+                patient_ids.add(obj.patient_id)  # type: ignore
+    if not (problem_ids or patient_ids):
+        return
+
+    connection = session.connection()
+    if active_patients:
+        _add_active_patients(connection, active_patients)
+    if patient_ids:
+        problem_ids.update(
+            connection.execute(
+                select(PatientProblem.patient_problem_id).where(
+                    col(PatientProblem.patient_id).in_(patient_ids)
+                )
+            ).scalars()
+        )
+    refresh_problems(connection, problem_ids)
+
+
+def _expected(connection: Connection) -> tuple[dict, dict, dict, int]:
+    problems = _contributions(connection)
+    aggregates: dict[tuple, dict[str, int]] = {}
+    due: dict[tuple, int] = {}
+    for contribution in problems.values():
+        key = tuple(contribution[name] for name in BUCKET_KEY)
+        totals = aggregates.setdefault(key, dict.fromkeys(TOTALS, 0))
+        for name, value in _totals(contribution, 1).items():
+            totals[name] += value
+        if contribution["due_on"] is not None:
+            due_key = tuple(contribution[name] for name in DUE_KEY)
+            due[due_key] = due.get(due_key, 0) + 1
+    active_patients = connection.execute(
+        select(func.count(col(Patient.patient_id)))
+        .where(Patient.is_active == True)  # noqa: E712
+        .where(Patient.deleted_at == None)  # noqa: E711
+    ).scalar_one()
+    return problems, aggregates, due, active_patients
+
+
+def rebuild(session: Session) -> int:
+    """
+    Recomputes all caseload aggregates from the clinical tables. Returns
+    the number of counted problems.
+    """
+    connection = session.connection()
+    problems, aggregates, due, active_patients = _expected(connection)
+    for model in (CaseloadProblem, CaseloadAggregate, CaseloadDue, CaseloadCounter):
+        connection.execute(delete(model))
+    if problems:
+        connection.execute(insert(CaseloadProblem), list(problems.values()))
+    if aggregates:
+        connection.execute(
+            insert(CaseloadAggregate),
+            [dict(zip(BUCKET_KEY, key), **totals) for key, totals in aggregates.items()],
+        )
+    if due:
+        connection.execute(
+            insert(CaseloadDue),
+            [dict(zip(DUE_KEY, key), problems=count) for key, count in due.items()],
+        )
+    connection.execute(
+        insert(CaseloadCounter),
+        [
+            {"name": ACTIVE_PATIENTS, "value": active_patients},
+            {"name": REASSESSMENT_INTERVAL, "value": settings.REASSESSMENT_INTERVAL_DAYS},
+        ],
+    )
+    session.commit()
+    return len(problems)
+
+
+def check(session: Session) -> list[str]:
+    """
+    Compares the stored aggregates with freshly computed ones and returns
+    a description of every difference.
+    """
+    connection = session.connection()
+    problems, aggregates, due, active_patients = _expected(connection)
+    differences = []
+
+    stored_patients = connection.execute(
+        select(CaseloadCounter.value).where(CaseloadCounter.name == ACTIVE_PATIENTS)
+    ).scalar()
+    if stored_patients != active_patients:
+        differences.append(
+            f"active patients: stored {stored_patients}, expected {active_patients}"
+        )
+
+    stored = {
+        tuple(getattr(row, name) for name in BUCKET_KEY): {
+            name: getattr(row, name) for name in TOTALS
+        }
+        for row in connection.execute(select(CaseloadAggregate))
+    }
+    for key in sorted(stored.keys() | aggregates.keys()):
+        if stored.get(key) != aggregates.get(key):
+            differences.append(
+                f"bucket {key}: stored {stored.get(key)}, expected {aggregates.get(key)}"
+            )
+
+    stored_due = {
+        tuple(getattr(row, name) for name in DUE_KEY): row.problems
+        for row in connection.execute(select(CaseloadDue))
+    }
+    for key in sorted(stored_due.keys() | due.keys()):
+        if stored_due.get(key) != due.get(key):
+            differences.append(
+                f"due {key}: stored {stored_due.get(key)}, expected {due.get(key)}"
+            )
+
+    stored_problems = {
+        row.patient_problem_id: dict(row._mapping)
+        for row in connection.execute(select(CaseloadProblem))
+    }
+    for problem_id in sorted(stored_problems.keys() | problems.keys()):
+        if stored_problems.get(problem_id) != problems.get(problem_id):
+            differences.append(
+                f"problem {problem_id}: stored {stored_problems.get(problem_id)}, "
+                f"expected {problems.get(problem_id)}"
+            )
+    return differences
+
+
+def ensure_aggregates(session: Session) -> int | None:
+    """
+    Builds the aggregates of a database that predates them (or the due
+    date buckets), or whose aggregates were computed with a different
+    REASSESSMENT_INTERVAL_DAYS. Returns the number of counted problems, or
+    None if they were up to date.
+    """
+    interval = session.get(CaseloadCounter, REASSESSMENT_INTERVAL)
+    due_missing = (
+        session.exec(select(CaseloadDue.due_on).limit(1)).first() is None
+        and session.exec(
+            select(CaseloadProblem.patient_problem_id)
+            .where(col(CaseloadProblem.due_on) != None)  # noqa: E711
+            .limit(1)
+        ).first()
+        is not None
+    )
+    if (
+        session.get(CaseloadCounter, ACTIVE_PATIENTS) is not None
+        and interval is not None
+        and interval.value == settings.REASSESSMENT_INTERVAL_DAYS
+        and not due_missing
+    ):
+        return None
+    return rebuild(session)
+
+
+def dashboard(
+    session: Session,
+    domain_id: int | None = None,
+    modifier_type_id: int | None = None,
+    today: date | None = None,
+) -> dict[str, Any]:
+    """
+    Caseload figures read from the aggregate tables only, so the cost
+    does not grow with the number of patients. Overdue problems are those
+    past their due date, as on the worklist.
+    """
+    today = today or datetime.now(timezone.utc).date()
+
+    query = (
+        select(
+            CaseloadAggregate.domain_id,
+            OmahaDomain.domain_name,
+            *(func.sum(getattr(CaseloadAggregate, name)).label(name) for name in TOTALS),
+        )
+        .join(OmahaDomain, OmahaDomain.domain_id == CaseloadAggregate.domain_id)  # type: ignore
+        .group_by(CaseloadAggregate.domain_id, OmahaDomain.domain_name)
+        .order_by(CaseloadAggregate.domain_id)
+    )
+    overdue_query = (
+        select(CaseloadDue.domain_id, func.sum(CaseloadDue.problems))
+        .where(col(CaseloadDue.due_on) < today)
+        .group_by(CaseloadDue.domain_id)
+    )
+    if domain_id is not None:
+        query = query.where(CaseloadAggregate.domain_id == domain_id)
+        overdue_query = overdue_query.where(CaseloadDue.domain_id == domain_id)
+    if modifier_type_id is not None:
+        query = query.where(CaseloadAggregate.modifier_type_id == modifier_type_id)
+        overdue_query = overdue_query.where(CaseloadDue.modifier_type_id == modifier_type_id)
+    overdue = dict(session.exec(overdue_query).all())
+
+    def summary(values: dict[str, Any]) -> dict[str, Any]:
+        scored = values["scored_problems"]
+        return {
+            "active_problems": values["active_problems"],
+            "overdue_reassessments": values["overdue_reassessments"],
+            "scored_problems": scored,
+            "average_knowledge": values["knowledge_total"] / scored if scored else None,
+            "average_behavior": values["behavior_total"] / scored if scored else None,
+            "average_status": values["status_total"] / scored if scored else None,
+        }
+
+    domains = []
+    overall = dict.fromkeys(("active_problems", "overdue_reassessments", *TOTALS[1:]), 0)
+    for row in session.exec(query).all():
+        values = dict(row._mapping, overdue_reassessments=overdue.get(row.domain_id, 0))
+        for name in overall:
+            overall[name] += values[name]
+        domains.append(
+            {"domain_id": row.domain_id, "domain_name": row.domain_name, **summary(values)}
+        )
+
+    active_patients = session.get(CaseloadCounter, ACTIVE_PATIENTS)
+    return {
+        "active_patients": active_patients.value if active_patients else 0,
+        "reassessment_interval_days": settings.REASSESSMENT_INTERVAL_DAYS,
+        **summary(overall),
+        "domains": domains,
+    }
+
+
+def worklist(
+    session: Session,
+    clinician_id: str | None = None,
+    due_by: date | None = None,
+    after: tuple[date, int] | None = None,
+    limit: int = 50,
+) -> tuple[list[dict[str, Any]], tuple[date, int] | None]:
+    """
+    Counted problems due for reassessment on or before `due_by` (today by
+    default), earliest due first. Walks a due_on index, so a page costs
+    the same however many problems are not due yet. `after` is the
+    (due_on, patient_problem_id) of the last item of the previous page;
+    the second return value is that of this page, or None on the last one.
+    """
+    today = datetime.now(timezone.utc).date()
+    due_by = due_by or today
+    query = (
+        select(
+            CaseloadProblem,
+            PatientProblem.patient_id,
+            PatientProblem.problem_id,
+            OmahaProblem.problem_name,
+        )
+        .join(
+            PatientProblem,
+            PatientProblem.patient_problem_id  # type: ignore
+            == CaseloadProblem.patient_problem_id,
+        )
+        .join(OmahaProblem, OmahaProblem.problem_id == PatientProblem.problem_id)  # type: ignore
+        .where(col(CaseloadProblem.due_on) <= due_by)
+    )
+    if clinician_id is not None:
+        query = query.where(CaseloadProblem.clinician_id == clinician_id)
+    if after is not None:
+        query = query.where(
+            tuple_(col(CaseloadProblem.due_on), col(CaseloadProblem.patient_problem_id))
+            > tuple_(*after)
+        )
+    rows = session.exec(
+        query.order_by(
+            col(CaseloadProblem.due_on), col(CaseloadProblem.patient_problem_id)
+        ).limit(limit + 1)
+    ).all()
+
+    items = [
+        {
+            "patient_problem_id": problem.patient_problem_id,
+            "patient_id": patient_id,
+            "problem_id": problem_id,
+            "problem_name": problem_name,
+            "domain_id": problem.domain_id,
+            "modifier_type_id": problem.modifier_type_id,
+            "clinician_id": problem.clinician_id,
+            "phase_id": problem.phase_id,
+            "assessed_on": problem.assessed_on,
+            "due_on": problem.due_on,
+            "days_overdue": max(0, (today - problem.due_on).days),
+        }
+        for problem, patient_id, problem_id, problem_name in rows[:limit]
+    ]
+    if len(rows) <= limit:
+        return items, None
+    return items, (items[-1]["due_on"], items[-1]["patient_problem_id"])
@@ -0,0 +1,197 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import event, func, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+from sqlmodel import col, select
+
+from .. import models
+from ..config import settings
+
+# Tables in the feed; PII changes are reported as changes of the patient
+FEED_MODELS: dict[str, Any] = {
+    "patient": models.Patient,
+    "patient_problem": models.PatientProblem,
+    "patient_problem_symptom": models.PatientProblemSymptom,
+    "outcome_score": models.OutcomeScore,
+    "care_intervention": models.CareIntervention,
+}
+# The column that leads from a row to its patient
+PATIENT_COLUMN = {
+    "patient": "patient_id",
+    "patient_problem": "patient_id",
+    "patient_problem_symptom": "patient_problem_id",
+    "outcome_score": "patient_problem_id",
+    "care_intervention": "patient_problem_id",
+}
+
+# Bumped after every commit in this process that wrote to the change log,
+# so waiting clients can check right away instead of at the next poll
+_local_commits = 0
+
+
+def _entry_for(session: Session, obj: Any) -> tuple[str, int, int | None] | None:
+    table = getattr(obj, "__tablename__", None)
+    if table == "patient_pii":
+        return "patient", obj.patient_id, obj.patient_id
+    if table not in FEED_MODELS:
+        return None
+
+    record_id = getattr(obj, FEED_MODELS[table].__mapper__.primary_key[0].key)
+    if PATIENT_COLUMN[table] == "patient_id":
+        return table, record_id, obj.patient_id
+
+    # Routers load the problem before changing its children, so this is
+    # almost always answered from the identity map
+    problem = session.identity_map.get(
+        identity_key(models.PatientProblem, obj.patient_problem_id)
+    )
+    if problem is not None:
+        return table, record_id, problem.patient_id
+    patient_id = session.connection().execute(
+        select(models.PatientProblem.patient_id).where(
+            models.PatientProblem.patient_problem_id == obj.patient_problem_id
+        )
+    ).scalar()
+    return table, record_id, patient_id
+
+
+@event.listens_for(Session, "after_flush")
+def _record_changes(session: Session, flush_context) -> None:
+    # Maintenance sessions (key rotation, storage migration) change no values
+    if session.info.get("audit") is False:
+        return
+    entries = {}
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+            continue
+        entry = _entry_for(session, obj)
+        if entry:
+            entries[entry[:2]] = entry
+    if not entries:
+        return
+
+    changed_at = datetime.now(timezone.utc)
+    session.connection().execute(
+        insert(models.ChangeLogEntry),
+        [
+            {
+                "table_name": table,
+                "record_id": record_id,
+                "patient_id": patient_id,
+                "changed_at": changed_at,
+            }
+            for table, record_id, patient_id in entries.values()
+        ],
+    )
+    session.info["change_log_written"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_waiters(session: Session) -> None:
+    global _local_commits
+    if session.info.pop("change_log_written", False):
+        _local_commits += 1
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_notification(session: Session) -> None:
+    session.info.pop("change_log_written", None)
+
+
+def latest_seq(session: Session) -> int:
+    return session.exec(select(func.max(models.ChangeLogEntry.seq))).one() or 0
+
+
+def patient_version(session: Session, patient_id: int) -> int:
+    """
+    Sequence number of the patient's latest change (of the patient, PII,
+    problems, symptoms, scores or interventions), 0 if none is logged.
+    It changes with every write to the patient's care plan.
+    """
+    return (
+        session.exec(
+            select(func.max(models.ChangeLogEntry.seq)).where(
+                models.ChangeLogEntry.patient_id == patient_id
+            )
+        ).one()
+        or 0
+    )
+
+
+def read_changes(
+    session: Session, since: int, limit: int, patient_id: int | None = None
+) -> dict[str, Any]:
+    """
+    Returns the records changed after sequence number `since`, oldest
+    first, each with its current column values ("upsert") or as a
+    "delete" if it has been (soft) deleted. A record changed several
+    times is reported once, at its latest sequence number.
+    """
+    query = select(models.ChangeLogEntry).where(col(models.ChangeLogEntry.seq) > since)
+    if patient_id is not None:
+        query = query.where(models.ChangeLogEntry.patient_id == patient_id)
+    entries = session.exec(
+        query.order_by(col(models.ChangeLogEntry.seq)).limit(limit + 1)
+    ).all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    latest: dict[tuple[str, int], models.ChangeLogEntry] = {}
+    for entry in entries:
+        key = (entry.table_name, entry.record_id)
+        latest.pop(key, None)
+        latest[key] = entry
+
+    rows: dict[tuple[str, int], Any] = {}
+    for table, model in FEED_MODELS.items():
+        ids = [record_id for name, record_id in latest if name == table]
+        if not ids:
+            continue
+        primary_key = model.__mapper__.primary_key[0]
+        for row in session.exec(select(model).where(primary_key.in_(ids))).all():
+            rows[(table, getattr(row, primary_key.key))] = row
+
+    changes = []
+    for key, entry in latest.items():
+        row = rows.get(key)
+        deleted = row is None or row.deleted_at is not None
+        changes.append(
+            {
+                "seq": entry.seq,
+                "table": entry.table_name,
+                "id": entry.record_id,
+                "patient_id": entry.patient_id,
+                "op": "delete" if deleted else "upsert",
+                "data": None if deleted else row.model_dump(),
+            }
+        )
+    return {
+        "changes": changes,
+        "next_since": entries[-1].seq if entries else since,
+        "has_more": has_more,
+    }
+
+
+async def wait_for_changes(since: int, timeout: float, read_latest) -> bool:
+    """
+    Waits up to `timeout` seconds for the change log to move past `since`.
+    Commits in this process are noticed within 100 ms, those of other
+    workers within CHANGES_POLL_INTERVAL_MS. `read_latest` is an async
+    callable returning the latest sequence number.
+    """
+    deadline = time.monotonic() + timeout
+    poll_interval = settings.CHANGES_POLL_INTERVAL_MS / 1000
+    seen_commits = _local_commits
+    next_poll = time.monotonic() + poll_interval
+    while time.monotonic() < deadline:
+        await asyncio.sleep(min(0.1, max(0.0, deadline - time.monotonic())))
+        if _local_commits != seen_commits or time.monotonic() >= next_poll:
+            seen_commits = _local_commits
+            next_poll = time.monotonic() + poll_interval
+            if await read_latest() > since:
+                return True
+    return False
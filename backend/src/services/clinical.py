@@ -0,0 +1,297 @@
+"""
+Validation and construction of clinical records, shared by the clinical
+routers and the sync endpoint. Nothing here commits: records are added to
+the session and committed by the caller.
+"""
+
+from datetime import datetime
+from typing import Any, Sequence
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import joinedload
+from sqlmodel import Session, select
+
+from ..models import (
+    CareIntervention,
+    InterventionCategory,
+    InterventionTarget,
+    ModifierDomain,
+    ModifierType,
+    OmahaProblem,
+    OutcomePhase,
+    OutcomeRatingBehavior,
+    OutcomeRatingKnowledge,
+    OutcomeRatingStatus,
+    OutcomeScore,
+    Patient,
+    PatientProblem,
+    PatientProblemSymptom,
+    Symptom,
+)
+from ..schemas import (
+    CareInterventionCreate,
+    OutcomeScoreCreate,
+    PatientProblemCreate,
+    PatientProblemSymptomCreate,
+    PatientProblemUpdate,
+)
+
+
+class ClinicalError(ValueError):
+    """
+    A clinical write that cannot be applied. `status_code` is the HTTP
+    status the routers answer with.
+    """
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class ProblemNotFound(ClinicalError):
+    def __init__(self):
+        super().__init__(404, "Patient problem not found")
+
+
+class ProblemNotActive(ClinicalError):
+    def __init__(self):
+        super().__init__(400, "Patient problem is not active")
+
+
+# Position in a history list: date and id of the last item of a page
+HistoryCursor = tuple[datetime, int]
+
+
+def format_cursor(cursor: HistoryCursor) -> str:
+    return f"{cursor[0].isoformat()}_{cursor[1]}"
+
+
+def parse_cursor(cursor: str) -> HistoryCursor:
+    try:
+        occurred_at, record_id = cursor.split("_")
+        return datetime.fromisoformat(occurred_at), int(record_id)
+    except ValueError:
+        raise ClinicalError(400, "Invalid cursor")
+
+
+def get_patient_problem(
+    session: Session,
+    patient_problem_id: int,
+    patient_id: int | None = None,
+    require_active: bool = False,
+) -> PatientProblem:
+    problem = session.get(PatientProblem, patient_problem_id)
+    if (
+        not problem
+        or problem.deleted_at
+        or (patient_id is not None and problem.patient_id != patient_id)
+    ):
+        raise ProblemNotFound()
+    if require_active and not problem.is_active:
+        raise ProblemNotActive()
+    return problem
+
+
+def create_problem(
+    session: Session, patient_id: int, problem_data: PatientProblemCreate
+) -> PatientProblem:
+    patient = session.get(Patient, patient_id)
+    if not patient or patient.deleted_at:
+        raise ClinicalError(404, "Patient not found")
+
+    # Validate foreign keys
+    if not session.get(OmahaProblem, problem_data.problem_id):
+        raise ClinicalError(404, "Problem not found")
+    if not session.get(ModifierDomain, problem_data.modifier_domain_id):
+        raise ClinicalError(404, "Modifier domain not found")
+    if not session.get(ModifierType, problem_data.modifier_type_id):
+        raise ClinicalError(404, "Modifier type not found")
+
+    new_problem = PatientProblem(patient_id=patient_id, **problem_data.model_dump())
+    session.add(new_problem)
+    return new_problem
+
+
+def update_problem(
+    session: Session, problem: PatientProblem, problem_data: PatientProblemUpdate
+) -> PatientProblem:
+    changes = problem_data.model_dump(exclude_unset=True)
+    if changes.get("is_active", False) is None:
+        raise ClinicalError(400, "is_active cannot be null")
+    for name, value in changes.items():
+        setattr(problem, name, value)
+    session.add(problem)
+    return problem
+
+
+def add_symptom(
+    session: Session,
+    problem: PatientProblem,
+    symptom_data: PatientProblemSymptomCreate,
+    check_existing: bool = True,
+) -> PatientProblemSymptom | None:
+    """
+    Returns None if the symptom is already recorded for the problem. With
+    check_existing=False the caller relies on the unique index instead
+    and handles the IntegrityError on commit.
+    """
+    if not problem.is_active:
+        raise ProblemNotActive()
+
+    if check_existing:
+        existing_symptom = session.exec(
+            select(PatientProblemSymptom)
+            .where(PatientProblemSymptom.patient_problem_id == problem.patient_problem_id)
+            .where(PatientProblemSymptom.symptom_id == symptom_data.symptom_id)
+            .where(PatientProblemSymptom.deleted_at == None)  # noqa: E711
+        ).first()
+        if existing_symptom:
+            return None
+
+    if not session.get(Symptom, symptom_data.symptom_id):
+        raise ClinicalError(404, "Symptom not found")
+
+    new_symptom = PatientProblemSymptom(
+        patient_problem_id=problem.patient_problem_id,  # type: ignore
+        symptom_id=symptom_data.symptom_id,
+        symptom_comment=symptom_data.symptom_comment,
+    )
+    session.add(new_symptom)
+    return new_symptom
+
+
+def add_score(
+    session: Session, problem: PatientProblem, score_data: OutcomeScoreCreate
+) -> OutcomeScore:
+    if not session.get(OutcomePhase, score_data.phase_id):
+        raise ClinicalError(400, "Invalid phase_id.")
+
+    # Validate ratings (Must be 1-5 and exist in DB)
+    if not (1 <= score_data.rating_knowledge_id <= 5) or not session.get(
+        OutcomeRatingKnowledge, score_data.rating_knowledge_id
+    ):
+        raise ClinicalError(400, "Invalid rating_knowledge_id. Must be between 1 and 5.")
+
+    if not (1 <= score_data.rating_behavior_id <= 5) or not session.get(
+        OutcomeRatingBehavior, score_data.rating_behavior_id
+    ):
+        raise ClinicalError(400, "Invalid rating_behavior_id. Must be between 1 and 5.")
+
+    if not (1 <= score_data.rating_status_id <= 5) or not session.get(
+        OutcomeRatingStatus, score_data.rating_status_id
+    ):
+        raise ClinicalError(400, "Invalid rating_status_id. Must be between 1 and 5.")
+
+    new_score = OutcomeScore(
+        patient_problem_id=problem.patient_problem_id,  # type: ignore
+        **score_data.model_dump(),
+    )
+    session.add(new_score)
+    return new_score
+
+
+def add_intervention(
+    session: Session, problem: PatientProblem, intervention_data: CareInterventionCreate
+) -> CareIntervention:
+    # Validate foreign keys
+    if not session.get(InterventionCategory, intervention_data.category_id):
+        raise ClinicalError(404, "Intervention category not found")
+    if not session.get(InterventionTarget, intervention_data.target_id):
+        raise ClinicalError(404, "Intervention target not found")
+
+    new_intervention = CareIntervention(
+        patient_problem_id=problem.patient_problem_id,  # type: ignore
+        **intervention_data.model_dump(),
+    )
+    session.add(new_intervention)
+    return new_intervention
+
+
+def _history_page(
+    session: Session,
+    query: Any,
+    model: Any,
+    date_name: str,
+    since: datetime | None,
+    until: datetime | None,
+    before: HistoryCursor | None,
+    limit: int,
+) -> tuple[Sequence[Any], HistoryCursor | None]:
+    record_id = model.__mapper__.primary_key[0]
+    occurred_at = getattr(model, date_name)
+    query = query.where(model.deleted_at == None)  # noqa: E711
+    if since is not None:
+        query = query.where(occurred_at >= since)
+    if until is not None:
+        query = query.where(occurred_at < until)
+    if before is not None:
+        query = query.where(tuple_(occurred_at, record_id) < tuple_(*before))
+    rows = session.exec(
+        query.order_by(occurred_at.desc(), record_id.desc()).limit(limit + 1)
+    ).all()
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], (getattr(last, date_name), getattr(last, record_id.key))
+
+
+def list_scores(
+    session: Session,
+    patient_problem_id: int,
+    phase_id: int | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    before: HistoryCursor | None = None,
+    limit: int = 100,
+    labels: bool = True,
+) -> tuple[Sequence[OutcomeScore], HistoryCursor | None]:
+    """
+    A page of the problem's outcome scores, newest first, with their phase
+    and rating labels joined in the same query (unless `labels` is False),
+    and the cursor of the next page (None on the last one).
+    """
+    query = select(OutcomeScore).where(OutcomeScore.patient_problem_id == patient_problem_id)
+    if labels:
+        query = query.options(
+            joinedload(OutcomeScore.phase),  # type: ignore
+            joinedload(OutcomeScore.status_rating),  # type: ignore
+            joinedload(OutcomeScore.knowledge_rating),  # type: ignore
+            joinedload(OutcomeScore.behavior_rating),  # type: ignore
+        )
+    if phase_id is not None:
+        query = query.where(OutcomeScore.phase_id == phase_id)
+    return _history_page(
+        session, query, OutcomeScore, "date_recorded", since, until, before, limit
+    )
+
+
+def list_interventions(
+    session: Session,
+    patient_problem_id: int,
+    category_id: int | None = None,
+    target_id: int | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    before: HistoryCursor | None = None,
+    limit: int = 100,
+    labels: bool = True,
+) -> tuple[Sequence[CareIntervention], HistoryCursor | None]:
+    """
+    A page of the problem's interventions, newest first, like list_scores().
+    """
+    query = select(CareIntervention).where(
+        CareIntervention.patient_problem_id == patient_problem_id
+    )
+    if labels:
+        query = query.options(
+            joinedload(CareIntervention.category),  # type: ignore
+            joinedload(CareIntervention.target),  # type: ignore
+        )
+    if category_id is not None:
+        query = query.where(CareIntervention.category_id == category_id)
+    if target_id is not None:
+        query = query.where(CareIntervention.target_id == target_id)
+    return _history_page(
+        session, query, CareIntervention, "date_performed", since, until, before, limit
+    )
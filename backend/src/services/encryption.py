@@ -1,21 +1,200 @@
-from cryptography.fernet import Fernet
+import base64
+import hashlib
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+from cryptography.fernet import Fernet, MultiFernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from src.config import settings
 
+# Fallback key for development only
+DEFAULT_KEY = "peAXC9BBUlmxE9i7UmNpItcR1Bp6O1PvCXpPnhHKsO4="
+
+# Ciphertexts written with a key ring are tagged "<key_id>$<fernet token>".
+# Fernet tokens are urlsafe base64 and never contain "$".
+KEY_ID_SEPARATOR = "$"
+KEY_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+@dataclass(frozen=True)
+class Keyring:
+    # None in single-key mode, where ciphertexts are written untagged
+    primary_key_id: str | None
+    primary_key: bytes
+    # Key material of every configured key, primary first
+    keys: tuple[bytes, ...]
+    fernets: dict[str, Fernet]
+    # All keys, primary first; decrypts untagged (pre-key-ring) ciphertexts
+    fallback: MultiFernet
+
+
+def parse_keys(value: str) -> list[tuple[str, bytes]]:
+    """
+    Parses ENCRYPTION_KEYS ("k2:<key>,k1:<key>", primary first).
+    """
+    keys = []
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        key_id, sep, key = entry.partition(":")
+        if not sep or not KEY_ID_PATTERN.match(key_id):
+            raise ValueError(
+                "ENCRYPTION_KEYS entries must look like '<key_id>:<fernet key>' "
+                "with key ids made of letters, digits, '_' or '-'"
+            )
+        keys.append((key_id, key.strip().encode()))
+    if not keys:
+        raise ValueError("ENCRYPTION_KEYS is set but contains no keys")
+    return keys
+
+
+@lru_cache(maxsize=1)
+def get_keyring() -> Keyring:
+    if settings.ENCRYPTION_KEYS:
+        keys = parse_keys(settings.ENCRYPTION_KEYS)
+        # The single key used before the key ring was configured stays
+        # available for decrypting untagged ciphertexts.
+        if settings.ENCRYPTION_KEY and settings.ENCRYPTION_KEY.encode() not in {
+            k for _, k in keys
+        }:
+            keys.append(("legacy", settings.ENCRYPTION_KEY.encode()))
+        fernets = {key_id: Fernet(key) for key_id, key in keys}
+        return Keyring(
+            primary_key_id=keys[0][0],
+            primary_key=keys[0][1],
+            keys=tuple(key for _, key in keys),
+            fernets=fernets,
+            fallback=MultiFernet(list(fernets.values())),
+        )
 
-def get_key():
     if not settings.ENCRYPTION_KEY:
         # Fallback to a default key for development if not set in environment
-        default_key = "peAXC9BBUlmxE9i7UmNpItcR1Bp6O1PvCXpPnhHKsO4="
-        print(f"WARNING: Using default encryption key. Set ENCRYPTION_KEY environment variable for production.")
-        return default_key.encode()
-    return settings.ENCRYPTION_KEY.encode()
+        print(
+            "WARNING: Using default encryption key. Set ENCRYPTION_KEY environment variable for production."
+        )
+    key = (settings.ENCRYPTION_KEY or DEFAULT_KEY).encode()
+    fernet = Fernet(key)
+    return Keyring(
+        primary_key_id=None,
+        primary_key=key,
+        keys=(key,),
+        fernets={},
+        fallback=MultiFernet([fernet]),
+    )
+
+
+def get_key() -> bytes:
+    return get_keyring().primary_key
+
+
+def key_id_of(token: str) -> str | None:
+    """
+    Returns the key id a ciphertext was tagged with, or None if untagged.
+    """
+    key_id, sep, _ = token.partition(KEY_ID_SEPARATOR)
+    return key_id if sep else None
 
 
 def encrypt_data(data: str) -> str:
-    f = Fernet(get_key())
-    return f.encrypt(data.encode()).decode()
+    keyring = get_keyring()
+    if keyring.primary_key_id is None:
+        return keyring.fallback.encrypt(data.encode()).decode()
+    token = keyring.fernets[keyring.primary_key_id].encrypt(data.encode()).decode()
+    return f"{keyring.primary_key_id}{KEY_ID_SEPARATOR}{token}"
 
 
 def decrypt_data(token: str) -> str:
-    f = Fernet(get_key())
-    return f.decrypt(token.encode()).decode()
+    keyring = get_keyring()
+    key_id, sep, body = token.partition(KEY_ID_SEPARATOR)
+    if not sep:
+        return keyring.fallback.decrypt(token.encode()).decode()
+    fernet = keyring.fernets.get(key_id)
+    if fernet is None:
+        raise ValueError(f"Unknown encryption key id: {key_id}")
+    return fernet.decrypt(body.encode()).decode()
+
+
+def needs_rotation(token: str) -> bool:
+    """
+    True if the ciphertext was not written with the current primary key.
+    """
+    primary_key_id = get_keyring().primary_key_id
+    return primary_key_id is not None and key_id_of(token) != primary_key_id
+
+
+def rotate_token(token: str) -> str:
+    """
+    Re-encrypts a ciphertext under the current primary key.
+    """
+    return encrypt_data(decrypt_data(token))
+
+
+# ==========================================
+# Single-record (AES-GCM) encryption
+# ==========================================
+#
+# Record tokens look like "r1.<key fingerprint>.<base64url(nonce || ciphertext)>".
+# The fingerprint identifies the key by content, so records stay readable
+# however the key is named in ENCRYPTION_KEYS.
+
+RECORD_PREFIX = "r1"
+RECORD_NONCE_SIZE = 12
+
+
+def _fingerprint(key: bytes) -> str:
+    return hashlib.sha256(key).hexdigest()[:8]
+
+
+@lru_cache(maxsize=1)
+def _record_ciphers() -> tuple[str, dict[str, AESGCM]]:
+    """
+    Returns the primary key fingerprint and an AES-GCM cipher per configured
+    key, each derived from the Fernet key material with HKDF.
+    """
+    keyring = get_keyring()
+    ciphers: dict[str, AESGCM] = {}
+    for key in keyring.keys:
+        raw = base64.urlsafe_b64decode(key)
+        fingerprint = _fingerprint(raw)
+        if fingerprint not in ciphers:
+            derived = HKDF(
+                algorithm=hashes.SHA256(),
+                length=32,
+                salt=None,
+                info=b"omaha-pii-record",
+            ).derive(raw)
+            ciphers[fingerprint] = AESGCM(derived)
+    return _fingerprint(base64.urlsafe_b64decode(keyring.primary_key)), ciphers
+
+
+def seal_record(plaintext: bytes, associated_data: bytes) -> str:
+    """
+    Encrypts and authenticates a whole record under the primary key.
+    `associated_data` is authenticated but not stored; the same value
+    must be passed to open_record.
+    """
+    fingerprint, ciphers = _record_ciphers()
+    nonce = os.urandom(RECORD_NONCE_SIZE)
+    ciphertext = ciphers[fingerprint].encrypt(nonce, plaintext, associated_data)
+    body = base64.urlsafe_b64encode(nonce + ciphertext).decode()
+    return f"{RECORD_PREFIX}.{fingerprint}.{body}"
+
+
+def open_record(token: str, associated_data: bytes) -> bytes:
+    prefix, fingerprint, body = token.split(".", 2)
+    if prefix != RECORD_PREFIX:
+        raise ValueError(f"Unsupported record format: {prefix}")
+    cipher = _record_ciphers()[1].get(fingerprint)
+    if cipher is None:
+        raise ValueError(f"Unknown record key: {fingerprint}")
+    raw = base64.urlsafe_b64decode(body)
+    return cipher.decrypt(raw[:RECORD_NONCE_SIZE], raw[RECORD_NONCE_SIZE:], associated_data)
+
+
+def record_needs_rotation(token: str) -> bool:
+    return token.split(".", 2)[1] != _record_ciphers()[0]
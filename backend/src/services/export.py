@@ -1,11 +1,39 @@
+import json
 from datetime import datetime
-from typing import Any
+from itertools import chain
+from typing import Any, Iterable, Iterator, Literal, get_args
 from sqlmodel import Session, select
-import httpx
 
-from sqlalchemy import desc
-from .. import models, config
-from .encryption import decrypt_data
+import orjson
+from sqlalchemy import desc, func
+from .. import models
+from ..config import settings
+from ..database import engine
+from . import offload
+from .cache import InProcessCache
+from .changes import patient_version
+from .metrics import record_cache_lookup
+from .pdf import render_care_plan_pdf_bytes
+from .pii import PIIView
+
+# "html" is the text export formatted for Group Office notes
+ExportKind = Literal["txt", "json", "html"]
+
+# Rendered documents contain decrypted PII, so like the PII cache they stay
+# in this worker's memory whatever CACHE_BACKEND is
+EXPORT_CACHE = InProcessCache(settings.EXPORT_CACHE_SIZE, settings.EXPORT_CACHE_MAX_BYTES)
+
+# A cached document is kept as the patient fields of its header and its
+# body, and the header is rendered with the current time each time it is
+# served: (patient, body), where the body is the text after the header for
+# "txt" and "html", and the list of active problems for "json"
+ExportParts = tuple[dict[str, Any], Any]
+
+
+def _generation_time(kind: ExportKind) -> str:
+    if kind == "json":
+        return datetime.now().isoformat()
+    return datetime.now().strftime("%Y-%m-%d %H:%M")
 
 
 def generate_care_plan_summary_text(
@@ -15,38 +43,67 @@ def generate_care_plan_summary_text(
     Generates a plain text summary of a patient's care plan.
     Returns the summary text and the patient's full name.
     """
+    lines, patient_name = care_plan_summary_lines(patient_id, db)
+    return "\n".join(lines), patient_name
+
+
+def care_plan_summary_lines(
+    patient_id: int, db: Session
+) -> tuple[Iterator[str], str | None]:
+    """
+    Returns the lines of the plain text summary and the patient's full
+    name. The lines are rendered one problem at a time as they are
+    consumed, so `db` must stay open until then. If the patient or their
+    PII is missing, the name is None and the only line says so.
+    """
+    patient, missing = _summary_patient(patient_id, db)
+    if patient is None:
+        return iter([missing]), None
+    lines = chain(_summary_header(patient), _summary_lines(patient_id, db))
+    return lines, patient["name"]
+
+
+def _summary_patient(patient_id: int, db: Session) -> tuple[dict[str, Any] | None, str]:
+    """
+    Returns the patient fields of the summary header (the "patient" object
+    of the JSON summary), or None and the line saying what is missing.
+    """
     patient = db.get(models.Patient, patient_id)
     if not patient:
-        return "Patient not found.", None
+        return None, "Patient not found."
 
     pii = db.exec(
         select(models.PatientPII).where(models.PatientPII.patient_id == patient_id)
     ).first()
     if not pii:
-        return "Patient PII not found.", None
-
-    first_name = decrypt_data(pii.first_name)
-    last_name = decrypt_data(pii.last_name)
-    patient_name = f"{first_name} {last_name}"
-    dob = decrypt_data(pii.date_of_birth)
-    tin = decrypt_data(pii.tin)
-    address = decrypt_data(pii.address) if pii.address else None
-    phone_number = decrypt_data(pii.phone_number) if pii.phone_number else None
-    generation_date = datetime.now().strftime("%Y-%m-%d %H:%M")
-
-    lines = [
+        return None, "Patient PII not found."
+
+    values = PIIView(pii)
+    return {
+        "name": f"{values.first_name} {values.last_name}",
+        "dob": values.date_of_birth,
+        "tin": values.tin,
+        "phone": values.phone_number,
+        "address": values.address,
+    }, ""
+
+
+def _summary_header(patient: dict[str, Any]) -> list[str]:
+    return [
         "OMAHA SYSTEM CARE PLAN SUMMARY",
         "--------------------------------------------------",
-        f"Patient: {patient_name}",
-        f"DOB: {dob}",
-        f"TIN: {tin}",
-        f"Phone: {phone_number}",
-        f"Address: {address}",
-        f"Generated: {generation_date}",
+        f"Patient: {patient['name']}",
+        f"DOB: {patient['dob']}",
+        f"TIN: {patient['tin']}",
+        f"Phone: {patient['phone']}",
+        f"Address: {patient['address']}",
+        f"Generated: {_generation_time('txt')}",
         "--------------------------------------------------",
         "",
     ]
 
+
+def _summary_lines(patient_id: int, db: Session) -> Iterator[str]:
     active_problems = db.exec(
         select(models.PatientProblem)
         .where(models.PatientProblem.patient_id == patient_id)
@@ -61,7 +118,7 @@ def generate_care_plan_summary_text(
         if not problem_details or not modifier_type or not modifier_domain:
             continue
 
-        lines.append(
+        yield (
             f"PROBLEM {i}: {problem_details.problem_name} (Type: {modifier_type.modifier_type_name}, Domain: {modifier_domain.modifier_domain_name})"
         )
 
@@ -83,7 +140,7 @@ def generate_care_plan_summary_text(
                 if s.symptom_comment:
                     description += f" ({s.symptom_comment})"
                 symptom_names.append(description)
-        lines.append(f"  Symptoms: {', '.join(symptom_names)}")
+        yield f"  Symptoms: {', '.join(symptom_names)}"
 
         latest_score = db.exec(
             select(models.OutcomeScore)
@@ -102,21 +159,21 @@ def generate_care_plan_summary_text(
                 models.OutcomeRatingStatus, latest_score.rating_status_id
             )
 
-            lines.append("  Latest Outcome:")
+            yield "  Latest Outcome:"
             if knowledge_rating:
-                lines.append(
+                yield (
                     f"    - Knowledge: {knowledge_rating.rating_knowledge_label} (Rating: {knowledge_rating.rating_knowledge_id}/5)"
                 )
             if behavior_rating:
-                lines.append(
+                yield (
                     f"    - Behavior:  {behavior_rating.rating_behavior_label} (Rating: {behavior_rating.rating_behavior_id}/5)"
                 )
             if status_rating:
-                lines.append(
+                yield (
                     f"    - Status:    {status_rating.rating_status_label} (Rating: {status_rating.rating_status_id}/5)"
                 )
         else:
-            lines.append("  Latest Outcome: None recorded")
+            yield "  Latest Outcome: None recorded"
 
         all_interventions = db.exec(
             select(models.CareIntervention)
@@ -127,20 +184,18 @@ def generate_care_plan_summary_text(
             .limit(5)
         ).all()
         if all_interventions:
-            lines.append("  Interventions:")
+            yield "  Interventions:"
             for intervention in all_interventions:
                 category = db.get(models.InterventionCategory, intervention.category_id)
                 target = db.get(models.InterventionTarget, intervention.target_id)
                 if category and target:
-                    lines.append(
+                    yield (
                         f"    - {intervention.date_performed.strftime('%Y-%m-%d')}: {category.category_name} - {target.target_name} ({intervention.specific_details})"
                     )
         else:
-            lines.append("  Interventions: None recorded")
+            yield "  Interventions: None recorded"
 
-        lines.append("")
-
-    return "\n".join(lines), patient_name
+        yield ""
 
 
 def generate_care_plan_summary_json(
@@ -150,31 +205,19 @@ def generate_care_plan_summary_json(
     Generates a structured JSON summary of a patient's care plan.
     Resolves IDs to human-readable labels for better readability.
     """
-    patient = db.get(models.Patient, patient_id)
-    if not patient:
-        return None
-
-    pii = db.exec(
-        select(models.PatientPII).where(models.PatientPII.patient_id == patient_id)
-    ).first()
-    if not pii:
+    patient, _ = _summary_patient(patient_id, db)
+    if patient is None:
         return None
 
-    first_name = decrypt_data(pii.first_name)
-    last_name = decrypt_data(pii.last_name)
-
-    summary = {
-        "patient": {
-            "name": f"{first_name} {last_name}",
-            "dob": decrypt_data(pii.date_of_birth),
-            "tin": decrypt_data(pii.tin),
-            "phone": decrypt_data(pii.phone_number) if pii.phone_number else None,
-            "address": decrypt_data(pii.address) if pii.address else None,
-        },
-        "generated_at": datetime.now().isoformat(),
-        "active_problems": [],
+    return {
+        "patient": patient,
+        "generated_at": _generation_time("json"),
+        "active_problems": _summary_problems(patient_id, db),
     }
 
+
+def _summary_problems(patient_id: int, db: Session) -> list[dict[str, Any]]:
+    problems: list[dict[str, Any]] = []
     active_problems = db.exec(
         select(models.PatientProblem)
         .where(models.PatientProblem.patient_id == patient_id)
@@ -257,184 +300,223 @@ def generate_care_plan_summary_json(
                     }
                 )
 
-        summary["active_problems"].append(problem_entry)
+        problems.append(problem_entry)
 
-    return summary
+    return problems
 
 
-def get_auth_token() -> str:
-    if (
-        not config.settings.GO_URL
-        or not config.settings.GO_USERNAME
-        or not config.settings.GO_PASSWORD
-    ):
-        raise ValueError(
-            "Group Office configuration missing (URL, Username, or Password)"
-        )
-
-    url_auth = f"{config.settings.GO_URL}/api/auth.php"
-    try:
-        with httpx.Client(timeout=60.0) as client:
-            response = client.post(
-                url_auth,
-                json={
-                    "username": config.settings.GO_USERNAME,
-                    "password": config.settings.GO_PASSWORD,
-                },
-                headers={"Content-Type": "application/json"},
-            )
-            response.raise_for_status()
-            data = response.json()
-            token = data.get("accessToken")
-            if not token:
-                raise ValueError("Authentication response missing 'accessToken'")
-            return token
-    except httpx.RequestError as e:
-        raise ValueError(f"Failed to connect to Group Office auth: {e}")
-    except httpx.HTTPStatusError as e:
-        raise ValueError(
-            f"Group Office auth returned error status: {e.response.status_code}"
+def _cached_export(
+    db: Session, patient_id: int, kind: ExportKind
+) -> tuple[int, ExportParts | None]:
+    """
+    Returns the patient's version (the sequence number of their latest
+    change in the change log) and the cached parts of the document
+    rendered at that version, if any. Since any clinical or PII write
+    changes the version, a write by any worker makes the next export
+    render afresh.
+    """
+    version = patient_version(db, patient_id)
+    cached = EXPORT_CACHE.get(f"{patient_id}:{kind}")
+    entry = orjson.loads(cached) if cached is not None else None
+    hit = entry is not None and entry["version"] == version
+    record_cache_lookup("export", hit)
+    if not hit:
+        return version, None
+    return version, (entry["patient"], entry["body"])  # type: ignore
+
+
+def _store_export(
+    patient_id: int, kind: ExportKind, version: int, patient: dict[str, Any], body: Any
+) -> None:
+    EXPORT_CACHE.set(
+        f"{patient_id}:{kind}",
+        orjson.dumps({"version": version, "patient": patient, "body": body}),
+        settings.EXPORT_CACHE_TTL_SECONDS,
+    )
+
+
+def _document(kind: ExportKind, patient: dict[str, Any], body: Any) -> str:
+    # Renders the header, with the current time, before the body
+    if kind == "json":
+        return json.dumps(
+            {"patient": patient, "generated_at": _generation_time("json"), "active_problems": body}
         )
-    except Exception as e:
-        raise ValueError(f"Group Office authentication failed: {e}")
-
-
-def create_group_office_note(note_title: str, note_content: str) -> int:
-    token = get_auth_token()
-    url_base = f"{config.settings.GO_URL}/api/jmap.php"
-    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {token}"}
-
-    # JMAP Payload
-    payload = [
-        [
-            "Note/set",
-            {
-                "create": {
-                    "assessment": {
-                        "noteBookId": config.settings.GO_NOTEBOOK_ID,
-                        "name": note_title,
-                        "content": note_content,
-                    }
-                },
-            },
-            "call-1",
-        ]
-    ]
-
-    try:
-        with httpx.Client(timeout=30.0) as client:
-            response = client.post(url_base, json=payload, headers=headers)
-            response.raise_for_status()
-            response_data = response.json()
-
-            # Basic JMAP response validation
-            if not isinstance(response_data, list) or not response_data:
-                raise ValueError("Invalid JMAP response format")
-
-            # Check for JMAP method response
-            # Structure: [[method_name, {created: ..., notCreated: ...}, method_id]]
-            method_response = response_data[0]
-            if len(method_response) < 2:
-                raise ValueError("Invalid JMAP method response")
-
-            result = method_response[1]
-
-            # Check for failure ("notCreated")
-            if "notCreated" in result and result["notCreated"]:
-                raise ValueError(
-                    f"Group Office rejected creation: {result['notCreated']}"
-                )
+    header = _summary_header(patient)
+    if kind == "html":
+        return "".join(group_office_html(header)) + body
+    return "\n".join(header) + body
 
-            # Check for success ("created")
-            if "created" in result and result["created"]:
-                return int(result["created"]["assessment"]["id"])
 
-            raise ValueError(f"Group Office response unclear: {result}")
-
-    except httpx.RequestError as e:
-        raise ValueError(f"Failed to connect to Group Office JMAP: {e}")
-    except httpx.HTTPStatusError as e:
-        raise ValueError(
-            f"Group Office JMAP returned error status: {e.response.status_code}"
-        )
-    except Exception as e:
-        raise ValueError(f"Export to Group Office failed: {e}")
-
-
-def update_group_office_note(note_id: int, note_title: str, note_content: str) -> bool:
-    token = get_auth_token()
-    url_base = f"{config.settings.GO_URL}/api/jmap.php"
-    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {token}"}
-
-    # JMAP Payload
-    payload = [
-        [
-            "Note/set",
-            {
-                "update": {
-                    str(note_id): {
-                        "name": note_title,
-                        "content": note_content,
-                    }
-                }
-            },
-            "call-1",
-        ]
-    ]
+def _render(db: Session, patient_id: int, kind: ExportKind) -> tuple[dict[str, Any] | None, Any]:
+    """
+    Returns the parts of the document, or None and the line saying what
+    is missing if the patient or their PII is.
+    """
+    patient, missing = _summary_patient(patient_id, db)
+    if patient is None:
+        return None, missing
+    if kind == "json":
+        return patient, _summary_problems(patient_id, db)
+    lines = _summary_lines(patient_id, db)
+    if kind == "html":
+        return patient, "".join(group_office_html(lines))
+    return patient, "".join(f"\n{line}" for line in lines)
 
-    try:
-        with httpx.Client(timeout=30.0) as client:
-            response = client.post(url_base, json=payload, headers=headers)
-            response.raise_for_status()
-            response_data = response.json()
 
-            # Basic JMAP response validation
-            if not isinstance(response_data, list) or not response_data:
-                raise ValueError("Invalid JMAP response format")
+def _render_in_process(patient_id: int, kind: ExportKind) -> tuple[dict[str, Any] | None, Any]:
+    # Offload pool job: renders with the process's own connection
+    with Session(engine) as db:
+        return _render(db, patient_id, kind)
 
-            # Check for JMAP method response
-            # Structure: [[method_name, {updated: ..., notUpdated: ...}, method_id]]
-            method_response = response_data[0]
-            if len(method_response) < 2:
-                raise ValueError("Invalid JMAP method response")
 
-            result = method_response[1]
+def _export_size(db: Session, patient_id: int) -> int:
+    """
+    Number of symptom and intervention records in the patient's care plan,
+    which is what the cost of rendering it grows with.
+    """
+    total = 0
+    for model in (models.PatientProblemSymptom, models.CareIntervention):
+        total += db.exec(
+            select(func.count())
+            .select_from(model)
+            .join(models.PatientProblem)
+            .where(models.PatientProblem.patient_id == patient_id)
+            .where(models.PatientProblem.is_active == True)  # noqa: E712
+        ).one()
+    return total
+
+
+def _render_large(
+    db: Session, patient_id: int, kind: ExportKind
+) -> tuple[dict[str, Any] | None, Any] | None:
+    """
+    Renders the document in the offload pool if the care plan is large,
+    otherwise returns None.
+    """
+    if offload.process_count() == 0 or not offload.should_offload(_export_size(db, patient_id)):
+        return None
+    return offload.run(_render_in_process, patient_id, kind)
 
-            # Check for failure ("notUpdated")
-            if "notUpdated" in result and result["notUpdated"]:
-                raise ValueError(
-                    f"Group Office rejected update: {result['notUpdated']}"
-                )
 
-            # Check for success ("updated")
-            if "updated" in result and result["updated"]:
-                return True
+def render_export(
+    db: Session, patient_id: int, kind: ExportKind
+) -> tuple[str | None, str | None]:
+    """
+    Returns the rendered export document and the patient's full name,
+    from the cache if the care plan has not changed since. Large care
+    plans are rendered in the offload pool.
+    The document is None if the patient or their PII is missing (for
+    "json"), the name is None if the text summary could not be built.
+    """
+    version, cached = _cached_export(db, patient_id, kind)
+    if cached is None:
+        patient, body = _render_large(db, patient_id, kind) or _render(db, patient_id, kind)
+        if patient is None:
+            return (None if kind == "json" else body), None
+        _store_export(patient_id, kind, version, patient, body)
+        cached = patient, body
+    patient, body = cached
+    return _document(kind, patient, body), patient["name"]
+
+
+def stream_text_export(db: Session, patient_id: int) -> tuple[Iterator[str], str | None]:
+    """
+    Like render_export(db, patient_id, "txt"), but returns the document
+    as chunks (the header, then one per problem) that are rendered as
+    they are consumed, so `db` must stay open until then. A document
+    rendered this way is cached once complete, unless it is larger than
+    the whole cache.
+    """
+    version, cached = _cached_export(db, patient_id, "txt")
+    if cached is not None:
+        return iter([_document("txt", *cached)]), cached[0]["name"]
+
+    rendered = _render_large(db, patient_id, "txt")
+    if rendered is not None:
+        patient, body = rendered
+        if patient is None:
+            return iter([body]), None
+        _store_export(patient_id, "txt", version, patient, body)
+        return _sections(_document("txt", patient, body).split("\n")), patient["name"]
+
+    patient, missing = _summary_patient(patient_id, db)
+    if patient is None:
+        return iter([missing]), None
+    lines = _summary_lines(patient_id, db)
+    return _stream_and_store(patient, lines, patient_id, version), patient["name"]
+
+
+def render_pdf_export(db: Session, patient_id: int) -> tuple[bytes | None, str | None]:
+    """
+    Renders the care plan as a PDF from the same (cached) summary as the
+    "json" export, in the offload pool if it is large. Returns (None, None)
+    if the patient or their PII is missing.
+    """
+    content, patient_name = render_export(db, patient_id, "json")
+    if content is None:
+        return None, None
+    snapshot = orjson.loads(content)
+    size = sum(
+        len(problem["symptoms"]) + len(problem["all_interventions"])
+        for problem in snapshot["active_problems"]
+    )
+    if offload.should_offload(size):
+        document = offload.run(render_care_plan_pdf_bytes, snapshot, settings.PDF_PAGE_SIZE)
+    else:
+        document = render_care_plan_pdf_bytes(snapshot, settings.PDF_PAGE_SIZE)
+    return document, patient_name
+
+
+def _stream_and_store(
+    patient: dict[str, Any], lines: Iterator[str], patient_id: int, version: int
+) -> Iterator[str]:
+    yield "\n".join(_summary_header(patient))
+    rendered: list[str] | None = [] if settings.EXPORT_CACHE_SIZE > 0 else None
+    size = 0
+    for chunk in _sections(lines, separator="\n"):
+        if rendered is not None:
+            rendered.append(chunk)
+            size += len(chunk)
+            if size > settings.EXPORT_CACHE_MAX_BYTES:
+                rendered = None
+        yield chunk
+    if rendered is not None:
+        _store_export(patient_id, "txt", version, patient, "".join(rendered))
+
+
+def _sections(lines: Iterable[str], separator: str = "") -> Iterator[str]:
+    """
+    Joins lines with line breaks, in chunks that end at empty lines (the
+    end of the header and of each problem). `separator` goes before the
+    first chunk.
+    """
+    section: list[str] = []
+    for line in lines:
+        section.append(line)
+        if not line:
+            yield separator + "\n".join(section)
+            separator = "\n"
+            section = []
+    if section:
+        yield separator + "\n".join(section)
 
-            raise ValueError(f"Group Office response unclear: {result}")
 
-    except httpx.RequestError as e:
-        raise ValueError(f"Failed to connect to Group Office JMAP: {e}")
-    except httpx.HTTPStatusError as e:
-        raise ValueError(
-            f"Group Office JMAP returned error status: {e.response.status_code}"
-        )
-    except Exception as e:
-        raise ValueError(f"Update to Group Office failed: {e}")
+def invalidate_export(patient_id: int) -> None:
+    for kind in get_args(ExportKind):
+        EXPORT_CACHE.delete(f"{patient_id}:{kind}")
 
 
-def format_for_group_office(content: str) -> str:
+def group_office_html(lines: Iterable[str]) -> Iterator[str]:
     """
-    Formats plain text for Group Office notes by wrapping lines in <div> tags.
-    Empty lines are converted to <div><br></div>.
+    Formats plain text lines for Group Office notes by wrapping them in
+    <div> tags. Empty lines are converted to <div><br></div>.
     """
-    lines = content.split("\n")
-    formatted = []
     for line in lines:
-        if not line:
-            formatted.append("<div><br></div>")
-        else:
-            formatted.append(f"<div>{line}</div>")
-    return "".join(formatted)
+        yield f"<div>{line}</div>" if line else "<div><br></div>"
+
+
+def format_for_group_office(content: str) -> str:
+    return "".join(group_office_html(content.split("\n")))
 
 
 def get_group_office_payload_mock(
@@ -0,0 +1,165 @@
+import hashlib
+import time
+from datetime import datetime, timedelta, timezone
+
+from cryptography.exceptions import InvalidTag
+from sqlalchemy import delete, func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, col
+
+from .. import models
+from ..config import settings
+from ..database import engine
+from .encryption import RECORD_PREFIX, open_record, seal_record
+
+MAX_KEY_LENGTH = 255
+# Expired keys are deleted at most this often (seconds), per process
+CLEANUP_INTERVAL = 300
+
+_next_cleanup = 0.0
+
+
+class IdempotencyError(ValueError):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def fingerprint(
+    method: str, path: str, query_string: bytes, body: bytes, wire_format: str = "json"
+) -> str:
+    # The stored response is in the negotiated format, so a request asking
+    # for another format is a different request
+    digest = hashlib.sha256(f"{method} {path} {wire_format}?".encode())
+    digest.update(query_string)
+    digest.update(b"\n")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def _expired(record: models.IdempotencyRecord, now: datetime) -> bool:
+    expires_at = record.expires_at
+    if expires_at.tzinfo is None:
+        # SQLite returns naive datetimes
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return expires_at <= now
+
+
+def _cleanup_if_due(session: Session, now: datetime) -> None:
+    global _next_cleanup
+    if time.monotonic() < _next_cleanup:
+        return
+    _next_cleanup = time.monotonic() + CLEANUP_INTERVAL
+    session.exec(  # type: ignore
+        delete(models.IdempotencyRecord).where(
+            or_(
+                col(models.IdempotencyRecord.expires_at) < now,
+                # Responses stored in plaintext before bodies were sealed
+                func.substr(col(models.IdempotencyRecord.response_body), 1, 3)
+                != f"{RECORD_PREFIX}.".encode(),
+            )
+        )
+    )
+    session.commit()
+
+
+def _associated_data(key: str) -> bytes:
+    # Binds a sealed response to its key, so it cannot be replayed for another
+    return f"idempotency:{key}".encode()
+
+
+def begin(
+    key: str, method: str, path: str, request_hash: str
+) -> models.IdempotencyRecord | None:
+    """
+    Claims `key` for a request. Returns None if the request should be
+    executed, or the completed record whose response should be replayed.
+    Raises IdempotencyError if the key belongs to a different request or
+    to one that is still being processed. The record's response_body is
+    returned decrypted.
+    """
+    if len(key) > MAX_KEY_LENGTH:
+        raise IdempotencyError(400, f"Idempotency-Key is longer than {MAX_KEY_LENGTH} characters")
+
+    now = datetime.now(timezone.utc)
+    with Session(engine) as session:
+        _cleanup_if_due(session, now)
+
+        record = session.get(models.IdempotencyRecord, key)
+        if record is not None and _expired(record, now):
+            session.delete(record)
+            session.commit()
+            record = None
+
+        if record is None:
+            session.add(
+                models.IdempotencyRecord(
+                    idempotency_key=key,
+                    method=method,
+                    path=path,
+                    request_hash=request_hash,
+                    created_at=now,
+                    expires_at=now + timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS),
+                )
+            )
+            try:
+                session.commit()
+                return None
+            except IntegrityError:
+                # Claimed by a concurrent request in the meantime
+                session.rollback()
+                record = session.get(models.IdempotencyRecord, key)
+                if record is None:
+                    raise IdempotencyError(409, "Idempotency-Key is being processed")
+
+        if record.request_hash != request_hash:
+            raise IdempotencyError(
+                422, "Idempotency-Key was already used for a different request"
+            )
+        if record.status_code is None:
+            raise IdempotencyError(
+                409, "A request with this Idempotency-Key is still being processed"
+            )
+        # Decrypted on a detached copy, so it is never written back
+        session.expunge(record)
+        if record.response_body is not None:
+            try:
+                record.response_body = open_record(
+                    record.response_body.decode(), _associated_data(key)
+                )
+            except (ValueError, InvalidTag):
+                # Sealed with a key that has left ENCRYPTION_KEYS
+                raise IdempotencyError(
+                    410, "The stored response of this Idempotency-Key can no longer be read"
+                )
+        return record
+
+
+def complete(key: str, status_code: int, content_type: str | None, body: bytes) -> None:
+    """
+    Stores the response of a request. Responses may contain PII, so the
+    body is sealed with the key ring like the PII records.
+    """
+    with Session(engine) as session:
+        record = session.get(models.IdempotencyRecord, key)
+        if record is None:
+            return
+        record.status_code = status_code
+        record.content_type = content_type
+        record.response_body = seal_record(body, _associated_data(key)).encode()
+        session.add(record)
+        session.commit()
+
+
+def release(key: str) -> None:
+    """
+    Forgets a claimed key whose request failed, so it can be retried.
+    """
+    with Session(engine) as session:
+        session.exec(  # type: ignore
+            delete(models.IdempotencyRecord).where(
+                models.IdempotencyRecord.idempotency_key == key  # type: ignore
+            )
+        )
+        session.commit()
@@ -0,0 +1,195 @@
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable
+
+from cryptography.fernet import InvalidToken
+from sqlalchemy import func
+from sqlmodel import Session, col, select
+
+from .. import models
+from ..database import begin_immediate, engine
+from .encryption import get_keyring, needs_rotation, record_needs_rotation, rotate_token
+from .pii import PII_FIELDS, read_pii, write_pii
+
+UNFINISHED_STATUSES = ("pending", "running", "paused")
+
+_running: dict[int, threading.Thread] = {}
+_running_lock = threading.Lock()
+
+
+def start_rotation(
+    session: Session, batch_size: int = 500, pause_ms: int = 50
+) -> models.KeyRotationJob:
+    """
+    Creates a re-encryption job towards the current primary key, or resumes
+    the unfinished job for that key. Does not start processing.
+    """
+    target_key_id = get_keyring().primary_key_id
+    if target_key_id is None:
+        raise ValueError("Key rotation requires ENCRYPTION_KEYS to be configured")
+
+    job = session.exec(
+        select(models.KeyRotationJob)
+        .where(models.KeyRotationJob.target_key_id == target_key_id)
+        .where(col(models.KeyRotationJob.status).in_(UNFINISHED_STATUSES))
+        .order_by(col(models.KeyRotationJob.job_id).desc())
+    ).first()
+    if job is None:
+        job = models.KeyRotationJob(
+            target_key_id=target_key_id,
+            rows_total=session.exec(select(func.count(col(models.PatientPII.patient_pii_id)))).one(),
+        )
+    job.batch_size = batch_size
+    job.pause_ms = pause_ms
+    if job.status == "paused":
+        job.status = "pending"
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return job
+
+
+def _rotate_row(pii: models.PatientPII) -> bool:
+    if pii.pii_record:
+        if not record_needs_rotation(pii.pii_record):
+            return False
+        write_pii(pii, read_pii(pii), mode="record")
+        return True
+
+    rotated = False
+    for field in PII_FIELDS:
+        value = getattr(pii, field)
+        if not value or not needs_rotation(value):
+            continue
+        try:
+            setattr(pii, field, rotate_token(value))
+        except InvalidToken:
+            # Not a ciphertext, e.g. the placeholders of deleted patients
+            continue
+        rotated = True
+    return rotated
+
+
+def run_rotation(
+    job_id: int,
+    progress: Callable[[models.KeyRotationJob], None] | None = None,
+) -> models.KeyRotationJob:
+    """
+    Processes a job in keyset-paginated batches, committing after each batch
+    so no transaction holds the database for longer than one batch. Stops
+    when every row is processed or the job is paused; a stopped or crashed
+    job resumes from its last committed batch.
+    """
+    with Session(engine) as session:
+        job = session.get(models.KeyRotationJob, job_id)
+        if job is None:
+            raise ValueError(f"Key rotation job {job_id} not found")
+        if job.target_key_id != get_keyring().primary_key_id:
+            raise ValueError(
+                f"Job {job_id} targets key '{job.target_key_id}', which is not the primary key"
+            )
+        job.status = "running"
+        job.error = None
+        session.add(job)
+        session.commit()
+
+    try:
+        while True:
+            # Re-encryption doesn't change any values, so it isn't audited
+            with Session(engine, info={"audit": False}) as session:
+                # The batch is read under the write lock: a PII update committed
+                # between reading and writing it back would be reverted
+                begin_immediate(session)
+                job = session.get(models.KeyRotationJob, job_id)
+                assert job is not None
+                if job.status != "running":
+                    return job
+
+                rows = session.exec(
+                    select(models.PatientPII)
+                    .where(col(models.PatientPII.patient_pii_id) > job.last_patient_pii_id)
+                    .order_by(col(models.PatientPII.patient_pii_id))
+                    .limit(job.batch_size)
+                ).all()
+
+                now = datetime.now(timezone.utc)
+                if not rows:
+                    job.status = "completed"
+                    job.updated_at = now
+                    job.finished_at = now
+                    session.add(job)
+                    session.commit()
+                    session.refresh(job)
+                    if progress:
+                        progress(job)
+                    return job
+
+                for pii in rows:
+                    if _rotate_row(pii):
+                        job.rows_rotated += 1
+                        session.add(pii)
+                job.last_patient_pii_id = rows[-1].patient_pii_id  # type: ignore
+                job.rows_scanned += len(rows)
+                job.updated_at = now
+                session.add(job)
+                session.commit()
+                session.refresh(job)
+                if progress:
+                    progress(job)
+                pause_ms = job.pause_ms
+
+            # Throttle so interactive requests get the database between batches
+            time.sleep(pause_ms / 1000)
+    except Exception as e:
+        with Session(engine) as session:
+            job = session.get(models.KeyRotationJob, job_id)
+            if job is not None:
+                job.status = "failed"
+                job.error = str(e)
+                job.updated_at = datetime.now(timezone.utc)
+                session.add(job)
+                session.commit()
+        raise
+
+
+def run_rotation_in_background(job_id: int) -> bool:
+    """
+    Runs a job on a daemon thread. Returns False if this process is
+    already running it.
+    """
+
+    def target():
+        try:
+            run_rotation(job_id)
+        except Exception as e:
+            print(f"Key rotation job {job_id} failed: {e}")
+        finally:
+            with _running_lock:
+                _running.pop(job_id, None)
+
+    with _running_lock:
+        if job_id in _running:
+            return False
+        thread = threading.Thread(
+            target=target, name=f"key-rotation-{job_id}", daemon=True
+        )
+        _running[job_id] = thread
+    thread.start()
+    return True
+
+
+def pause_rotation(session: Session, job_id: int) -> models.KeyRotationJob | None:
+    """
+    Asks a running job to stop after its current batch.
+    """
+    job = session.get(models.KeyRotationJob, job_id)
+    if job is None:
+        return None
+    if job.status in ("pending", "running"):
+        job.status = "paused"
+        job.updated_at = datetime.now(timezone.utc)
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+    return job
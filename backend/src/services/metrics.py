@@ -0,0 +1,342 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+# Latency buckets (seconds) tuned for an API whose hot paths are
+# sub-10ms reads and whose slowest paths are exports and Group Office calls.
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: tuple[str, ...], labelvalues: tuple[str, ...]) -> str:
+    if not labelnames:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)
+    )
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[tuple[str, tuple[str, ...], tuple[str, ...], float]]:
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for suffix, labelnames, labelvalues, value in self.samples():
+            lines.append(
+                f"{self.name}{suffix}{_format_labels(labelnames, labelvalues)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only be incremented")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labelvalues, value in items:
+            yield "", self.labelnames, labelvalues, value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labelvalues, value in items:
+            yield "", self.labelnames, labelvalues, value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._counts: dict[tuple[str, ...], list[int]] = {}
+        self._sums: dict[tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+                self._counts[key] = counts
+                self._sums[key] = 0.0
+            counts[index] += 1
+            self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(k, list(v), self._sums[k]) for k, v in self._counts.items()]
+        bucket_labelnames = self.labelnames + ("le",)
+        for labelvalues, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield (
+                    "_bucket",
+                    bucket_labelnames,
+                    labelvalues + (_format_value(bound),),
+                    cumulative,
+                )
+            yield "_sum", self.labelnames, labelvalues, total
+            yield "_count", self.labelnames, labelvalues, cumulative
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: list[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """
+        Registers a callback run before every scrape, used to refresh gauges
+        whose value is only known by polling (e.g. connection pool state).
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            collectors = list(self._collectors)
+            metrics = list(self._metrics.values())
+        for collector in collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"Warning: metrics collector failed: {e}")
+        lines: list[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ==========================================
+# Metric definitions
+# ==========================================
+
+HTTP_REQUESTS = REGISTRY.register(
+    Counter(
+        "http_requests_total",
+        "Total HTTP requests by route template and status code.",
+        ("method", "route", "status"),
+    )
+)
+HTTP_REQUEST_DURATION = REGISTRY.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency by route template.",
+        ("method", "route"),
+    )
+)
+HTTP_REQUESTS_IN_PROGRESS = REGISTRY.register(
+    Gauge(
+        "http_requests_in_progress",
+        "HTTP requests currently being served, by route template.",
+        ("method", "route"),
+    )
+)
+DB_POOL_CONNECTIONS = REGISTRY.register(
+    Gauge(
+        "db_pool_connections",
+        "Database connection pool state (size, checked_out, idle, overflow).",
+        ("state",),
+    )
+)
+CACHE_REQUESTS = REGISTRY.register(
+    Counter(
+        "cache_requests_total",
+        "Cache lookups by cache name and result (hit or miss).",
+        ("cache", "result"),
+    )
+)
+JOB_QUEUE_DEPTH = REGISTRY.register(
+    Gauge(
+        "job_queue_depth",
+        "Number of jobs waiting in an in-process queue.",
+        ("queue",),
+    )
+)
+AUDIT_WRITE_FAILURES = REGISTRY.register(
+    Counter(
+        "audit_write_failures_total",
+        "Failed attempts to write a batch of audit events (retried).",
+    )
+)
+AUDIT_DEAD_LETTERS = REGISTRY.register(
+    Counter(
+        "audit_events_dead_lettered_total",
+        "Audit events written to the dead-letter file because the database refused them.",
+    )
+)
+EXTERNAL_CALL_DURATION = REGISTRY.register(
+    Histogram(
+        "external_call_duration_seconds",
+        "Latency of calls to external services.",
+        ("service", "operation"),
+    )
+)
+EXTERNAL_CALL_ERRORS = REGISTRY.register(
+    Counter(
+        "external_call_errors_total",
+        "Failed calls to external services by error type.",
+        ("service", "operation", "reason"),
+    )
+)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+@contextmanager
+def track_external_call(service: str, operation: str):
+    """
+    Times a call to an external service and counts it as an error if the
+    block raises. The exception is re-raised unchanged.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        EXTERNAL_CALL_ERRORS.inc(
+            service=service, operation=operation, reason=type(e).__name__
+        )
+        raise
+    finally:
+        EXTERNAL_CALL_DURATION.observe(
+            time.perf_counter() - started, service=service, operation=operation
+        )
+
+
+def register_pool_collector(engine) -> None:
+    """
+    Exposes the SQLAlchemy connection pool utilization of `engine` on scrape.
+    """
+
+    def collect():
+        pool = engine.pool
+        for state, getter in (
+            ("size", "size"),
+            ("checked_out", "checkedout"),
+            ("idle", "checkedin"),
+            ("overflow", "overflow"),
+        ):
+            if hasattr(pool, getter):
+                DB_POOL_CONNECTIONS.set(getattr(pool, getter)(), state=state)
+
+    REGISTRY.add_collector(collect)
@@ -0,0 +1,163 @@
+"""
+A process pool for CPU-bound work (PII decryption in bulk, large export
+rendering, PDF layout) that would otherwise hold the GIL and stall the
+other requests of the worker. Functions run in it must be importable
+module-level functions, and their arguments and results picklable.
+
+The pool is started (by default, the available CPUs shared out between the
+web workers) with the encryption
+keys and export templates already loaded. Small jobs are cheaper to run
+inline than to send to another process: callers check should_offload().
+At most OFFLOAD_MAX_PENDING jobs are in flight per worker; further jobs
+wait for a slot and fail with OffloadBusy after OFFLOAD_WAIT_SECONDS.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Sequence, TypeVar
+
+from ..config import settings
+from .metrics import JOB_QUEUE_DEPTH
+
+T = TypeVar("T")
+
+_lock = threading.Lock()
+_executor: ProcessPoolExecutor | None = None
+_slots: threading.BoundedSemaphore | None = None
+_pending = 0
+# Process that created the pool; a forked worker starts its own
+_owner_pid: int | None = None
+
+
+class OffloadBusy(RuntimeError):
+    """
+    No pool slot became free within OFFLOAD_WAIT_SECONDS. Answered with
+    503 and Retry-After.
+    """
+
+
+def available_cpus() -> int:
+    # Honours container CPU sets, unlike os.cpu_count()
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def process_count() -> int:
+    if settings.OFFLOAD_PROCESSES is None:
+        # Each web worker has its own pool (gunicorn.conf.py sets
+        # WEB_CONCURRENCY), so together they use about one process per CPU
+        workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+        return max(available_cpus() // max(workers, 1), 1)
+    return max(settings.OFFLOAD_PROCESSES, 0)
+
+
+def should_offload(size: int) -> bool:
+    """
+    True if a job of `size` rows is large enough to be worth sending to
+    the pool (and the pool is enabled).
+    """
+    return process_count() > 0 and size >= settings.OFFLOAD_MIN_ROWS
+
+
+def _initialize() -> None:
+    # Runs once in each pool process: loads the modules jobs come from, the
+    # encryption keys and the PDF page template
+    from . import encryption, export, pdf  # noqa: F401
+
+    encryption.get_keyring()
+    encryption._record_ciphers()
+    pdf.page_template(settings.PDF_PAGE_SIZE)
+
+
+def _ready() -> None:
+    pass
+
+
+def _get_executor() -> tuple[ProcessPoolExecutor, threading.BoundedSemaphore]:
+    global _executor, _slots, _pending, _owner_pid
+    with _lock:
+        if _executor is None or _owner_pid != os.getpid():
+            # "spawn": the pool's processes do not inherit the worker's open
+            # database connections or threads
+            _executor = ProcessPoolExecutor(
+                max_workers=process_count(),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_initialize,
+            )
+            _slots = threading.BoundedSemaphore(settings.OFFLOAD_MAX_PENDING)
+            _pending = 0
+            _owner_pid = os.getpid()
+        return _executor, _slots  # type: ignore
+
+
+def start() -> None:
+    """
+    Starts the pool's processes in the background, so the first large job
+    does not wait for them.
+    """
+    if process_count() == 0:
+        return
+    executor, _ = _get_executor()
+    for _ in range(process_count()):
+        executor.submit(_ready)
+
+
+def _count_pending(change: int) -> None:
+    global _pending
+    with _lock:
+        _pending += change
+        JOB_QUEUE_DEPTH.set(_pending, queue="offload")
+
+
+def _submit(fn: Callable[..., T], *args: Any) -> "Future[T]":
+    executor, slots = _get_executor()
+    if not slots.acquire(timeout=settings.OFFLOAD_WAIT_SECONDS):
+        raise OffloadBusy("Too many jobs waiting for the offload pool")
+    _count_pending(1)
+
+    def done(_: Future) -> None:
+        _count_pending(-1)
+        slots.release()
+
+    try:
+        future = executor.submit(fn, *args)
+    except BaseException:
+        done(None)  # type: ignore
+        raise
+    future.add_done_callback(done)
+    return future
+
+
+def run(fn: Callable[..., T], *args: Any) -> T:
+    """
+    Runs fn(*args) in the pool and waits for its result, or runs it in
+    this thread if OFFLOAD_PROCESSES is 0.
+    """
+    if process_count() == 0:
+        return fn(*args)
+    return _submit(fn, *args).result()
+
+
+def map_batches(fn: Callable[[list[Any]], list[T]], items: Sequence[Any]) -> list[T]:
+    """
+    Splits `items` into one batch per pool process, runs fn(batch) on each
+    in parallel and concatenates the results in order. `fn` returns one
+    result per item.
+    """
+    if process_count() == 0:
+        return fn(list(items))
+    size = -(-len(items) // process_count())
+    futures = [_submit(fn, list(items[i : i + size])) for i in range(0, len(items), size)]
+    return [result for future in futures for result in future.result()]
+
+
+def shutdown() -> None:
+    global _executor
+    with _lock:
+        if _executor is not None and _owner_pid == os.getpid():
+            _executor.shutdown(cancel_futures=True)
+        _executor = None
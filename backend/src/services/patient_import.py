@@ -0,0 +1,261 @@
+"""
+Bulk import of patients (agency onboarding) from CSV or NDJSON. The input
+is read IMPORT_BATCH_SIZE rows at a time. Each batch is validated with the
+PatientCreate rules, has its TINs checked against the search index in one
+query, its PII encrypted in the offload pool, and is inserted with one
+flush per table and a commit. Invalid rows are reported by line number and
+skipped; the other rows of their batch are imported.
+"""
+
+import csv
+from functools import partial
+from itertools import islice
+from typing import IO, Any, Callable, Iterator
+
+import orjson
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlmodel import Session, col, select
+
+from .. import models
+from ..config import settings
+from ..schemas import PatientCreate, PatientImportError, PatientImportRead
+from . import offload, search_index
+from .pii import PIIValues, encrypt_rows
+
+IMPORT_FORMATS = ("csv", "ndjson")
+# CSV columns besides the consents, which are one column per consent_code
+# with yes/no values (empty: not given)
+CSV_FIELDS = ("first_name", "last_name", "date_of_birth", "tin", "phone_number", "address")
+CSV_REQUIRED_FIELDS = ("first_name", "last_name", "date_of_birth", "tin")
+_YES = {"1", "true", "yes", "y"}
+_NO = {"0", "false", "no", "n"}
+
+# A parsed input row: its line number and PatientCreate fields, or the
+# reason it could not be read
+Row = tuple[int, dict[str, Any] | str]
+
+
+class ImportFormatError(ValueError):
+    """
+    The input cannot be read at all (unknown format, missing or unknown
+    CSV columns). Answered with 400.
+    """
+
+    def __init__(self, detail: str):
+        super().__init__(detail)
+        self.status_code = 400
+        self.detail = detail
+
+
+def _csv_rows(stream: IO[str], definitions: list[models.ConsentDefinition]) -> Iterator[Row]:
+    reader = csv.DictReader(stream)
+    columns = [name.strip() for name in reader.fieldnames or []]
+    reader.fieldnames = columns
+    missing = [name for name in CSV_REQUIRED_FIELDS if name not in columns]
+    if missing:
+        raise ImportFormatError(f"Missing CSV columns: {', '.join(missing)}")
+    codes = {d.consent_code: d.consent_definition_id for d in definitions}
+    unknown = set(columns) - set(CSV_FIELDS) - set(codes)
+    if unknown:
+        raise ImportFormatError(f"Unknown CSV columns: {', '.join(sorted(unknown))}")
+
+    for row in reader:
+        if None in row:
+            yield reader.line_num, "More values than columns"
+            continue
+        data: dict[str, Any] = {
+            name: (row.get(name) or "").strip() or None for name in CSV_FIELDS
+        }
+        consents = []
+        for code, definition_id in codes.items():
+            answer = (row.get(code) or "").strip().lower()
+            if not answer:
+                continue
+            if answer not in _YES | _NO:
+                yield reader.line_num, f"{code}: expected yes or no"
+                break
+            consents.append(
+                {"consent_definition_id": definition_id, "has_consented": answer in _YES}
+            )
+        else:
+            data["consents"] = consents
+            yield reader.line_num, data
+
+
+def _ndjson_rows(stream: IO[str]) -> Iterator[Row]:
+    for line, text in enumerate(stream, 1):
+        if not text.strip():
+            continue
+        try:
+            data = orjson.loads(text)
+        except orjson.JSONDecodeError:
+            yield line, "Invalid JSON"
+            continue
+        if not isinstance(data, dict):
+            yield line, "Expected a JSON object"
+            continue
+        yield line, data
+
+
+def _validation_detail(error: ValidationError) -> str:
+    # Only field names and messages: the rejected input may be PII
+    return "; ".join(
+        f"{'.'.join(map(str, e['loc'])) or 'row'}: {e['msg']}" for e in error.errors()
+    )
+
+
+def _consent_error(
+    patient: PatientCreate, valid_ids: set[int], mandatory_ids: set[int]
+) -> str | None:
+    provided = {c.consent_definition_id: c.has_consented for c in patient.consents}
+    for cid in provided:
+        if cid not in valid_ids:
+            return f"Invalid consent definition ID: {cid}"
+    for mid in sorted(mandatory_ids):
+        if provided.get(mid) is not True:
+            return f"Mandatory consent {mid} missing or denied."
+    return None
+
+
+def _insert_batch(session: Session, batch: list[tuple[int, PatientCreate]]) -> list[int]:
+    """
+    Inserts the patients of a valid batch with their PII, consents and
+    search tokens, and commits. Returns the new patient ids.
+    """
+    patients = [models.Patient() for _ in batch]
+    session.add_all(patients)
+    # One multi-row INSERT ... RETURNING for the whole batch
+    session.flush()
+    patient_ids: list[int] = [p.patient_id for p in patients]  # type: ignore
+
+    values = [
+        PIIValues(
+            first_name=data.first_name,
+            last_name=data.last_name,
+            date_of_birth=str(data.date_of_birth),
+            tin=data.tin,
+            phone_number=data.phone_number,
+            address=data.address,
+        )
+        for _, data in batch
+    ]
+    rows = list(zip(patient_ids, values))
+    encrypt = partial(encrypt_rows, mode=settings.PII_STORAGE_MODE)
+    if offload.should_offload(len(rows)):
+        columns = offload.map_batches(encrypt, rows)
+    else:
+        columns = encrypt(rows)
+
+    session.add_all(
+        models.PatientPII(patient_id=patient_id, **encrypted)
+        for patient_id, encrypted in zip(patient_ids, columns)
+    )
+    session.add_all(
+        models.PatientConsent(
+            patient_id=patient_id,
+            consent_definition_id=c.consent_definition_id,
+            has_consented=c.has_consented,
+        )
+        for patient_id, (_, data) in zip(patient_ids, batch)
+        for c in data.consents
+    )
+    session.execute(
+        insert(models.PatientSearchToken),
+        [
+            {"patient_id": patient_id, "token": token}
+            for patient_id, v in rows
+            for token in search_index.index_tokens(
+                v.first_name, v.last_name, v.date_of_birth, v.tin
+            )
+        ],
+    )
+    session.commit()
+    return patient_ids
+
+
+def import_patients(
+    session: Session,
+    stream: IO[str],
+    file_format: str,
+    batch_size: int | None = None,
+    progress: Callable[[PatientImportRead], None] | None = None,
+) -> PatientImportRead:
+    """
+    Imports the patients of a CSV or NDJSON text stream, committing batch
+    by batch. NDJSON lines are PatientCreate objects; CSV rows have the
+    CSV_FIELDS columns plus a yes/no column per consent_code. A TIN that
+    is already registered, or appears earlier in the input, fails its row.
+    `progress` is called with the running result after each batch.
+    """
+    if file_format not in IMPORT_FORMATS:
+        raise ImportFormatError(f"Unknown import format: {file_format}")
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+
+    # Loaded once for the whole import
+    definitions = list(session.exec(select(models.ConsentDefinition)).all())
+    valid_ids = {d.consent_definition_id for d in definitions}
+    mandatory_ids = {d.consent_definition_id for d in definitions if d.is_mandatory}
+    rows = _csv_rows(stream, definitions) if file_format == "csv" else _ndjson_rows(stream)
+
+    result = PatientImportRead()
+    # TIN token -> line of the input that claimed it
+    imported_tins: dict[str, int] = {}
+
+    def fail(line: int, detail: str) -> None:
+        result.failed += 1
+        result.errors.append(PatientImportError(line=line, detail=detail))
+
+    while chunk := list(islice(rows, batch_size)):
+        valid: list[tuple[int, PatientCreate, str]] = []
+        for line, data in chunk:
+            if isinstance(data, str):
+                fail(line, data)
+                continue
+            try:
+                patient = PatientCreate.model_validate(data)
+            except ValidationError as e:
+                fail(line, _validation_detail(e))
+                continue
+            error = _consent_error(patient, valid_ids, mandatory_ids)  # type: ignore
+            if error:
+                fail(line, error)
+                continue
+            valid.append((line, patient, search_index.tin_token(patient.tin)))
+
+        # TIN uniqueness of the whole batch in one query on the blinded index
+        registered = set(
+            session.exec(
+                select(models.PatientSearchToken.token).where(
+                    col(models.PatientSearchToken.token).in_([t for _, _, t in valid])
+                )
+            ).all()
+        )
+        batch: list[tuple[int, PatientCreate]] = []
+        for line, patient, token in valid:
+            if token in registered:
+                fail(line, "Patient with this TIN already exists")
+            elif token in imported_tins:
+                fail(line, f"Duplicate TIN (line {imported_tins[token]})")
+            else:
+                imported_tins[token] = line
+                batch.append((line, patient))
+
+        if batch:
+            try:
+                patient_ids = _insert_batch(session, batch)
+            except Exception as e:
+                # The database error may quote PII, so only its type is reported
+                session.rollback()
+                for line, patient in batch:
+                    del imported_tins[search_index.tin_token(patient.tin)]
+                    fail(line, f"Batch could not be saved ({type(e).__name__})")
+            else:
+                result.imported += len(patient_ids)
+                result.patient_ids.extend(patient_ids)
+
+        if progress:
+            progress(result)
+
+    result.errors.sort(key=lambda e: e.line)
+    return result
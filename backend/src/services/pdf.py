@@ -0,0 +1,280 @@
+"""
+Pure-Python PDF rendering of printed care plans: Helvetica text with line
+wrapping, page breaks and page numbers. It only uses the standard library
+and imports nothing from the application, so it is cheap to load in the
+offload worker processes.
+"""
+
+import zlib
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Iterator
+
+PAGE_SIZES = {"A4": (595.28, 841.89), "letter": (612.0, 792.0)}
+
+# Advance widths (1/1000 em) of Helvetica for the characters 32-126; the
+# bold face is slightly wider, so wrapping leaves BOLD_WIDTH_FACTOR slack
+_HELVETICA_WIDTHS = (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+)  # fmt: skip
+_DEFAULT_WIDTH = 556
+BOLD_WIDTH_FACTOR = 1.08
+
+# Line style -> (font resource, size, leading), sizes in points
+STYLES = {
+    "title": ("F2", 16, 24),
+    "heading": ("F2", 12, 20),
+    "text": ("F1", 10, 14),
+}
+# Indentation levels in points
+INDENT = 14
+
+# Objects of every document: catalog, page tree, fonts, document info;
+# pages and their content streams follow
+_CATALOG, _PAGES, _FONT, _BOLD_FONT, _INFO = 1, 2, 3, 4, 5
+_FIRST_PAGE = 6
+
+Line = tuple[str, str, int]
+# A wrapped line placed on a page: style, text, x, y
+Placed = tuple[str, str, float, float]
+
+
+@dataclass(frozen=True)
+class PageTemplate:
+    """
+    A page layout with the PDF fragments shared by all of its pages,
+    built once per page size and worker process.
+    """
+
+    width: float
+    height: float
+    margin: float
+    # Lowest baseline of body text; the footer goes below it
+    bottom: float
+    # "<< /Type /Page ... /Contents " without the content object number
+    page_prefix: bytes
+    fonts: tuple[bytes, bytes]
+
+    def text_width(self, text: str, style: str) -> float:
+        font, size, _ = STYLES[style]
+        units = sum(
+            _HELVETICA_WIDTHS[code - 32] if 32 <= code <= 126 else _DEFAULT_WIDTH
+            for code in map(ord, text)
+        )
+        factor = BOLD_WIDTH_FACTOR if font == "F2" else 1.0
+        return units * size * factor / 1000
+
+
+@lru_cache(maxsize=None)
+def page_template(page_size: str) -> PageTemplate:
+    width, height = PAGE_SIZES[page_size]
+    margin = 56.0
+    page_prefix = (
+        f"<< /Type /Page /Parent {_PAGES} 0 R /MediaBox [0 0 {width:.2f} {height:.2f}] "
+        f"/Resources << /Font << /F1 {_FONT} 0 R /F2 {_BOLD_FONT} 0 R >> >> /Contents "
+    ).encode()
+    fonts = tuple(
+        f"<< /Type /Font /Subtype /Type1 /BaseFont /{name} "
+        f"/Encoding /WinAnsiEncoding >>".encode()
+        for name in ("Helvetica", "Helvetica-Bold")
+    )
+    return PageTemplate(width, height, margin, margin + 24, page_prefix, fonts)  # type: ignore
+
+
+def _escape(text: str) -> bytes:
+    # Characters outside Windows-1252 are printed as "?"
+    encoded = text.encode("cp1252", errors="replace")
+    return encoded.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def _wrap(template: PageTemplate, style: str, text: str, indent: int) -> list[str]:
+    available = template.width - 2 * template.margin - indent * INDENT
+    lines: list[str] = []
+    current = ""
+    for word in text.split():
+        candidate = f"{current} {word}" if current else word
+        if template.text_width(candidate, style) <= available:
+            current = candidate
+            continue
+        if current:
+            lines.append(current)
+        # Words longer than a line are broken anywhere
+        while template.text_width(word, style) > available and len(word) > 1:
+            cut = len(word) - 1
+            while cut > 1 and template.text_width(word[:cut], style) > available:
+                cut -= 1
+            lines.append(word[:cut])
+            word = word[cut:]
+        current = word
+    lines.append(current)
+    return lines
+
+
+def care_plan_lines(snapshot: dict[str, Any]) -> list[Line]:
+    """
+    Lays out a care plan summary (generate_care_plan_summary_json()) as
+    (style, text, indent level) lines.
+    """
+    patient = snapshot["patient"]
+    lines: list[Line] = [
+        ("title", "Omaha System Care Plan", 0),
+        ("text", f"Patient: {patient['name']}", 0),
+        ("text", f"Date of birth: {patient['dob']}", 0),
+        ("text", f"TIN: {patient['tin']}", 0),
+        ("text", f"Phone: {patient['phone'] or '-'}", 0),
+        ("text", f"Address: {patient['address'] or '-'}", 0),
+        ("text", f"Generated: {snapshot['generated_at'][:16].replace('T', ' ')}", 0),
+    ]
+    if not snapshot["active_problems"]:
+        lines.append(("heading", "No active problems", 0))
+
+    for i, problem in enumerate(snapshot["active_problems"], 1):
+        lines.append(("heading", f"{i}. {problem['problem_name']}", 0))
+        lines.append(("text", f"Type: {problem['type']}, Domain: {problem['domain']}", 1))
+
+        symptoms = [
+            f"{s['description']} ({s['comment']})" if s["comment"] else s["description"]
+            for s in problem["symptoms"]
+        ]
+        lines.append(("text", f"Symptoms: {', '.join(symptoms) or 'None recorded'}", 1))
+
+        outcome = problem["latest_outcome"]
+        if outcome:
+            lines.append(("text", f"Latest outcome ({outcome['date_recorded'][:10]}):", 1))
+            for name in ("knowledge", "behavior", "status"):
+                lines.append(
+                    (
+                        "text",
+                        f"{name.capitalize()}: {outcome[name]} "
+                        f"(Rating: {outcome['scores'][name]}/5)",
+                        2,
+                    )
+                )
+        else:
+            lines.append(("text", "Latest outcome: None recorded", 1))
+
+        interventions = problem["all_interventions"]
+        lines.append(
+            ("text", "Interventions:" if interventions else "Interventions: None recorded", 1)
+        )
+        for intervention in interventions:
+            details = f" ({intervention['details']})" if intervention["details"] else ""
+            lines.append(
+                (
+                    "text",
+                    f"{intervention['date'][:10]}: {intervention['category']} - "
+                    f"{intervention['target']}{details}",
+                    2,
+                )
+            )
+    return lines
+
+
+def _paginate(template: PageTemplate, lines: list[Line]) -> list[list[Placed]]:
+    """
+    Wraps the lines and distributes them over pages.
+    """
+    pages: list[list[Placed]] = [[]]
+    y = template.height - template.margin
+    for style, text, indent in lines:
+        leading = STYLES[style][2]
+        wrapped = _wrap(template, style, text, indent)
+        # Keep a heading together with at least two lines that follow it
+        needed = leading * len(wrapped) + (2 * STYLES["text"][2] if style == "heading" else 0)
+        if y - needed < template.bottom and pages[-1]:
+            pages.append([])
+            y = template.height - template.margin
+        for part in wrapped:
+            if y - leading < template.bottom:
+                pages.append([])
+                y = template.height - template.margin
+            y -= leading
+            pages[-1].append((style, part, template.margin + indent * INDENT, y))
+    return pages
+
+
+def _text(font: str, size: int, x: float, y: float, text: str) -> bytes:
+    return b"BT /%s %d Tf %.2f %.2f Td (%s) Tj ET" % (font.encode(), size, x, y, _escape(text))
+
+
+def _content(
+    template: PageTemplate, page: list[Placed], number: int, total: int, footer: str
+) -> bytes:
+    commands = [_text(*STYLES[style][:2], x, y, text) for style, text, x, y in page]
+    # Footer: 8pt, the "text" style scaled down
+    label = f"Page {number} of {total}"
+    footer_y = template.margin - 8
+    label_x = template.width - template.margin - template.text_width(label, "text") * 0.8
+    commands.append(_text("F1", 8, template.margin, footer_y, footer))
+    commands.append(_text("F1", 8, label_x, footer_y, label))
+    stream = zlib.compress(b"\n".join(commands))
+    return b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (
+        len(stream),
+        stream,
+    )
+
+
+def render_care_plan_pdf(snapshot: dict[str, Any], page_size: str = "A4") -> Iterator[bytes]:
+    """
+    Renders a care plan summary as a PDF document, yielded object by
+    object as it is written.
+    """
+    template = page_template(page_size)
+    pages = _paginate(template, care_plan_lines(snapshot))
+    footer = f"Care plan of {snapshot['patient']['name']}"
+
+    position = 0
+    offsets: dict[int, int] = {}
+
+    def write(number: int, body: bytes) -> bytes:
+        nonlocal position
+        offsets[number] = position
+        chunk = b"%d 0 obj\n%s\nendobj\n" % (number, body)
+        position += len(chunk)
+        return chunk
+
+    header = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+    position = len(header)
+    yield header
+    yield write(_FONT, template.fonts[0])
+    yield write(_BOLD_FONT, template.fonts[1])
+    yield write(
+        _INFO,
+        b"<< /Title (%s) /Producer (Omaha System API) >>" % _escape(footer),
+    )
+
+    kids = []
+    for index, page in enumerate(pages):
+        page_number = _FIRST_PAGE + 2 * index
+        kids.append(b"%d 0 R" % page_number)
+        yield write(page_number + 1, _content(template, page, index + 1, len(pages), footer))
+        yield write(page_number, template.page_prefix + b"%d 0 R >>" % (page_number + 1))
+
+    yield write(
+        _PAGES, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), len(kids))
+    )
+    yield write(_CATALOG, b"<< /Type /Catalog /Pages %d 0 R >>" % _PAGES)
+
+    size = _FIRST_PAGE + 2 * len(pages)
+    xref = [b"xref\n0 %d\n" % size, b"0000000000 65535 f \n"]
+    xref += [b"%010d 00000 n \n" % offsets[number] for number in range(1, size)]
+    yield b"".join(xref)
+    yield b"trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        size,
+        _CATALOG,
+        _INFO,
+        position,
+    )
+
+
+def render_care_plan_pdf_bytes(snapshot: dict[str, Any], page_size: str = "A4") -> bytes:
+    """
+    render_care_plan_pdf() as one bytes object, for running in a process
+    pool (generators cannot be returned from another process).
+    """
+    return b"".join(render_care_plan_pdf(snapshot, page_size))
@@ -0,0 +1,286 @@
+import json
+import time
+from dataclasses import asdict, dataclass
+from functools import partial
+from typing import Callable, Sequence
+
+from cryptography.fernet import InvalidToken
+from sqlalchemy.orm.attributes import flag_modified
+from sqlmodel import Session, col, select
+
+from .. import models
+from ..config import settings
+from ..database import begin_immediate, engine
+from . import offload
+from .encryption import decrypt_data, encrypt_data, open_record, seal_record
+from .pii_cache import PII_CACHE
+
+PII_FIELDS = (
+    "first_name",
+    "last_name",
+    "date_of_birth",
+    "tin",
+    "phone_number",
+    "address",
+)
+STORAGE_MODES = ("fields", "record")
+
+
+@dataclass
+class PIIValues:
+    first_name: str
+    last_name: str
+    date_of_birth: str
+    tin: str
+    phone_number: str | None = None
+    address: str | None = None
+
+    def as_dict(self) -> dict[str, str | None]:
+        return asdict(self)
+
+
+def _associated_data(patient_id: int) -> bytes:
+    # Binds a record to its row, so records cannot be swapped between patients
+    return f"patient_pii:{patient_id}".encode()
+
+
+def read_pii(pii: models.PatientPII) -> PIIValues:
+    """
+    Decrypts a PatientPII row stored in either layout.
+    """
+    if pii.pii_record:
+        values = json.loads(open_record(pii.pii_record, _associated_data(pii.patient_id)))
+        return PIIValues(*values)
+    return PIIValues(
+        first_name=decrypt_data(pii.first_name),
+        last_name=decrypt_data(pii.last_name),
+        date_of_birth=decrypt_data(pii.date_of_birth),
+        tin=decrypt_data(pii.tin),
+        phone_number=decrypt_data(pii.phone_number) if pii.phone_number else None,
+        address=decrypt_data(pii.address) if pii.address else None,
+    )
+
+
+# Offload job input: (patient_id, pii_record, tokens of the requested fields)
+EncryptedRow = tuple[int, str | None, tuple[str | None, ...]]
+
+
+def decrypt_rows(rows: list[EncryptedRow], fields: tuple[str, ...]) -> list[dict[str, str | None]]:
+    """
+    Decrypts `fields` of many rows; records are opened whole. Runs in the
+    offload pool, so it works on plain tuples rather than models.
+    """
+    results = []
+    for patient_id, record, tokens in rows:
+        if record:
+            values = json.loads(open_record(record, _associated_data(patient_id)))
+            results.append(dict(zip(PII_FIELDS, values)))
+        else:
+            results.append(
+                {
+                    field: decrypt_data(token) if token else None
+                    for field, token in zip(fields, tokens)
+                }
+            )
+    return results
+
+
+def read_pii_many(
+    piis: Sequence[models.PatientPII], fields: Sequence[str] = PII_FIELDS
+) -> list["PIIView"]:
+    """
+    Returns a PIIView per row. If many rows have `fields` missing from the
+    PII cache, those are decrypted up front in the offload pool, spread
+    over its processes; otherwise they are decrypted on access as usual.
+    """
+    fields = tuple(fields)
+    views = [PIIView(pii) for pii in piis]
+    missing = [view for view in views if not view.load_cached(fields)]
+    if not offload.should_offload(len(missing)):
+        return views
+
+    rows = [
+        (
+            view._pii.patient_id,
+            view._pii.pii_record,
+            tuple(getattr(view._pii, field) for field in fields),
+        )
+        for view in missing
+    ]
+    decrypted = offload.map_batches(partial(decrypt_rows, fields=fields), rows)
+    for view, values in zip(missing, decrypted):
+        view._values.update(values)
+        PII_CACHE.put(view._pii.patient_id, view._pii.updated_at, values)
+    return views
+
+
+class PIIView:
+    """
+    Read-only view of a PatientPII row that decrypts each field on first
+    access, so callers only pay for the fields they actually use. Records
+    are opened as a whole on first access. Decrypted fields are shared
+    through PII_CACHE.
+    """
+
+    def __init__(self, pii: models.PatientPII):
+        self._pii = pii
+        self._values: dict[str, str | None] = {}
+
+    def load_cached(self, fields: tuple[str, ...]) -> bool:
+        """
+        Takes `fields` from the PII cache; False if any of them is missing.
+        """
+        pii = self._pii
+        for name in fields:
+            hit, value = PII_CACHE.get(pii.patient_id, pii.updated_at, name)
+            if not hit:
+                return False
+            self._values[name] = value
+        return True
+
+    def __getattr__(self, name: str) -> str | None:
+        if name not in PII_FIELDS:
+            raise AttributeError(name)
+        if name not in self._values:
+            pii = self._pii
+            hit, value = PII_CACHE.get(pii.patient_id, pii.updated_at, name)
+            if hit:
+                self._values[name] = value
+            elif pii.pii_record:
+                self._values = read_pii(pii).as_dict()
+                PII_CACHE.put(pii.patient_id, pii.updated_at, self._values)
+            else:
+                token = getattr(pii, name)
+                self._values[name] = decrypt_data(token) if token else None
+                PII_CACHE.put(pii.patient_id, pii.updated_at, {name: self._values[name]})
+        return self._values[name]
+
+
+def encrypt_pii(
+    patient_id: int, values: PIIValues, mode: str | None = None
+) -> dict[str, str | None]:
+    """
+    Column values of a PatientPII row holding `values`, in the configured
+    storage mode: "fields" encrypts each column separately, "record" seals
+    all fields together into `pii_record` with AES-GCM (one crypto
+    operation per row).
+    """
+    mode = mode or settings.PII_STORAGE_MODE
+    if mode == "record":
+        plaintext = json.dumps(
+            [getattr(values, field) for field in PII_FIELDS],
+            separators=(",", ":"),
+            ensure_ascii=False,
+        ).encode()
+        # The per-field columns are NOT NULL; they are left blank in record mode
+        return {
+            "pii_record": seal_record(plaintext, _associated_data(patient_id)),
+            "first_name": "",
+            "last_name": "",
+            "date_of_birth": "",
+            "tin": "",
+            "phone_number": None,
+            "address": None,
+        }
+    return {
+        "pii_record": None,
+        "first_name": encrypt_data(values.first_name),
+        "last_name": encrypt_data(values.last_name),
+        "date_of_birth": encrypt_data(values.date_of_birth),
+        "tin": encrypt_data(values.tin),
+        "phone_number": encrypt_data(values.phone_number) if values.phone_number else None,
+        "address": encrypt_data(values.address) if values.address else None,
+    }
+
+
+def encrypt_rows(
+    rows: list[tuple[int, PIIValues]], mode: str | None = None
+) -> list[dict[str, str | None]]:
+    """
+    encrypt_pii() for many (patient_id, values) rows. Runs in the offload
+    pool.
+    """
+    return [encrypt_pii(patient_id, values, mode) for patient_id, values in rows]
+
+
+def write_pii(pii: models.PatientPII, values: PIIValues, mode: str | None = None) -> None:
+    """
+    Encrypts `values` into `pii` (see encrypt_pii()). `pii.patient_id`
+    must be set.
+    """
+    for column, value in encrypt_pii(pii.patient_id, values, mode).items():
+        setattr(pii, column, value)
+    # Written even if it looks unchanged: a storage migration committed since
+    # the row was loaded may have sealed a record that would shadow the fields
+    flag_modified(pii, "pii_record")
+
+
+def redact_pii(pii: models.PatientPII) -> None:
+    """
+    Blanks the name and contact details of a deleted patient.
+    """
+    if pii.pii_record:
+        values = read_pii(pii)
+        values.first_name = "DELETED"
+        values.last_name = "DELETED"
+        values.phone_number = None
+        values.address = None
+        write_pii(pii, values, mode="record")
+    else:
+        pii.first_name = "DELETED"
+        pii.last_name = "DELETED"
+        pii.phone_number = None
+        pii.address = None
+
+
+def migrate_storage(
+    mode: str,
+    batch_size: int = 500,
+    pause_ms: int = 50,
+    progress: Callable[[int, int], None] | None = None,
+) -> int:
+    """
+    Converts every PatientPII row to `mode` in keyset-paginated batches,
+    committing after each batch. Rows already in the target layout are
+    skipped, so an interrupted migration can simply be run again.
+    Returns the number of rows converted.
+    """
+    if mode not in STORAGE_MODES:
+        raise ValueError(f"Unknown PII storage mode: {mode}")
+
+    last_id = 0
+    scanned = 0
+    converted = 0
+    while True:
+        # Changing the layout doesn't change any values, so it isn't audited
+        with Session(engine, info={"audit": False}) as session:
+            # The batch is read under the write lock: a PII update committed
+            # between reading and writing it back would be reverted
+            begin_immediate(session)
+            rows = session.exec(
+                select(models.PatientPII)
+                .where(col(models.PatientPII.patient_pii_id) > last_id)
+                .order_by(col(models.PatientPII.patient_pii_id))
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return converted
+
+            for pii in rows:
+                if bool(pii.pii_record) == (mode == "record"):
+                    continue
+                try:
+                    values = read_pii(pii)
+                except InvalidToken:
+                    # Deleted patients keep plaintext placeholders in field mode
+                    continue
+                write_pii(pii, values, mode=mode)
+                session.add(pii)
+                converted += 1
+            last_id = rows[-1].patient_pii_id  # type: ignore
+            scanned += len(rows)
+            session.commit()
+
+        if progress:
+            progress(scanned, converted)
+        time.sleep(pause_ms / 1000)
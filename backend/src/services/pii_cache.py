@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from ..config import settings
+from .metrics import record_cache_lookup
+
+
+@dataclass
+class _Entry:
+    # Version of the PatientPII row the values were decrypted from
+    updated_at: datetime | None
+    expires_at: float
+    fields: dict[str, bytearray | None] = field(default_factory=dict)
+
+    def wipe(self) -> None:
+        # Overwrite the plaintext in place before dropping it. Strings
+        # handed out by get() are immutable copies and cannot be wiped.
+        for value in self.fields.values():
+            if value is not None:
+                value[:] = bytes(len(value))
+        self.fields.clear()
+
+
+class PIICache:
+    """
+    LRU cache of decrypted PII fields, one entry per patient. An entry is
+    only valid for the `updated_at` of the row it was decrypted from, so
+    an update made anywhere makes it miss. Entries expire `ttl_seconds`
+    after they were created, whether or not they are used.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[int, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self, patient_id: int) -> None:
+        entry = self._entries.pop(patient_id, None)
+        if entry is not None:
+            entry.wipe()
+
+    def get(
+        self, patient_id: int, updated_at: datetime | None, name: str
+    ) -> tuple[bool, str | None]:
+        """
+        Returns (hit, value) for one field.
+        """
+        with self._lock:
+            entry = self._entries.get(patient_id)
+            if entry is not None and (
+                entry.updated_at != updated_at or entry.expires_at <= time.monotonic()
+            ):
+                self._evict(patient_id)
+                entry = None
+            hit = entry is not None and name in entry.fields
+            value = None
+            if hit:
+                self._entries.move_to_end(patient_id)
+                raw = entry.fields[name]  # type: ignore
+                value = raw.decode() if raw is not None else None
+        record_cache_lookup("pii", hit)
+        return hit, value
+
+    def put(
+        self,
+        patient_id: int,
+        updated_at: datetime | None,
+        values: dict[str, str | None],
+    ) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            entry = self._entries.get(patient_id)
+            if entry is None or entry.updated_at != updated_at:
+                self._evict(patient_id)
+                entry = _Entry(updated_at, time.monotonic() + self.ttl_seconds)
+                self._entries[patient_id] = entry
+                while len(self._entries) > self.max_size:
+                    self._evict(next(iter(self._entries)))
+            else:
+                self._entries.move_to_end(patient_id)
+            for name, value in values.items():
+                old = entry.fields.get(name)
+                if old is not None:
+                    old[:] = bytes(len(old))
+                entry.fields[name] = bytearray(value.encode()) if value is not None else None
+
+    def invalidate(self, patient_id: int) -> None:
+        with self._lock:
+            self._evict(patient_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            for patient_id in list(self._entries):
+                self._evict(patient_id)
+
+
+PII_CACHE = PIICache(settings.PII_CACHE_SIZE, settings.PII_CACHE_TTL_SECONDS)
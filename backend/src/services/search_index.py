@@ -0,0 +1,199 @@
+import hashlib
+import hmac
+import re
+import unicodedata
+from functools import lru_cache
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from sqlalchemy import delete, func, insert
+from sqlmodel import Session, col, select
+
+from .. import models
+from ..config import settings
+from .encryption import DEFAULT_KEY
+from .pii import PIIView, read_pii
+
+# Name prefixes are indexed up to this length; longer query terms are
+# matched on their first PREFIX_MAX characters plus trigrams of the rest.
+PREFIX_MIN = 2
+PREFIX_MAX = 8
+TOKEN_LENGTH = 32
+
+
+@lru_cache(maxsize=1)
+def get_index_key() -> bytes:
+    """
+    Returns the HMAC key for search tokens. Uses SEARCH_INDEX_KEY if set,
+    otherwise derives a separate key from ENCRYPTION_KEY (or the default
+    development key) so the same key material is never used for two
+    purposes. It never depends on the key ring, whose primary key changes
+    with every rotation; settings refuse ENCRYPTION_KEYS without one of
+    the two.
+    """
+    if settings.SEARCH_INDEX_KEY:
+        return settings.SEARCH_INDEX_KEY.encode()
+    root_key = (settings.ENCRYPTION_KEY or DEFAULT_KEY).encode()
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b"omaha-patient-search-index",
+    ).derive(root_key)
+
+
+def normalize(value: str) -> str:
+    """
+    Case-folds, strips accents and punctuation and collapses whitespace,
+    so "Müller-Lüdenscheidt " and "muller ludenscheidt" index identically.
+    """
+    decomposed = unicodedata.normalize("NFKD", value)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    cleaned = re.sub(r"[^\w\s]", " ", stripped.casefold())
+    return " ".join(cleaned.split())
+
+
+def _token(kind: str, value: str) -> str:
+    digest = hmac.new(get_index_key(), f"{kind}:{value}".encode(), hashlib.sha256)
+    return digest.hexdigest()[:TOKEN_LENGTH]
+
+
+def _trigrams(word: str) -> set[str]:
+    return {word[i : i + 3] for i in range(len(word) - 2)}
+
+
+def index_tokens(first_name: str, last_name: str, date_of_birth: str, tin: str) -> set[str]:
+    """
+    Computes the blinded tokens stored for one patient.
+    """
+    first = normalize(first_name)
+    last = normalize(last_name)
+    tokens = {
+        _token("full", f"{first} {last}"),
+        _token("dob", date_of_birth),
+        _token("tin", tin),
+    }
+    for word in f"{first} {last}".split():
+        for length in range(PREFIX_MIN, min(len(word), PREFIX_MAX) + 1):
+            tokens.add(_token("pfx", word[:length]))
+        for trigram in _trigrams(word):
+            tokens.add(_token("tri", trigram))
+    return tokens
+
+
+def name_query_tokens(query: str) -> list[str]:
+    """
+    Tokens that every matching patient must have for a name query. Each term
+    must be a prefix of one of the patient's name words.
+    """
+    tokens: set[str] = set()
+    for word in normalize(query).split():
+        if len(word) < PREFIX_MIN:
+            continue
+        tokens.add(_token("pfx", word[:PREFIX_MAX]))
+        if len(word) > PREFIX_MAX:
+            tokens.update(_token("tri", t) for t in _trigrams(word))
+    return sorted(tokens)
+
+
+def dob_token(date_of_birth: str) -> str:
+    return _token("dob", date_of_birth)
+
+
+def tin_token(tin: str) -> str:
+    return _token("tin", tin)
+
+
+def matches_name_query(query: str, first_name: str, last_name: str) -> bool:
+    """
+    Verifies a candidate against the query after decryption. Tokens can
+    over-match for long terms, so results are always checked on plaintext.
+    """
+    words = normalize(f"{first_name} {last_name}").split()
+    return all(
+        any(w.startswith(term) for w in words)
+        for term in normalize(query).split()
+        if len(term) >= PREFIX_MIN
+    )
+
+
+def replace_patient_tokens(session: Session, patient_id: int, tokens: set[str]) -> None:
+    """
+    Replaces a patient's tokens. Does not commit.
+    """
+    remove_patient_tokens(session, patient_id)
+    if tokens:
+        session.execute(
+            insert(models.PatientSearchToken),
+            [{"patient_id": patient_id, "token": token} for token in tokens],
+        )
+
+
+def remove_patient_tokens(session: Session, patient_id: int) -> None:
+    session.execute(
+        delete(models.PatientSearchToken).where(
+            col(models.PatientSearchToken.patient_id) == patient_id
+        )
+    )
+
+
+def find_patient_ids(
+    session: Session, tokens: list[str], limit: int | None = None, after: int | None = None
+) -> list[int]:
+    """
+    Intersects the posting lists of `tokens`: returns the ids of patients
+    that have every token, in order, starting after the id `after`.
+    """
+    if not tokens:
+        return []
+    query = (
+        select(models.PatientSearchToken.patient_id)
+        .where(col(models.PatientSearchToken.token).in_(tokens))
+        .group_by(models.PatientSearchToken.patient_id)
+        .having(func.count(func.distinct(models.PatientSearchToken.token)) == len(tokens))
+        .order_by(models.PatientSearchToken.patient_id)
+    )
+    if after is not None:
+        query = query.where(models.PatientSearchToken.patient_id > after)
+    if limit is not None:
+        query = query.limit(limit)
+    return list(session.exec(query).all())
+
+
+def ensure_search_index(session: Session, batch_size: int = 500) -> int:
+    """
+    Indexes patients that have PII but no search tokens yet (e.g. created
+    before the index existed). Deleted patients only get their TIN token,
+    which keeps their TIN from being registered again. Returns the number
+    of patients indexed.
+    """
+    indexed = select(models.PatientSearchToken.patient_id).distinct()
+    missing = session.exec(
+        select(models.PatientPII, models.Patient.deleted_at)
+        .join(models.Patient, col(models.Patient.patient_id) == models.PatientPII.patient_id)
+        .where(col(models.PatientPII.patient_id).not_in(indexed))
+    ).all()
+
+    for n, (pii, deleted_at) in enumerate(missing, 1):
+        if deleted_at is not None:
+            # The names of deleted patients are redacted placeholders
+            tokens = {tin_token(PIIView(pii).tin)}  # type: ignore
+        else:
+            values = read_pii(pii)
+            tokens = index_tokens(
+                values.first_name, values.last_name, values.date_of_birth, values.tin
+            )
+        replace_patient_tokens(session, pii.patient_id, tokens)
+        if n % batch_size == 0:
+            session.commit()
+    session.commit()
+    return len(missing)
+
+
+def rebuild_search_index(session: Session, batch_size: int = 500) -> int:
+    """
+    Drops and recomputes all tokens, e.g. after changing SEARCH_INDEX_KEY.
+    """
+    session.execute(delete(models.PatientSearchToken))
+    session.commit()
+    return ensure_search_index(session, batch_size)
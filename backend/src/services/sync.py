@@ -0,0 +1,215 @@
+from pydantic import ValidationError
+from sqlmodel import Session, col, select
+
+from .. import models
+from ..database import begin_immediate
+from ..schemas import (
+    CareInterventionCreate,
+    OutcomeScoreCreate,
+    PatientProblemCreate,
+    PatientProblemSymptomCreate,
+    PatientProblemUpdate,
+    SyncOperationCreate,
+    SyncOperationResult,
+)
+from . import clinical
+from .changes import latest_seq
+
+
+class SyncConflict(clinical.ClinicalError):
+    """
+    The operation was based on a state the server no longer has.
+    """
+
+    def __init__(self, detail: str):
+        super().__init__(409, detail)
+
+
+def _result(
+    record: models.SyncOperationRecord, replayed: bool = False
+) -> SyncOperationResult:
+    return SyncOperationResult(
+        op_id=record.op_id,
+        status=record.status,
+        table_name=record.table_name,
+        record_id=record.record_id,
+        detail=record.detail,
+        replayed=replayed,
+    )
+
+
+def _validation_detail(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors()
+    )
+
+
+def _changed_since(
+    session: Session, table: str, record_id: int, since: int, until: int
+) -> bool:
+    return (
+        session.exec(
+            select(models.ChangeLogEntry.seq)
+            .where(models.ChangeLogEntry.table_name == table)
+            .where(models.ChangeLogEntry.record_id == record_id)
+            .where(col(models.ChangeLogEntry.seq) > since)
+            .where(col(models.ChangeLogEntry.seq) <= until)
+            .limit(1)
+        ).first()
+        is not None
+    )
+
+
+def _created_problem(session: Session, device_id: str, client_id: str) -> int | None:
+    """
+    The server id of the problem the device created under `client_id`.
+    """
+    return session.exec(
+        select(models.SyncOperationRecord.record_id)
+        .where(models.SyncOperationRecord.device_id == device_id)
+        .where(models.SyncOperationRecord.client_id == client_id)
+        .where(models.SyncOperationRecord.table_name == "patient_problem")
+        .where(models.SyncOperationRecord.status == "applied")
+    ).first()
+
+
+def _resolve_problem(
+    session: Session, device_id: str, op: SyncOperationCreate, id_map: dict[str, int]
+) -> models.PatientProblem:
+    ref = op.patient_problem_id
+    if ref is None:
+        raise clinical.ClinicalError(400, "patient_problem_id is required")
+    if isinstance(ref, str):
+        if ref not in id_map:
+            created = _created_problem(session, device_id, ref)
+            if created is None:
+                raise clinical.ClinicalError(404, f"Unknown client id '{ref}'")
+            id_map[ref] = created
+        ref = id_map[ref]
+
+    problem = session.get(models.PatientProblem, ref)
+    if problem is not None and problem.deleted_at:
+        raise SyncConflict("Patient problem was deleted")
+    return clinical.get_patient_problem(session, ref, op.patient_id)
+
+
+def _apply(
+    session: Session,
+    device_id: str,
+    op: SyncOperationCreate,
+    since: int,
+    until: int,
+    id_map: dict[str, int],
+) -> tuple[str, int]:
+    # Also required on operations on an existing problem, whose owner is
+    # checked against it
+    if op.patient_id is None:
+        raise clinical.ClinicalError(400, "patient_id is required")
+    if op.type == "create_problem":
+        if op.client_id is not None and (
+            op.client_id in id_map or _created_problem(session, device_id, op.client_id)
+        ):
+            raise clinical.ClinicalError(400, f"Client id '{op.client_id}' is already used")
+        record = clinical.create_problem(
+            session, op.patient_id, PatientProblemCreate.model_validate(op.data)
+        )
+        session.flush()
+        return "patient_problem", record.patient_problem_id  # type: ignore
+
+    if op.client_id is not None:
+        raise clinical.ClinicalError(400, "client_id is only allowed on create_problem")
+    problem = _resolve_problem(session, device_id, op, id_map)
+    if op.type == "update_problem":
+        problem_data = PatientProblemUpdate.model_validate(op.data)
+        # Only changes the device could not have seen count as conflicts
+        problem_id: int = problem.patient_problem_id  # type: ignore
+        if _changed_since(session, "patient_problem", problem_id, since, until):
+            raise SyncConflict("Patient problem changed on the server since the last sync")
+        clinical.update_problem(session, problem, problem_data)
+        session.flush()
+        return "patient_problem", problem_id
+
+    try:
+        if op.type == "add_symptom":
+            symptom = clinical.add_symptom(
+                session, problem, PatientProblemSymptomCreate.model_validate(op.data)
+            )
+            if symptom is None:
+                raise SyncConflict("Symptom already associated with this problem")
+            session.flush()
+            return "patient_problem_symptom", symptom.patient_problem_symptom_id  # type: ignore
+    except clinical.ProblemNotActive as e:
+        raise SyncConflict(e.detail)
+
+    if op.type == "add_score":
+        score = clinical.add_score(session, problem, OutcomeScoreCreate.model_validate(op.data))
+        session.flush()
+        return "outcome_score", score.score_id  # type: ignore
+
+    intervention = clinical.add_intervention(
+        session, problem, CareInterventionCreate.model_validate(op.data)
+    )
+    session.flush()
+    return "care_intervention", intervention.intervention_id  # type: ignore
+
+
+def apply_operations(
+    session: Session, device_id: str, operations: list[SyncOperationCreate], since: int
+) -> tuple[list[SyncOperationResult], dict[str, int]]:
+    """
+    Applies a device's queued operations in order. Each operation is
+    validated before anything is written, so a rejected or conflicting
+    operation changes nothing and the following ones still run.
+    Operations the device sent before are not applied again; their
+    original result is returned instead. Takes the database write lock;
+    the caller commits.
+
+    An update conflicts if the record changed after `since` (the device's
+    sync token), unless this batch made the change. Client ids name the
+    problems created by `device_id` and are only resolved for it.
+    """
+    if operations:
+        # Under the write lock, so a concurrent request from the device that
+        # sends the same operations sees them as received, not as new
+        begin_immediate(session)
+    until = latest_seq(session)
+    id_map: dict[str, int] = {}
+    known = {
+        record.op_id: record
+        for record in session.exec(
+            select(models.SyncOperationRecord)
+            .where(models.SyncOperationRecord.device_id == device_id)
+            .where(col(models.SyncOperationRecord.op_id).in_([op.op_id for op in operations]))
+        ).all()
+    }
+
+    results = []
+    for op in operations:
+        record = known.get(op.op_id)
+        if record is not None:
+            results.append(_result(record, replayed=True))
+        else:
+            record = models.SyncOperationRecord(
+                op_id=op.op_id, device_id=device_id, status="applied"
+            )
+            try:
+                record.table_name, record.record_id = _apply(
+                    session, device_id, op, since, until, id_map
+                )
+                record.client_id = op.client_id
+            except SyncConflict as e:
+                record.status = "conflict"
+                record.detail = e.detail
+            except clinical.ClinicalError as e:
+                record.status = "rejected"
+                record.detail = e.detail
+            except ValidationError as e:
+                record.status = "rejected"
+                record.detail = _validation_detail(e)
+            session.add(record)
+            known[op.op_id] = record
+            results.append(_result(record))
+
+        if record.status == "applied" and record.client_id and record.record_id:
+            id_map[record.client_id] = record.record_id
+    return results, id_map
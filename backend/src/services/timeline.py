@@ -0,0 +1,123 @@
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import literal, tuple_, union_all
+from sqlmodel import Session, col, select
+
+from .. import models
+
+# Event type -> (model, time column). A problem's events are its creation
+# and those of its symptoms, outcome scores and interventions.
+EVENT_TYPES: dict[str, tuple[Any, str]] = {
+    "problem": (models.PatientProblem, "created_at"),
+    "symptom": (models.PatientProblemSymptom, "created_at"),
+    "score": (models.OutcomeScore, "date_recorded"),
+    "intervention": (models.CareIntervention, "date_performed"),
+}
+
+Cursor = tuple[datetime, str, int]
+
+
+def format_cursor(cursor: Cursor) -> str:
+    occurred_at, event_type, event_id = cursor
+    return f"{occurred_at.isoformat()}_{event_type}_{event_id}"
+
+
+def parse_cursor(cursor: str) -> Cursor:
+    """
+    Raises ValueError if `cursor` was not made by format_cursor().
+    """
+    occurred_at, event_type, event_id = cursor.split("_")
+    if event_type not in EVENT_TYPES:
+        raise ValueError(f"Unknown event type '{event_type}'")
+    return datetime.fromisoformat(occurred_at), event_type, int(event_id)
+
+
+def _branch(event_type: str, patient_id: int, before: Cursor | None, limit: int):
+    model, time_name = EVENT_TYPES[event_type]
+    event_id = model.__mapper__.primary_key[0]
+    occurred_at = getattr(model, time_name)
+    query = select(
+        literal(event_type).label("event_type"),
+        event_id.label("event_id"),
+        occurred_at.label("occurred_at"),
+        col(model.patient_problem_id).label("patient_problem_id"),
+    )
+    if model is not models.PatientProblem:
+        query = query.join(
+            models.PatientProblem,
+            models.PatientProblem.patient_problem_id == model.patient_problem_id,  # type: ignore
+        ).where(model.deleted_at == None)  # noqa: E711
+    query = query.where(models.PatientProblem.patient_id == patient_id).where(
+        models.PatientProblem.deleted_at == None  # noqa: E711
+    )
+
+    if before is not None:
+        # Events are ordered by (occurred_at, event_type, event_id), newest
+        # first; the type is constant here, so the comparison reduces to
+        # one on the indexed columns
+        before_at, before_type, before_id = before
+        if event_type < before_type:
+            query = query.where(occurred_at <= before_at)
+        elif event_type == before_type:
+            query = query.where(tuple_(occurred_at, event_id) < tuple_(before_at, before_id))
+        else:
+            query = query.where(occurred_at < before_at)
+
+    # Each branch is limited too, so the merge sorts at most a few pages
+    return query.order_by(occurred_at.desc(), event_id.desc()).limit(limit).subquery()
+
+
+def read_timeline(
+    session: Session,
+    patient_id: int,
+    event_types: list[str] | None = None,
+    before: Cursor | None = None,
+    limit: int = 50,
+) -> tuple[list[dict[str, Any]], Cursor | None]:
+    """
+    Returns a page of the patient's events, newest first, and the cursor
+    of the next page (None on the last one). Deleted records, and the
+    events of deleted problems, are left out.
+    """
+    # One branch per type; a type given twice would list its events twice
+    branches = [
+        _branch(event_type, patient_id, before, limit + 1)
+        for event_type in dict.fromkeys(event_types or EVENT_TYPES)
+    ]
+    merged = union_all(*(select(branch) for branch in branches)).subquery()
+    rows = session.exec(
+        select(*merged.c)
+        .order_by(
+            merged.c.occurred_at.desc(),
+            merged.c.event_type.desc(),
+            merged.c.event_id.desc(),
+        )
+        .limit(limit + 1)
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    records: dict[tuple[str, int], Any] = {}
+    for event_type, (model, _) in EVENT_TYPES.items():
+        ids = [row.event_id for row in rows if row.event_type == event_type]
+        if not ids:
+            continue
+        primary_key = model.__mapper__.primary_key[0]
+        for record in session.exec(select(model).where(primary_key.in_(ids))).all():
+            records[(event_type, getattr(record, primary_key.key))] = record
+
+    events = [
+        {
+            "type": row.event_type,
+            "id": row.event_id,
+            "occurred_at": row.occurred_at,
+            "patient_problem_id": row.patient_problem_id,
+            "data": records[(row.event_type, row.event_id)].model_dump(),
+        }
+        for row in rows
+    ]
+    if not has_more:
+        return events, None
+    last = rows[-1]
+    return events, (last.occurred_at, last.event_type, last.event_id)
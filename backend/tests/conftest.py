@@ -0,0 +1,98 @@
+import itertools
+import os
+import tempfile
+
+from cryptography.fernet import Fernet
+
+# Settings are read on import: point the application at a throwaway
+# database before anything from src is loaded
+_directory = tempfile.mkdtemp(prefix="omaha-tests-")
+os.environ["DATABASE_PATH"] = os.path.join(_directory, "omaha.sqlite3")
+os.environ["DB_ECHO"] = "false"
+# A key ring with an older key, which key rotation tests write with first
+os.environ["ENCRYPTION_KEYS"] = (
+    f"k2:{Fernet.generate_key().decode()},k1:{Fernet.generate_key().decode()}"
+)
+os.environ["SEARCH_INDEX_KEY"] = "test-search-index-key"
+os.environ.setdefault("OFFLOAD_PROCESSES", "0")
+
+import pytest  # noqa: E402
+from sqlmodel import Session, select  # noqa: E402
+
+from src import models  # noqa: E402
+from src.database import create_db_and_tables, engine  # noqa: E402
+from src.services import search_index  # noqa: E402
+from src.services.pii import PIIValues, read_pii, write_pii  # noqa: E402
+
+_tins = itertools.count(10000000000)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    create_db_and_tables(verify=False)
+    return engine
+
+
+@pytest.fixture
+def session(database):
+    with Session(database) as session:
+        yield session
+
+
+@pytest.fixture
+def make_patient(session):
+    """
+    Creates a patient with PII and search tokens; returns the patient id.
+    """
+
+    def make(first_name: str = "Old", last_name: str = "Patient") -> int:
+        patient = models.Patient()
+        session.add(patient)
+        session.flush()
+        values = PIIValues(
+            first_name=first_name,
+            last_name=last_name,
+            date_of_birth="1970-01-01",
+            tin=str(next(_tins)),
+        )
+        pii = models.PatientPII(
+            patient_id=patient.patient_id,  # type: ignore
+            first_name="",
+            last_name="",
+            date_of_birth="",
+            tin="",
+        )
+        write_pii(pii, values)
+        session.add(pii)
+        search_index.replace_patient_tokens(
+            session,
+            patient.patient_id,  # type: ignore
+            search_index.index_tokens(
+                values.first_name, values.last_name, values.date_of_birth, values.tin
+            ),
+        )
+        session.commit()
+        return patient.patient_id  # type: ignore
+
+    return make
+
+
+def read_patient_pii(patient_id: int) -> PIIValues:
+    with Session(engine) as session:
+        pii = session.exec(
+            select(models.PatientPII).where(models.PatientPII.patient_id == patient_id)
+        ).one()
+        return read_pii(pii)
+
+
+def rename_patient(patient_id: int, first_name: str) -> None:
+    # What PUT /patients/{id} does to the PII row
+    with Session(engine) as session:
+        pii = session.exec(
+            select(models.PatientPII).where(models.PatientPII.patient_id == patient_id)
+        ).one()
+        values = read_pii(pii)
+        values.first_name = first_name
+        write_pii(pii, values)
+        session.add(pii)
+        session.commit()
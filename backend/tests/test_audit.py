@@ -0,0 +1,100 @@
+import time
+from datetime import datetime, timezone
+
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import OperationalError
+
+from src.main import app
+from src.services import audit
+from src.services.metrics import AUDIT_DEAD_LETTERS
+
+
+def _event(record_id: int) -> dict:
+    return {
+        "action": "update",
+        "table_name": "patient_pii",
+        "record_id": record_id,
+        "patient_id": record_id,
+        "patient_problem_id": None,
+        "changes": {"first_name": audit.REDACTED},
+        "occurred_at": datetime.now(timezone.utc),
+        "actor": "nurse-1",
+    }
+
+
+@pytest.fixture
+def writer(tmp_path):
+    return audit.AuditWriter(
+        batch_size=10,
+        flush_interval_ms=10,
+        max_pending=100,
+        retry_seconds=5,
+        dead_letter_path=str(tmp_path / "audit-dead-letter.ndjson"),
+    )
+
+
+def _locked(events):
+    raise OperationalError("INSERT INTO audit_event", {}, Exception("database is locked"))
+
+
+def test_failed_batch_is_retried(writer, monkeypatch):
+    written = []
+    attempts = iter([_locked, written.extend])
+    monkeypatch.setattr(writer, "_write", lambda events: next(attempts)(events))
+
+    writer._write_batch([_event(1)], retry_seconds=5, queued=False)
+
+    assert [e["record_id"] for e in written] == [1]
+
+
+def test_batch_is_dead_lettered_and_replayed(writer, monkeypatch):
+    dead_lettered = AUDIT_DEAD_LETTERS.value()
+    monkeypatch.setattr(writer, "_write", _locked)
+    events = [_event(1), _event(2)]
+
+    writer._write_batch(events, retry_seconds=0, queued=False)
+
+    with open(writer.dead_letter_path, "rb") as f:
+        kept = [orjson.loads(line) for line in f]
+    assert [e["record_id"] for e in kept] == [1, 2]
+    assert AUDIT_DEAD_LETTERS.value() == dead_lettered + 2
+
+    # Still refused: the file is left as it is
+    writer._replay_dead_letters()
+    with open(writer.dead_letter_path, "rb") as f:
+        assert len(f.readlines()) == 2
+
+    written = []
+    monkeypatch.setattr(writer, "_write", written.extend)
+    writer._replay_dead_letters()
+
+    assert [e["occurred_at"] for e in written] == [e["occurred_at"] for e in events]
+    with open(writer.dead_letter_path, "rb") as f:
+        assert f.read() == b""
+
+
+def test_flush_does_not_wait_for_a_batch_being_retried(writer, monkeypatch):
+    monkeypatch.setattr(writer, "_write", _locked)
+    writer.enqueue([_event(1)])
+
+    started = time.monotonic()
+    assert writer.flush(0.2) is False
+    writer.close(0.2)
+    assert time.monotonic() - started < 2
+
+    with open(writer.dead_letter_path, "rb") as f:
+        assert [orjson.loads(line)["record_id"] for line in f] == [1]
+
+
+def test_record_id_requires_table_name():
+    client = TestClient(app)
+    response = client.get("/api/v1/audit/events", params={"record_id": 5})
+    assert response.status_code == 400
+
+    response = client.get(
+        "/api/v1/audit/events", params={"table_name": "patient_problem", "record_id": 5}
+    )
+    assert response.status_code == 200
+    assert all(e["record_id"] == 5 for e in response.json())
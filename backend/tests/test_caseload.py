@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete
+
+from src import models
+from src.config import settings
+from src.schemas import OutcomeScoreCreate, PatientProblemCreate
+from src.services import caseload, clinical
+
+PROBLEM = PatientProblemCreate(problem_id=1, modifier_domain_id=1, modifier_type_id=1)
+ADMISSION, DISCHARGE = 1, 3
+
+
+def scored_problem(session, patient_id: int, phase_id: int, days_ago: int) -> int:
+    problem = clinical.create_problem(session, patient_id, PROBLEM)
+    session.flush()
+    score = clinical.add_score(
+        session,
+        problem,
+        OutcomeScoreCreate(
+            phase_id=phase_id, rating_knowledge_id=1, rating_behavior_id=1, rating_status_id=1
+        ),
+    )
+    score.date_recorded = datetime.now(timezone.utc) - timedelta(days=days_ago)
+    session.commit()
+    return problem.patient_problem_id  # type: ignore
+
+
+def test_dashboard_counts_the_overdue_worklist_items(session, make_patient):
+    patient_id = make_patient()
+    interval = settings.REASSESSMENT_INTERVAL_DAYS
+    overdue = scored_problem(session, patient_id, ADMISSION, interval + 5)
+    discharged = scored_problem(session, patient_id, DISCHARGE, interval + 5)
+    scored_problem(session, patient_id, ADMISSION, 1)
+
+    items, _ = caseload.worklist(session, limit=500)
+    listed = {item["patient_problem_id"] for item in items if item["days_overdue"] > 0}
+    assert overdue in listed and discharged not in listed
+
+    dashboard = caseload.dashboard(session)
+    assert dashboard["overdue_reassessments"] == len(listed)
+    domain_id = session.get(models.OmahaProblem, PROBLEM.problem_id).domain_id  # type: ignore
+    domains = {domain["domain_id"]: domain for domain in dashboard["domains"]}
+    assert domains[domain_id]["overdue_reassessments"] == len(
+        [item for item in items if item["days_overdue"] > 0 and item["domain_id"] == domain_id]
+    )
+    assert caseload.check(session) == []
+
+
+def test_due_buckets_of_an_older_database_are_built(session, make_patient):
+    scored_problem(session, make_patient(), ADMISSION, settings.REASSESSMENT_INTERVAL_DAYS + 5)
+    expected = caseload.dashboard(session)["overdue_reassessments"]
+    assert expected > 0
+
+    session.exec(delete(models.CaseloadDue))  # type: ignore
+    session.commit()
+    assert caseload.ensure_aggregates(session) is not None
+    assert caseload.dashboard(session)["overdue_reassessments"] == expected
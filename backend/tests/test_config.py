@@ -0,0 +1,17 @@
+import pytest
+from cryptography.fernet import Fernet
+from pydantic import ValidationError
+
+from src.config import Settings
+
+KEYS = f"k1:{Fernet.generate_key().decode()}"
+
+
+def test_key_ring_requires_a_stable_search_index_key():
+    with pytest.raises(ValidationError, match="SEARCH_INDEX_KEY"):
+        Settings(_env_file=None, ENCRYPTION_KEYS=KEYS, SEARCH_INDEX_KEY=None)  # type: ignore
+
+
+def test_key_ring_with_search_index_key():
+    settings = Settings(_env_file=None, ENCRYPTION_KEYS=KEYS, SEARCH_INDEX_KEY="index-key")  # type: ignore
+    assert settings.SEARCH_INDEX_KEY == "index-key"
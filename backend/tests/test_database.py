@@ -0,0 +1,68 @@
+from sqlalchemy import inspect, text
+from sqlmodel import Session, select
+
+from src import models
+from src.database import create_db_and_tables, engine
+from src.schemas import PatientProblemCreate
+from src.services import clinical
+
+
+def test_duplicate_symptoms_are_removed_before_the_unique_index(session, make_patient):
+    problem = clinical.create_problem(
+        session,
+        make_patient(),
+        PatientProblemCreate(problem_id=1, modifier_domain_id=1, modifier_type_id=1),
+    )
+    session.commit()
+    symptom_id = session.exec(
+        select(models.Symptom.symptom_id).where(models.Symptom.problem_id == 1)
+    ).first()
+
+    # A database from before the index, with the same symptom recorded twice
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX ux_patient_problem_symptom_active"))
+        for _ in range(2):
+            connection.execute(
+                text(
+                    "INSERT INTO patient_problem_symptom "
+                    "(patient_problem_id, symptom_id, created_at) "
+                    "VALUES (:problem, :symptom, CURRENT_TIMESTAMP)"
+                ),
+                {"problem": problem.patient_problem_id, "symptom": symptom_id},
+            )
+
+    create_db_and_tables(verify=False)
+
+    indexes = inspect(engine).get_indexes("patient_problem_symptom")
+    assert "ux_patient_problem_symptom_active" in {index["name"] for index in indexes}
+    active = session.exec(
+        select(models.PatientProblemSymptom)
+        .where(models.PatientProblemSymptom.patient_problem_id == problem.patient_problem_id)
+        .where(models.PatientProblemSymptom.deleted_at == None)  # noqa: E711
+    ).all()
+    assert len(active) == 1
+
+
+def test_sync_operations_are_rekeyed_by_device(session):
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE sync_operation"))
+        connection.execute(
+            text(
+                "CREATE TABLE sync_operation (op_id VARCHAR NOT NULL PRIMARY KEY, "
+                "client_id VARCHAR, status VARCHAR NOT NULL, table_name VARCHAR, "
+                "record_id INTEGER, detail VARCHAR, received_at DATETIME NOT NULL)"
+            )
+        )
+        connection.execute(
+            text(
+                "INSERT INTO sync_operation (op_id, client_id, status, received_at) "
+                "VALUES ('op-1', 'p-1', 'applied', CURRENT_TIMESTAMP)"
+            )
+        )
+
+    create_db_and_tables(verify=False)
+
+    key = inspect(engine).get_pk_constraint("sync_operation")["constrained_columns"]
+    assert key == ["device_id", "op_id"]
+    record = session.get(models.SyncOperationRecord, ("", "op-1"))
+    assert record is not None and record.client_id is None
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from src.services import export
+
+
+@pytest.mark.parametrize("kind", ["txt", "json", "html"])
+def test_cached_export_shows_when_it_was_served(session, make_patient, monkeypatch, kind):
+    patient_id = make_patient()
+    monkeypatch.setattr(export, "_generation_time", lambda kind: "2001-01-01 08:00")
+    first, _ = export.render_export(session, patient_id, kind)
+
+    monkeypatch.setattr(export, "_generation_time", lambda kind: "2001-01-01 09:30")
+    _, cached = export._cached_export(session, patient_id, kind)
+    assert cached is not None
+    second, _ = export.render_export(session, patient_id, kind)
+
+    assert first is not None and "2001-01-01 08:00" in first
+    assert second == first.replace("2001-01-01 08:00", "2001-01-01 09:30")
+
+
+def test_streamed_text_export_is_cached_without_its_time(session, make_patient, monkeypatch):
+    patient_id = make_patient()
+    monkeypatch.setattr(export, "_generation_time", lambda kind: "2001-01-01 08:00")
+    chunks, _ = export.stream_text_export(session, patient_id)
+    first = "".join(chunks)
+
+    monkeypatch.setattr(export, "_generation_time", lambda kind: "2001-01-01 09:30")
+    chunks, _ = export.stream_text_export(session, patient_id)
+    assert "".join(chunks) == first.replace("2001-01-01 08:00", "2001-01-01 09:30")
+
+
+def test_documents_keep_their_layout(session, make_patient):
+    patient_id = make_patient()
+    for _ in range(2):
+        text, _ = export.render_export(session, patient_id, "txt")
+        lines = text.split("\n")  # type: ignore
+        assert lines[0] == "OMAHA SYSTEM CARE PLAN SUMMARY"
+        assert lines[2].startswith("Patient: ")
+        assert lines[7].startswith("Generated: ") and lines[8].startswith("-----")
+
+        document, _ = export.render_export(session, patient_id, "json")
+        assert list(json.loads(document)) == ["patient", "generated_at", "active_problems"]  # type: ignore
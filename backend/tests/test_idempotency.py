@@ -0,0 +1,51 @@
+import uuid
+
+from fastapi.testclient import TestClient
+from sqlmodel import select
+
+from src import models
+from src.main import app
+
+client = TestClient(app)
+
+
+def test_key_is_not_replayed_in_another_format():
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    body = {"device_id": "device-a"}
+    first = client.post("/api/v1/sync", json=body, headers=headers)
+    assert first.status_code == 200
+
+    replayed = client.post("/api/v1/sync", json=body, headers=headers)
+    assert replayed.headers["Idempotent-Replayed"] == "true"
+    assert replayed.content == first.content
+
+    other_format = client.post(
+        "/api/v1/sync", json=body, headers={**headers, "Accept": "application/msgpack"}
+    )
+    assert other_format.status_code == 422
+
+
+def test_stored_responses_hold_no_pii(session):
+    consents = [
+        {"consent_definition_id": d.consent_definition_id, "has_consented": True}
+        for d in session.exec(select(models.ConsentDefinition)).all()
+    ]
+    body = {
+        "first_name": "Zelda",
+        "last_name": "Secretname",
+        "date_of_birth": "1980-02-02",
+        "tin": "12345678901",
+        "consents": consents,
+    }
+    key = str(uuid.uuid4())
+    created = client.post("/api/v1/patients", json=body, headers={"Idempotency-Key": key})
+    assert created.status_code == 201
+
+    stored = session.get(models.IdempotencyRecord, key)
+    assert stored is not None and stored.response_body is not None
+    for value in (b"Zelda", b"Secretname", b"1980-02-02", b"12345678901"):
+        assert value not in stored.response_body
+
+    replayed = client.post("/api/v1/patients", json=body, headers={"Idempotency-Key": key})
+    assert replayed.headers["Idempotent-Replayed"] == "true"
+    assert replayed.content == created.content
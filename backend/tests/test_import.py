@@ -0,0 +1,20 @@
+from fastapi.testclient import TestClient
+
+from src.config import settings
+from src.main import app
+
+client = TestClient(app)
+CSV = b"first_name,last_name,date_of_birth,tin\n" + b"Ann,Example,1980-01-01,1\n" * 100
+
+
+def test_upload_over_the_limit_is_rejected(monkeypatch):
+    monkeypatch.setattr(settings, "IMPORT_MAX_BYTES", 1024)
+    headers = {"Content-Type": "text/csv"}
+
+    declared = client.post("/api/v1/patients/import", content=CSV, headers=headers)
+    assert declared.status_code == 413
+
+    chunked = client.post(
+        "/api/v1/patients/import", content=iter([CSV[:1000], CSV[1000:]]), headers=headers
+    )
+    assert chunked.status_code == 413
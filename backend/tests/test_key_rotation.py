@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+from sqlmodel import select
+
+from src import models
+from src.config import settings
+from src.services import encryption, key_rotation
+
+from .conftest import read_patient_pii, rename_patient
+
+# The test key ring (conftest), primary first
+(_, NEW_KEY), (_, OLD_KEY) = encryption.parse_keys(settings.ENCRYPTION_KEYS)  # type: ignore
+
+
+@pytest.fixture
+def keyring(monkeypatch):
+    def use(keys: str) -> None:
+        monkeypatch.setattr(settings, "ENCRYPTION_KEYS", keys)
+        encryption.get_keyring.cache_clear()
+
+    yield use
+    monkeypatch.undo()
+    encryption.get_keyring.cache_clear()
+
+
+def test_rotation_rotates_to_the_primary_key(keyring, make_patient, session):
+    keyring(f"k1:{OLD_KEY.decode()}")
+    patient_id = make_patient("Rotated")
+    keyring(f"k2:{NEW_KEY.decode()},k1:{OLD_KEY.decode()}")
+
+    job = key_rotation.start_rotation(session, batch_size=500, pause_ms=0)
+    job = key_rotation.run_rotation(job.job_id)  # type: ignore
+
+    assert job.status == "completed"
+    pii = session.exec(
+        select(models.PatientPII).where(models.PatientPII.patient_id == patient_id)
+    ).one()
+    assert encryption.key_id_of(pii.first_name) == "k2"
+    assert read_patient_pii(patient_id).first_name == "Rotated"
+
+
+def test_rotation_does_not_revert_a_concurrent_update(keyring, make_patient, session, monkeypatch):
+    keyring(f"k1:{OLD_KEY.decode()}")
+    patient_id = make_patient("Old")
+    keyring(f"k2:{NEW_KEY.decode()},k1:{OLD_KEY.decode()}")
+
+    # The update is committed while the job holds its batch: without the
+    # write lock it lands before the batch is written back
+    rotate_row = key_rotation._rotate_row
+    updater = threading.Thread(target=rename_patient, args=(patient_id, "NEW"))
+
+    def rotate_with_concurrent_update(pii):
+        if pii.patient_id == patient_id and updater.ident is None:
+            updater.start()
+            updater.join(timeout=1)
+        return rotate_row(pii)
+
+    monkeypatch.setattr(key_rotation, "_rotate_row", rotate_with_concurrent_update)
+    job = key_rotation.start_rotation(session, batch_size=500, pause_ms=0)
+    key_rotation.run_rotation(job.job_id)  # type: ignore
+    updater.join()
+
+    assert read_patient_pii(patient_id).first_name == "NEW"
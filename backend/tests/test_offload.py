@@ -0,0 +1,16 @@
+import pytest
+
+from src.config import settings
+from src.services import offload
+
+
+@pytest.mark.parametrize(("web_workers", "expected"), [(None, 8), ("4", 2), ("16", 1)])
+def test_pool_shares_the_cpus_between_web_workers(monkeypatch, web_workers, expected):
+    monkeypatch.setattr(settings, "OFFLOAD_PROCESSES", None)
+    monkeypatch.setattr(offload, "available_cpus", lambda: 8)
+    if web_workers is None:
+        monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    else:
+        monkeypatch.setenv("WEB_CONCURRENCY", web_workers)
+
+    assert offload.process_count() == expected
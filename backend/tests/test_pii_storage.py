@@ -0,0 +1,44 @@
+import threading
+
+from sqlmodel import select
+
+from src import models
+from src.services import pii as pii_service
+
+from .conftest import read_patient_pii, rename_patient
+
+
+def test_migration_converts_rows(make_patient, session):
+    patient_id = make_patient("Converted")
+
+    pii_service.migrate_storage("record", pause_ms=0)
+
+    pii = session.exec(
+        select(models.PatientPII).where(models.PatientPII.patient_id == patient_id)
+    ).one()
+    assert pii.pii_record
+    assert read_patient_pii(patient_id).first_name == "Converted"
+    pii_service.migrate_storage("fields", pause_ms=0)
+
+
+def test_migration_does_not_revert_a_concurrent_update(make_patient, monkeypatch):
+    patient_id = make_patient("Old")
+
+    # The update is committed while the migration holds its batch: without
+    # the write lock it lands before the batch is written back
+    read_pii = pii_service.read_pii
+    updater = threading.Thread(target=rename_patient, args=(patient_id, "NEW"))
+
+    def read_with_concurrent_update(pii):
+        if pii.patient_id == patient_id and updater.ident is None:
+            updater.start()
+            updater.join(timeout=1)
+        return read_pii(pii)
+
+    monkeypatch.setattr(pii_service, "read_pii", read_with_concurrent_update)
+    pii_service.migrate_storage("record", pause_ms=0)
+    updater.join()
+    monkeypatch.undo()
+
+    assert read_patient_pii(patient_id).first_name == "NEW"
+    pii_service.migrate_storage("fields", pause_ms=0)
@@ -0,0 +1,21 @@
+import uuid
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+
+from src import models
+from src.main import app
+
+client = TestClient(app)
+
+
+def test_search_looks_past_deleted_candidates(session, make_patient):
+    last_name = f"Searchable{uuid.uuid4().hex[:8]}"
+    patient_ids = [make_patient("Ann", last_name) for _ in range(4)]
+    for patient_id in patient_ids[:3]:
+        session.get(models.Patient, patient_id).deleted_at = datetime.now(timezone.utc)  # type: ignore
+    session.commit()
+
+    found = client.get("/api/v1/patients/search", params={"q": last_name, "limit": 1})
+    assert found.status_code == 200
+    assert [patient["patient_id"] for patient in found.json()] == [patient_ids[3]]
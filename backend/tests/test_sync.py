@@ -0,0 +1,162 @@
+import threading
+import time
+import uuid
+
+from sqlmodel import Session
+
+from src import models
+from src.database import engine
+from src.schemas import SyncOperationCreate
+from src.services import sync
+
+PROBLEM = {"problem_id": 1, "modifier_domain_id": 1, "modifier_type_id": 1}
+SCORE = {"phase_id": 1, "rating_knowledge_id": 1, "rating_behavior_id": 1, "rating_status_id": 1}
+
+
+def operation(type: str, **fields) -> SyncOperationCreate:
+    return SyncOperationCreate(op_id=str(uuid.uuid4()), type=type, **fields)
+
+
+def send(session: Session, device_id: str, *operations: SyncOperationCreate):
+    results, id_map = sync.apply_operations(session, device_id, list(operations), 0)
+    session.commit()
+    return results, id_map
+
+
+def test_client_ids_are_resolved_per_device(session, make_patient):
+    first_patient, second_patient = make_patient(), make_patient()
+    _, first_ids = send(
+        session,
+        "device-a",
+        operation("create_problem", client_id="p-1", patient_id=first_patient, data=PROBLEM),
+    )
+    _, second_ids = send(
+        session,
+        "device-b",
+        operation("create_problem", client_id="p-1", patient_id=second_patient, data=PROBLEM),
+    )
+    assert first_ids["p-1"] != second_ids["p-1"]
+
+    # In a later batch, each device's "p-1" is its own problem
+    results, _ = send(
+        session,
+        "device-b",
+        operation("add_score", patient_id=second_patient, patient_problem_id="p-1", data=SCORE),
+    )
+    assert results[0].status == "applied"
+    score = session.get(models.OutcomeScore, results[0].record_id)
+    assert score is not None and score.patient_problem_id == second_ids["p-1"]
+
+    # A device's client id never reaches another patient's problem
+    results, _ = send(
+        session,
+        "device-a",
+        operation("add_score", patient_id=second_patient, patient_problem_id="p-1", data=SCORE),
+    )
+    assert results[0].status == "rejected"
+
+
+def test_client_id_of_another_operation_is_not_a_problem(session, make_patient):
+    patient_id = make_patient()
+    _, id_map = send(
+        session,
+        "device-a",
+        operation("create_problem", client_id="problem", patient_id=patient_id, data=PROBLEM),
+    )
+    results, _ = send(
+        session,
+        "device-a",
+        operation(
+            "add_score",
+            client_id="score",
+            patient_id=patient_id,
+            patient_problem_id=id_map["problem"],
+            data=SCORE,
+        ),
+        operation("add_score", patient_id=patient_id, patient_problem_id="score", data=SCORE),
+    )
+    assert [r.status for r in results] == ["rejected", "rejected"]
+    assert results[1].detail == "Unknown client id 'score'"
+
+
+def test_client_id_is_not_reused(session, make_patient):
+    patient_id = make_patient()
+    results, _ = send(
+        session,
+        "device-a",
+        operation("create_problem", client_id="p-2", patient_id=patient_id, data=PROBLEM),
+        operation("create_problem", client_id="p-2", patient_id=patient_id, data=PROBLEM),
+    )
+    assert [r.status for r in results] == ["applied", "rejected"]
+
+
+def test_operations_require_the_patient(session, make_patient):
+    patient_id = make_patient()
+    _, id_map = send(
+        session,
+        "device-a",
+        operation("create_problem", client_id="p-3", patient_id=patient_id, data=PROBLEM),
+    )
+    results, _ = send(
+        session,
+        "device-a",
+        operation("add_score", patient_problem_id=id_map["p-3"], data=SCORE),
+        operation("update_problem", patient_problem_id="p-3", data={"is_active": False}),
+    )
+    assert [(r.status, r.detail) for r in results] == [
+        ("rejected", "patient_id is required"),
+        ("rejected", "patient_id is required"),
+    ]
+
+
+def test_operation_ids_are_scoped_per_device(session, make_patient):
+    first_patient, second_patient = make_patient(), make_patient()
+    op_id = str(uuid.uuid4())
+    first, _ = send(
+        session,
+        "device-a",
+        SyncOperationCreate(
+            op_id=op_id, type="create_problem", patient_id=first_patient, data=PROBLEM
+        ),
+    )
+    second, _ = send(
+        session,
+        "device-b",
+        SyncOperationCreate(
+            op_id=op_id, type="create_problem", patient_id=second_patient, data=PROBLEM
+        ),
+    )
+
+    assert second[0].status == "applied" and not second[0].replayed
+    assert second[0].record_id != first[0].record_id
+    problem = session.get(models.PatientProblem, second[0].record_id)
+    assert problem is not None and problem.patient_id == second_patient
+
+
+def test_concurrent_resend_is_replayed(make_patient, monkeypatch):
+    patient_id = make_patient()
+    op = operation("create_problem", patient_id=patient_id, data=PROBLEM)
+    apply = sync._apply
+    entered = threading.Event()
+
+    def slow_apply(*args):
+        entered.set()
+        time.sleep(0.3)
+        return apply(*args)
+
+    monkeypatch.setattr(sync, "_apply", slow_apply)
+    results = {}
+
+    def resend(name: str) -> None:
+        with Session(engine) as session:
+            results[name], _ = send(session, "device-a", op)
+
+    first = threading.Thread(target=resend, args=("first",))
+    first.start()
+    entered.wait()
+    resend("second")
+    first.join()
+
+    assert results["first"][0].status == "applied"
+    assert results["second"][0].replayed
+    assert results["second"][0].record_id == results["first"][0].record_id
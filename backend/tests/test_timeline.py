@@ -0,0 +1,24 @@
+from src.schemas import OutcomeScoreCreate, PatientProblemCreate
+from src.services import clinical, timeline
+
+
+def test_repeated_event_type_is_listed_once(session, make_patient):
+    patient_id = make_patient()
+    problem = clinical.create_problem(
+        session,
+        patient_id,
+        PatientProblemCreate(problem_id=1, modifier_domain_id=1, modifier_type_id=1),
+    )
+    session.flush()
+    clinical.add_score(
+        session,
+        problem,
+        OutcomeScoreCreate(
+            phase_id=1, rating_knowledge_id=1, rating_behavior_id=1, rating_status_id=1
+        ),
+    )
+    session.commit()
+
+    events, _ = timeline.read_timeline(session, patient_id, ["score", "score"])
+
+    assert [event["type"] for event in events] == ["score"]